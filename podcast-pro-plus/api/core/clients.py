@@ -0,0 +1,34 @@
+from functools import lru_cache
+
+from .config import settings
+
+# Provider SDKs are imported and their clients built on first use, then shared by
+# everything in the process. Importing the API or a worker therefore costs nothing
+# for providers that process never calls.
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    import openai
+    # Retries are handled by services.provider_gateway, which shares backoff between processes.
+    return openai.OpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0)
+
+@lru_cache(maxsize=None)
+def get_elevenlabs_client():
+    from elevenlabs.client import ElevenLabs
+    return ElevenLabs(api_key=settings.ELEVENLABS_API_KEY, base_url=settings.ELEVENLABS_BASE_URL)
+
+@lru_cache(maxsize=None)
+def get_oauth():
+    """The authlib OAuth registry with the Google client registered."""
+    from authlib.integrations.starlette_client import OAuth
+    oauth = OAuth()
+    oauth.register(
+        name='google',
+        server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+        client_id=settings.GOOGLE_CLIENT_ID,
+        client_secret=settings.GOOGLE_CLIENT_SECRET,
+        client_kwargs={
+            'scope': 'openid email profile'
+        }
+    )
+    return oauth
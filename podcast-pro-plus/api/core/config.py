@@ -5,6 +5,12 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = "YOUR_API_KEY_HERE"
     ELEVENLABS_API_KEY: str = "YOUR_API_KEY_HERE"
     SPREAKER_API_TOKEN: str = "YOUR_SPREAKER_TOKEN_HERE"
+    # Provider endpoints; override to point the app at proxies or at the fakes in loadtest/.
+    OPENAI_BASE_URL: str | None = None
+    ELEVENLABS_BASE_URL: str | None = None
+    SPREAKER_API_BASE_URL: str = "https://api.spreaker.com/v2"
+    # Where podcast apps reach this API; used for the enclosure and self links in feeds.
+    PUBLIC_BASE_URL: str = "http://127.0.0.1:8000"
 
     # --- Google OAuth Settings ---
     GOOGLE_CLIENT_ID: str = "YOUR_GOOGLE_CLIENT_ID"
@@ -16,6 +22,42 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
 
+    # --- Artifact Storage Settings ---
+    # "local" keeps files in the working directory; "s3" works with any S3-compatible
+    # service (set S3_ENDPOINT_URL for MinIO or another local stand-in).
+    ARTIFACT_BACKEND: str = "local"
+    S3_BUCKET: str = "podcast-pro-plus"
+    S3_ENDPOINT_URL: str | None = None
+    S3_REGION: str = "us-east-1"
+    S3_ACCESS_KEY_ID: str | None = None
+    S3_SECRET_ACCESS_KEY: str | None = None
+    ARTIFACT_GC_INTERVAL_MINUTES: int = 60
+
+    # --- Admin & Diagnostics Settings ---
+    # Users with these emails can reach the /admin endpoints (JSON list in .env).
+    ADMIN_EMAILS: list[str] = []
+    PROFILE_RETENTION_DAYS: int = 7
+    MAX_STORED_PROFILES: int = 200
+
+    # --- Job Scheduling Settings ---
+    # Pipeline jobs run on this many worker threads, shared fairly between users; see
+    # services.scheduler. Weights are keyed by user id (JSON object in .env).
+    SCHEDULER_WORKERS: int = 3
+    SCHEDULER_MAX_RUNNING_PER_USER: int = 2
+    SCHEDULER_RESERVED_SHORT_WORKERS: int = 1
+    SCHEDULER_LONG_JOBS_ON_RESERVED: int = 1
+    SCHEDULER_LONG_LANE_AGING_S: float = 1800.0
+    SCHEDULER_USER_WEIGHTS: dict[str, float] = {}
+    # A job whose estimated memory exceeds this renders its intermediates into mapped
+    # files a block at a time instead of holding them in memory (services.memory_budget).
+    PIPELINE_MEMORY_BUDGET_MB: int = 2048
+
+    # --- Export Settings ---
+    # Episodes at least this long have their MP3 encoded in segments on this many
+    # cores at once (0: one per core); see services.exporter.encode_mp3_segmented.
+    MP3_ENCODE_WORKERS: int = 0
+    MP3_SEGMENTED_MIN_DURATION_S: float = 600.0
+
     class Config:
         env_file = ".env"
 
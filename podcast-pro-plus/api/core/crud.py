@@ -5,7 +5,7 @@ import json
 
 from .security import get_password_hash
 from ..models.user import User, UserCreate
-from ..models.podcast import PodcastTemplate, PodcastTemplateCreate
+from ..models.podcast import PodcastTemplate, PodcastTemplateCreate, Episode, EpisodeStatus
 
 # --- User CRUD ---
 def get_user_by_email(session: Session, email: str) -> Optional[User]:
@@ -45,10 +45,40 @@ def create_user_template(session: Session, template_in: PodcastTemplateCreate, u
         user_id=user_id,
         segments_json=segments_json_str,
         background_music_rules_json=music_rules_json_str,
-        timing_json=template_in.timing.model_dump_json()
+        timing_json=template_in.timing.model_dump_json(),
+        loudness_json=template_in.loudness.model_dump_json()
     )
     
     session.add(db_template)
     session.commit()
     session.refresh(db_template)
-    return db_template
\ No newline at end of file
+    return db_template
+
+# --- Episode CRUD ---
+def create_processed_episode(
+    session: Session,
+    user_id: UUID,
+    template_id: UUID,
+    title: str,
+    final_audio_path: str,
+    transcript_path: Optional[str],
+    total_length_seconds: Optional[float],
+    audio_outputs: List[dict]
+) -> Episode:
+    """
+    Records a freshly rendered episode, including every exported audio rendition.
+    """
+    db_episode = Episode(
+        user_id=user_id,
+        template_id=template_id,
+        title=title,
+        status=EpisodeStatus.processed,
+        final_audio_path=final_audio_path,
+        transcript_path=transcript_path,
+        total_length_seconds=total_length_seconds,
+        audio_outputs_json=json.dumps(audio_outputs)
+    )
+    session.add(db_episode)
+    session.commit()
+    session.refresh(db_episode)
+    return db_episode
@@ -1,5 +1,7 @@
 from sqlmodel import create_engine, SQLModel, Session
 
+from ..models.podcast import LoudnessTarget
+
 # The database URL tells SQLAlchemy where to find the database file.
 # In this case, it will be a file named "database.db" in the project's root.
 DATABASE_URL = "sqlite:///database.db" 
@@ -13,12 +15,42 @@ engine = create_engine(
     connect_args={"check_same_thread": False}
 )
 
+# Columns added to tables that existing databases already have. create_all only
+# creates missing tables, so these are added at startup: (table, column, definition).
+# SQLite can only add a NOT NULL column together with a default for existing rows.
+ADDED_COLUMNS = [
+    ("episode", "audio_outputs_json", "VARCHAR NOT NULL DEFAULT '[]'"),
+    ("episode", "ad_markers_json", "VARCHAR NOT NULL DEFAULT '[]'"),
+    ("podcasttemplate", "loudness_json", f"VARCHAR NOT NULL DEFAULT '{LoudnessTarget().model_dump_json()}'"),
+]
+
+# Indexes added to existing tables, which create_all would skip: (name, table, columns).
+# They must match the models' __table_args__.
+ADDED_INDEXES = [
+    ("ix_mediaitem_user_created", "mediaitem", "user_id, created_at, id"),
+    ("ix_mediaitem_user_category_created", "mediaitem", "user_id, category, created_at, id"),
+]
+
+def _add_missing_columns(connection) -> None:
+    for table, column, definition in ADDED_COLUMNS:
+        existing = {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info('{table}')")}
+        if existing and column not in existing:
+            connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _add_missing_indexes(connection) -> None:
+    for name, table, columns in ADDED_INDEXES:
+        connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
 def create_db_and_tables():
     """
-    Creates the database file and all tables defined by our SQLModels.
+    Creates the database file and all tables defined by our SQLModels, then brings
+    tables created by earlier versions up to date.
     This is called once when the application starts up.
     """
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        _add_missing_columns(connection)
+        _add_missing_indexes(connection)
 
 def get_session():
     """
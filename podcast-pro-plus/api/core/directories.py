@@ -0,0 +1,18 @@
+from pathlib import Path
+from typing import List
+
+# Modules register the working directories they write to when they are imported;
+# the directories themselves are only created by ensure_directories(), which the API
+# and worker entry points call once at startup.
+_registered: List[Path] = []
+
+def register(*paths: Path) -> None:
+    for path in paths:
+        if path not in _registered:
+            _registered.append(path)
+
+def ensure_directories() -> List[Path]:
+    """Creates every registered directory that does not exist yet."""
+    for path in _registered:
+        path.mkdir(parents=True, exist_ok=True)
+    return list(_registered)
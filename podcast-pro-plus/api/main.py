@@ -1,9 +1,12 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from .core.config import settings
 from .core.database import create_db_and_tables
-from .routers import templates, episodes, auth, media
+from .core.directories import ensure_directories
+from .routers import templates, episodes, auth, media, admin, feeds
+from .services import artifact_store
 
 app = FastAPI(
     title="Podcast Pro Plus API",
@@ -13,8 +16,11 @@ app = FastAPI(
 
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
+    ensure_directories()
     create_db_and_tables()
+    # Applies artifact retention policies in the background for as long as the app runs.
+    app.state.artifact_gc = asyncio.create_task(artifact_store.run_garbage_collector())
 
 # --- Add CORS Middleware ---
 # This allows our React frontend (running on localhost:5173) to send requests to our backend.
@@ -40,6 +46,8 @@ app.include_router(templates.router)
 app.include_router(episodes.router)
 app.include_router(auth.router)
 app.include_router(media.router)
+app.include_router(admin.router)
+app.include_router(feeds.router)
 
 @app.get("/", tags=["Root"])
 async def read_root():
@@ -0,0 +1,27 @@
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+from uuid import UUID, uuid4
+from typing import Optional
+from enum import Enum
+
+class ArtifactKind(str, Enum):
+    upload = "upload"
+    cleaned_audio = "cleaned_audio"
+    edited_audio = "edited_audio"
+    ai_segment = "ai_segment"
+    final_audio = "final_audio"
+    transcript = "transcript"
+    waveform = "waveform"
+
+class Artifact(SQLModel, table=True):
+    """Index entry for one pipeline file, wherever its bytes are stored."""
+    id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
+    key: str = Field(unique=True, index=True) # Storage key, e.g. "final_episodes/show_mp3_128.mp3"
+    name: str = Field(index=True) # Bare filename, which is what clients refer to
+    kind: ArtifactKind
+    user_id: Optional[UUID] = Field(default=None, foreign_key="user.id", index=True)
+    backend: str = Field(default="local")
+    size_bytes: int
+    sha256: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: Optional[datetime] = Field(default=None, index=True) # None keeps it forever
@@ -0,0 +1,33 @@
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+from uuid import UUID, uuid4
+from typing import Optional
+
+class AudioFingerprint(SQLModel, table=True):
+    """
+    Acoustic fingerprint of one main-content recording. A recording that matches an
+    earlier one points at it through duplicate_of and stores no hashes of its own;
+    transcripts and cleanup results are cached on the original, in its timeline.
+    """
+    id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
+    user_id: UUID = Field(foreign_key="user.id", index=True)
+    media_item_id: Optional[UUID] = Field(default=None, foreign_key="mediaitem.id", index=True)
+    source_name: str # File the fingerprint was taken from
+    duration_s: float
+    hash_count: int
+    duplicate_of: Optional[UUID] = Field(default=None, foreign_key="audiofingerprint.id", index=True)
+    match_score: Optional[float] = Field(default=None)
+    # Seconds to add to a time in this recording to find the same audio in the original.
+    offset_s: float = Field(default=0.0)
+    transcript_path: Optional[str] = Field(default=None)
+    cleanup_json: str = Field(default="{}") # Cleanup results keyed by fingerprint.cleanup_key
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class FingerprintHash(SQLModel, table=True):
+    """
+    One landmark hash of an original recording. The primary key leads with the hash,
+    so its index serves the near-duplicate lookup directly.
+    """
+    hash: int = Field(primary_key=True)
+    fingerprint_id: UUID = Field(primary_key=True, foreign_key="audiofingerprint.id")
+    offset: int = Field(primary_key=True) # Anchor position in spectrogram frames
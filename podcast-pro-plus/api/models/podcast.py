@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from typing import List, Optional, Literal, Union
 from datetime import datetime
 from uuid import UUID, uuid4
@@ -44,6 +45,10 @@ class TemplateSegment(SQLModel):
     id: UUID = Field(default_factory=uuid4)
     segment_type: Literal["intro", "outro", "commercial", "sound_effect", "transition", "content"]
     source: Union[StaticSegmentSource, AIGeneratedSegmentSource, TTSSegmentSource] = Field(..., discriminator='source_type')
+    # Seconds into the main content. A commercial with an anchor is inserted there as a
+    # mid-roll; sound effects and transitions are laid over that point. Without one,
+    # segments follow the template order.
+    anchor_s: Optional[float] = None
 
 class BackgroundMusicRule(SQLModel):
     id: UUID = Field(default_factory=uuid4)
@@ -54,6 +59,17 @@ class BackgroundMusicRule(SQLModel):
     fade_in_s: float = 2.0
     fade_out_s: float = 3.0
     volume_db: int = -15
+    duck_db: float = 6.0 # How far the music dips under speech; 0 disables ducking
+
+class ExportProfile(SQLModel):
+    name: str
+    format: Literal["mp3", "m4a", "opus"] = "mp3"
+    bitrate_kbps: int = 128
+
+class LoudnessTarget(SQLModel):
+    integrated_lufs: float = -16.0
+    true_peak_dbtp: float = -1.0
+    channels: Optional[Literal[1, 2]] = 2 # None keeps the rendered channel layout
 
 class SegmentTiming(SQLModel):
     content_start_offset_s: float = -2.0
@@ -64,6 +80,7 @@ class PodcastTemplateCreate(SQLModel):
     segments: List[TemplateSegment]
     background_music_rules: List[BackgroundMusicRule] = []
     timing: SegmentTiming = Field(default_factory=SegmentTiming)
+    loudness: LoudnessTarget = Field(default_factory=LoudnessTarget)
 
 class PodcastTemplate(SQLModel, table=True):
     id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
@@ -73,6 +90,7 @@ class PodcastTemplate(SQLModel, table=True):
     segments_json: str = Field(default="[]")
     background_music_rules_json: str = Field(default="[]")
     timing_json: str = Field(default_factory=lambda: SegmentTiming().model_dump_json())
+    loudness_json: str = Field(default_factory=lambda: LoudnessTarget().model_dump_json())
 
     episodes: List["Episode"] = Relationship(back_populates="template") # Link to episodes
 
@@ -82,6 +100,13 @@ class PodcastTemplatePublic(PodcastTemplateCreate):
 
 # --- Media Library Models ---
 class MediaItem(SQLModel, table=True):
+    # Back the library listing: newest-first keyset pagination per user, optionally
+    # narrowed to one category.
+    __table_args__ = (
+        Index("ix_mediaitem_user_created", "user_id", "created_at", "id"),
+        Index("ix_mediaitem_user_category_created", "user_id", "category", "created_at", "id"),
+    )
+
     id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
     category: MediaCategory = Field(default=MediaCategory.music)
     filename: str
@@ -114,7 +139,20 @@ class Episode(SQLModel, table=True):
     total_length_seconds: Optional[float] = Field(default=None)
     final_audio_path: Optional[str] = Field(default=None)
     transcript_path: Optional[str] = Field(default=None)
+    audio_outputs_json: str = Field(default="[]") # One entry per exported profile
+    # Where ads are spliced into the MP3 rendition on download; see services.ad_insertion.
+    ad_markers_json: str = Field(default="[]")
 
     # Timestamps
     processed_at: datetime = Field(default_factory=datetime.utcnow)
-    publish_at: Optional[datetime] = Field(default=None) # For scheduling
\ No newline at end of file
+    publish_at: Optional[datetime] = Field(default=None) # For scheduling
+
+class EpisodeUpdate(SQLModel):
+    """Editable episode fields; only the ones sent are changed."""
+    title: Optional[str] = None
+    season_number: Optional[int] = None
+    episode_number: Optional[int] = None
+    show_notes: Optional[str] = None
+    tags: Optional[str] = None
+    guests: Optional[str] = None
+    publish_at: Optional[datetime] = None
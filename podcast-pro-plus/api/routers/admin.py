@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import FileResponse
+from typing import List, Dict, Any
+
+from ..models.user import User
+from ..core.config import settings
+from ..services import profiler, scheduler
+from .auth import get_current_user
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+)
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """Allows only users listed in settings.ADMIN_EMAILS."""
+    admins = {email.lower() for email in settings.ADMIN_EMAILS}
+    if current_user.email.lower() not in admins:
+        raise HTTPException(status_code=403, detail="Admin access required.")
+    return current_user
+
+@router.get("/profiles", response_model=List[Dict[str, Any]])
+async def list_profiles(admin: User = Depends(get_current_admin)):
+    """Lists stored job profiles, newest first."""
+    return profiler.list_profiles()
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str, admin: User = Depends(get_current_admin)):
+    """Downloads a .prof capture (for pstats or snakeviz) or its text summary."""
+    try:
+        path = profiler.profile_path(name)
+    except profiler.ProfilerError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    media_type = "text/plain" if path.suffix == ".txt" else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=path.name)
+
+@router.get("/scheduler", response_model=Dict[str, Any])
+async def scheduler_status(admin: User = Depends(get_current_admin)):
+    """Queue depth, running jobs and queue wait percentiles per tenant and lane."""
+    return scheduler.get_scheduler().snapshot()
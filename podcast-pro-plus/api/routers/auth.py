@@ -1,14 +1,15 @@
 from datetime import datetime, timedelta
+from typing import Optional
 from uuid import uuid4
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.responses import RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import JWTError, jwt
-from authlib.integrations.starlette_client import OAuth
 from sqlmodel import Session
 
 from ..core.config import settings
+from ..core.clients import get_oauth
 from ..core.security import verify_password
 from ..models.user import User, UserCreate, UserPublic
 from ..core.database import get_session
@@ -23,18 +24,8 @@ router = APIRouter(
 # --- Security Scheme ---
 # This tells FastAPI how to find the token (in the "Authorization: Bearer <token>" header)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
-
-# --- OAuth Client Setup ---
-oauth = OAuth()
-oauth.register(
-    name='google',
-    server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
-    client_id=settings.GOOGLE_CLIENT_ID,
-    client_secret=settings.GOOGLE_CLIENT_SECRET,
-    client_kwargs={
-        'scope': 'openid email profile'
-    }
-)
+# The same, for endpoints that also answer anonymous requests.
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token", auto_error=False)
 
 # --- Helper Functions ---
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -73,6 +64,16 @@ async def get_current_user(
         raise credentials_exception
     return user
 
+async def get_optional_user(
+    session: Session = Depends(get_session), token: Optional[str] = Depends(optional_oauth2_scheme)
+) -> Optional[User]:
+    """
+    The current user if a token was sent, else None. An invalid token is still rejected.
+    """
+    if token is None:
+        return None
+    return await get_current_user(session=session, token=token)
+
 # --- Standard Authentication Endpoints ---
 @router.post("/register", response_model=UserPublic, status_code=status.HTTP_201_CREATED)
 async def register_user(user_in: UserCreate, session: Session = Depends(get_session)):
@@ -111,7 +112,7 @@ async def login_for_access_token(
 async def login_google(request: Request):
     """Redirects the user to Google's login page."""
     redirect_uri = request.url_for('auth_google_callback')
-    return await oauth.google.authorize_redirect(request, redirect_uri)
+    return await get_oauth().google.authorize_redirect(request, redirect_uri)
 
 @router.get('/google/callback')
 async def auth_google_callback(request: Request, session: Session = Depends(get_session)):
@@ -120,7 +121,7 @@ async def auth_google_callback(request: Request, session: Session = Depends(get_
     and redirects back to the frontend.
     """
     try:
-        token = await oauth.google.authorize_access_token(request)
+        token = await get_oauth().google.authorize_access_token(request)
     except Exception as e:
         print(f"Authlib Error: {e}")
         raise HTTPException(
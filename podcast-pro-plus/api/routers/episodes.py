@@ -1,17 +1,26 @@
+import json
+import re
 import shutil
-from fastapi import APIRouter, HTTPException, status, Body, Depends
+from datetime import date, datetime, timezone
+from fastapi import APIRouter, HTTPException, status, Body, Depends, Query, Header, BackgroundTasks, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Any, Tuple
 from uuid import UUID
 import os
-from sqlmodel import Session
+from sqlmodel import Session, select
 
-from ..services import audio_processor, transcription, ai_enhancer, publisher
-from ..core.database import get_session
+from ..services.audio_buffer import AudioBuffer
+from ..services import audio_processor, transcription, ai_enhancer, publisher, search_index, waveform, artifact_store, job_events, metadata, profiler, fingerprint, ad_insertion, mp3_frames, feeds, scheduler
+from ..core.database import get_session, engine
 from ..core import crud
 from ..models.user import User
-from .auth import get_current_user
+from ..models.podcast import ExportProfile, Episode, EpisodeStatus, EpisodeUpdate, PodcastTemplatePublic, MediaItem, MediaCategory, LoudnessTarget
+from .auth import get_current_user, get_optional_user
+from .templates import convert_db_template_to_public
+from .media import waveform_response, MEDIA_DIR
 
 router = APIRouter(
     prefix="/episodes",
@@ -23,46 +32,213 @@ CLEANED_DIR = Path("cleaned_audio")
 EDITED_DIR = Path("edited_audio")
 OUTPUT_DIR = Path("final_episodes")
 
+# Scheduling: an episode job costs about as much as its main content is long, and
+# episodes shorter than this (previews, trailers) take the short lane with metadata.
+SHORT_EPISODE_MAX_AUDIO_S = 300.0
+# Compressed uploads are assumed to be 128 kbps when estimating their duration.
+ESTIMATED_BYTES_PER_AUDIO_S = 16000
+METADATA_JOB_COST = 60.0
+
 class CleanupOptions(BaseModel):
     removePauses: bool = True
     removeFillers: bool = True
     checkForFlubber: bool = True
     checkForIntern: bool = True
 
-def find_file_in_dirs(filename: str) -> Optional[Path]:
-    """Helper to find a file in any of the possible output/upload directories."""
+def find_file_in_dirs(filename: str, session: Session, user_id: UUID) -> Optional[Path]:
+    """
+    Helper to find one of the user's files. Looks the name up in the artifact index
+    first, then falls back to probing the directories for files written before it.
+    Indexed files are only read through their backend, so one that has been deleted
+    there is not picked up again from a leftover local copy.
+    """
+    artifact = artifact_store.lookup(session, filename, user_id)
+    if artifact:
+        return artifact_store.fetch(artifact)
     for directory in [UPLOAD_DIR, CLEANED_DIR, EDITED_DIR, OUTPUT_DIR]:
         path = directory / filename
         if path.exists():
             return path
     return None
 
+def _run_episode_job(
+    user_id: UUID,
+    template_id: UUID,
+    template: PodcastTemplatePublic,
+    main_content_filename: str,
+    output_filename: str,
+    cleanup_options: CleanupOptions,
+    tts_overrides: Dict[str, str],
+    export_profiles: Optional[List[ExportProfile]],
+    job_id: str,
+    profile: bool = False
+) -> Dict[str, Any]:
+    """
+    Runs the production workflow and records its results, publishing progress to the
+    job's event stream. Runs on a scheduler worker with its own database session. With
+    `profile`, the whole job (pipeline, database writes and indexing) is captured with
+    cProfile and stored under the job's id for the admin endpoints.
+    """
+    progress = job_events.reporter(job_id)
+    progress("job_started")
+    profiles: List[str] = []
+    fingerprints: List[Any] = []
+
+    def content_cache(audio: Any, cleanup_key: str) -> Dict[str, Any]:
+        """
+        Returns results saved for an earlier copy of the recording, reusing the
+        fingerprint taken at upload and only fingerprinting it here if there is none.
+        """
+        try:
+            with Session(engine) as session:
+                record = fingerprint.find_record(session, user_id, main_content_filename, audio.duration_seconds)
+                if record is None:
+                    record = fingerprint.register(session, user_id, fingerprint.compute(audio), main_content_filename)
+                fingerprints.append(record)
+                return fingerprint.cached_results(session, record, cleanup_key)
+        except Exception as e:
+            print(f"Could not look up earlier uploads of {main_content_filename}: {e}")
+            return {}
+
+    try:
+        with profiler.profiled(job_id, "job", profile, profiles):
+            final_path, log, result = audio_processor.process_and_assemble_episode(
+                template=template,
+                main_content_filename=main_content_filename,
+                output_filename=output_filename,
+                cleanup_options=cleanup_options.dict(),
+                tts_overrides=tts_overrides,
+                export_profiles=export_profiles,
+                progress=progress,
+                content_cache=content_cache
+            )
+            with Session(engine) as session:
+                episode = crud.create_processed_episode(
+                    session=session,
+                    user_id=user_id,
+                    template_id=template_id,
+                    title=output_filename,
+                    final_audio_path=str(final_path),
+                    transcript_path=result.get("transcript_path"),
+                    total_length_seconds=result.get("total_length_seconds"),
+                    audio_outputs=result["outputs"]
+                )
+                try:
+                    artifact_store.register_many(session, result["artifacts"], user_id)
+                except artifact_store.ArtifactStoreError as e:
+                    log.append(f"WARNING: Could not record pipeline artifacts: {e}")
+                if fingerprints and result.get("content_cache"):
+                    cache = result["content_cache"]
+                    fingerprint.save_results(session, fingerprints[0], cache["words"], cache["key"], cache["cleanup"])
+            try:
+                search_index.index_transcript_file(episode.id, user_id, Path(result["transcripts"]["json"]))
+                log.append("Added transcript to the search index.")
+            except (search_index.SearchIndexError, OSError) as e:
+                log.append(f"WARNING: Could not index transcript for search: {e}")
+    except Exception as e:
+        progress("job_failed", detail=str(e))
+        raise
+    response = {
+        "message": "Episode processed and assembled successfully!",
+        "job_id": job_id,
+        "episode_id": str(episode.id),
+        "output_path": str(final_path),
+        "outputs": result["outputs"],
+        "loudness": result["loudness"],
+        "show_notes_additions": result.get("show_notes_additions", []),
+        "log": log
+    }
+    if profiles:
+        response["profiles"] = profiles
+    progress("job_finished", episode_id=response["episode_id"], output_path=response["output_path"], outputs=result["outputs"], profiles=profiles)
+    return response
+
+def _episode_lane_and_cost(main_content_filename: str) -> Tuple[str, float]:
+    """Schedules an episode by the length of its main content, read cheaply or estimated."""
+    path = UPLOAD_DIR / main_content_filename
+    try:
+        if path.suffix.lower() == ".wav":
+            audio_s = AudioBuffer.open_wav(path).duration_seconds
+        else:
+            audio_s = path.stat().st_size / ESTIMATED_BYTES_PER_AUDIO_S
+    except Exception:
+        # The pipeline reports missing or unreadable uploads itself.
+        audio_s = SHORT_EPISODE_MAX_AUDIO_S
+    lane = scheduler.LANE_SHORT if audio_s < SHORT_EPISODE_MAX_AUDIO_S else scheduler.LANE_LONG
+    return lane, audio_s
+
+def _run_episode_job_in_background(**kwargs) -> None:
+    try:
+        _run_episode_job(**kwargs)
+    except Exception:
+        # The failure has already been published to the job's event stream.
+        import traceback
+        traceback.print_exc()
+
 @router.post("/process-and-assemble", status_code=status.HTTP_200_OK)
 async def process_and_assemble_endpoint(
+    response: Response,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     template_id: UUID = Body(..., embed=True),
     main_content_filename: str = Body(..., embed=True),
     output_filename: str = Body(..., embed=True),
     cleanup_options: CleanupOptions = Body(..., embed=True),
-    tts_overrides: Dict[str, str] = Body({}, embed=True)
+    tts_overrides: Dict[str, str] = Body({}, embed=True),
+    export_profiles: Optional[List[ExportProfile]] = Body(None, embed=True),
+    job_id: Optional[str] = Body(None, embed=True),
+    wait: bool = Body(True, embed=True),
+    profile: bool = Body(False, embed=True),
+    x_profile: bool = Header(False)
 ):
-    """The master endpoint that runs the entire production workflow for the current user."""
+    """
+    The master endpoint that runs the entire production workflow for the current user.
+    Progress is streamed from /episodes/jobs/{job_id}/events. Clients may pass their
+    own job_id to subscribe before starting, or set wait=false to get a 202 with the
+    job_id straight away and follow the job through its events only. Jobs are queued
+    per user and shared fairly between users; see services.scheduler. Set profile=true
+    (or send an X-Profile: 1 header) to store a cProfile capture of the job.
+    """
     template = crud.get_template_by_id(session=session, template_id=template_id)
     if not template:
         raise HTTPException(status_code=404, detail=f"Template with ID {template_id} not found.")
     if template.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to use this template.")
-
     try:
-        final_path, log = audio_processor.process_and_assemble_episode(
-            template=template,
-            main_content_filename=main_content_filename,
-            output_filename=output_filename,
-            cleanup_options=cleanup_options.dict(),
-            tts_overrides=tts_overrides
+        job_id = job_events.create_job(current_user.id, job_id)
+    except job_events.JobEventsError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job = dict(
+        user_id=current_user.id,
+        template_id=template.id,
+        template=convert_db_template_to_public(template),
+        main_content_filename=main_content_filename,
+        output_filename=output_filename,
+        cleanup_options=cleanup_options,
+        tts_overrides=tts_overrides,
+        export_profiles=export_profiles,
+        job_id=job_id,
+        profile=profile or x_profile
+    )
+    lane, cost = _episode_lane_and_cost(main_content_filename)
+    progress = job_events.reporter(job_id)
+    progress("job_queued", lane=lane)
+
+    def on_dispatch(wait_s: float) -> None:
+        progress("job_dispatched", queue_wait_s=round(wait_s, 2))
+
+    if not wait:
+        scheduler.get_scheduler().submit(
+            current_user.id, lane, cost, _run_episode_job_in_background, on_dispatch=on_dispatch, **job
         )
-        return {"message": "Episode processed and assembled successfully!", "output_path": str(final_path), "log": log}
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"job_id": job_id, "events_url": f"/episodes/jobs/{job_id}/events"}
+
+    try:
+        # The workflow blocks for minutes; it runs on the scheduler's workers so event
+        # streams (and every other request) are still served meanwhile.
+        return await scheduler.run(current_user.id, lane, cost, _run_episode_job, on_dispatch=on_dispatch, **job)
     except (audio_processor.AudioProcessingError, ai_enhancer.AIEnhancerError, transcription.TranscriptionError) as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -70,41 +246,391 @@ async def process_and_assemble_endpoint(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    last_event_id: Optional[int] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Streams a job's progress as server-sent events. Each event carries its sequence
+    number as the SSE id, so a reconnecting EventSource resumes where it left off.
+    """
+    try:
+        owner = await job_events.wait_for_job(job_id)
+    except job_events.JobEventsError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if owner is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if owner != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to follow this job.")
+
+    async def event_stream():
+        async for sequence, event in job_events.subscribe(job_id, after=last_event_id or 0):
+            yield f"id: {sequence}\nevent: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/search", status_code=status.HTTP_200_OK)
+async def search_transcripts(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=search_index.MAX_RESULTS),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Full-text search across the current user's episode transcripts, with timestamps."""
+    try:
+        hits = search_index.search(current_user.id, q, limit)
+    except search_index.SearchIndexError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    episode_ids = {UUID(hit["episode_id"]) for hit in hits}
+    titles = {}
+    if episode_ids:
+        episodes = session.exec(select(Episode).where(Episode.id.in_(episode_ids))).all()
+        titles = {str(e.id): e.title for e in episodes}
+    return [{**hit, "title": titles.get(hit["episode_id"])} for hit in hits]
+
+@router.get("/{episode_id}/waveform")
+async def get_episode_waveform(
+    episode_id: UUID,
+    max_peaks: Optional[int] = Query(None, ge=1),
+    level: Optional[int] = Query(None, ge=0),
+    start_s: float = Query(0.0, ge=0),
+    end_s: Optional[float] = Query(None, gt=0),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Returns precomputed waveform peaks for a rendered episode at the requested zoom level."""
+    episode = session.get(Episode, episode_id)
+    if not episode or not episode.final_audio_path:
+        raise HTTPException(status_code=404, detail="Episode not found.")
+    if episode.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this episode.")
+    peaks_path = waveform.peaks_path_for(Path(episode.final_audio_path).name)
+    return waveform_response(peaks_path, max_peaks, level, start_s, end_s)
+
+def _episode_transcript_json(session: Session, user_id: UUID, filename: str) -> Optional[Path]:
+    """Finds the word-level transcript of the user's episode that produced `filename`."""
+    episodes = session.exec(
+        select(Episode).where(Episode.user_id == user_id, Episode.transcript_path != None)
+    ).all()
+    for episode in episodes:
+        names = {Path(output["path"]).name for output in json.loads(episode.audio_outputs_json or "[]")}
+        if episode.final_audio_path:
+            names.add(Path(episode.final_audio_path).name)
+        json_path = Path(episode.transcript_path).with_suffix(".json")
+        if filename in names and json_path.exists():
+            return json_path
+    return None
+
+def _transcribe_for_metadata(file_path: Path) -> List[Dict[str, Any]]:
+    temp_upload_path = UPLOAD_DIR / file_path.name
+    shutil.copy(file_path, temp_upload_path)
+    try:
+        return transcription.get_word_timestamps(temp_upload_path.name)
+    finally:
+        os.remove(temp_upload_path)
+
 @router.post("/generate-metadata/{filename}", status_code=status.HTTP_200_OK)
-async def generate_metadata_endpoint(filename: str, current_user: User = Depends(get_current_user)):
-    """Generates a title and summary for a processed audio file."""
-    file_path = find_file_in_dirs(filename)
+async def generate_metadata_endpoint(
+    filename: str,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Generates a title, show notes, tags and chapters for a processed audio file. The
+    episode's saved transcript is used when there is one; other files are transcribed.
+    """
+    file_path = find_file_in_dirs(filename, session, current_user.id)
     if not file_path:
         raise HTTPException(status_code=404, detail=f"File '{filename}' not found in any directory.")
     try:
-        temp_upload_path = UPLOAD_DIR / file_path.name
-        shutil.copy(file_path, temp_upload_path)
-
-        word_timestamps = transcription.get_word_timestamps(temp_upload_path.name)
+        json_path = _episode_transcript_json(session, current_user.id, filename)
+        if json_path:
+            word_timestamps = metadata.load_words(json_path)
+        else:
+            word_timestamps = await scheduler.run(
+                current_user.id, scheduler.LANE_SHORT, METADATA_JOB_COST, _transcribe_for_metadata, file_path
+            )
         if not word_timestamps:
             raise HTTPException(status_code=400, detail="Transcript is empty.")
-        
-        full_transcript = " ".join([word['word'] for word in word_timestamps])
-        metadata = ai_enhancer.generate_metadata_from_transcript(full_transcript)
-        
-        os.remove(temp_upload_path)
-
-        return metadata
-    except (transcription.TranscriptionError, ai_enhancer.AIEnhancerError) as e:
+        return await scheduler.run(
+            current_user.id, scheduler.LANE_SHORT, METADATA_JOB_COST, metadata.generate_metadata, word_timestamps
+        )
+    except (transcription.TranscriptionError, ai_enhancer.AIEnhancerError, metadata.MetadataError) as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
+@router.post("/{episode_id}/metadata", status_code=status.HTTP_200_OK)
+async def generate_episode_metadata(
+    episode_id: UUID,
+    apply: bool = Body(False, embed=True),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Generates metadata from an episode's saved transcript, without re-running Whisper.
+    With apply=true the title, show notes and tags are stored on the episode.
+    """
+    episode = session.get(Episode, episode_id)
+    if not episode:
+        raise HTTPException(status_code=404, detail="Episode not found.")
+    if episode.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this episode.")
+    if not episode.transcript_path:
+        raise HTTPException(status_code=400, detail="Episode has no transcript.")
+    try:
+        words = metadata.load_words(Path(episode.transcript_path).with_suffix(".json"))
+        result = await scheduler.run(current_user.id, scheduler.LANE_SHORT, METADATA_JOB_COST, metadata.generate_metadata, words)
+    except (ai_enhancer.AIEnhancerError, metadata.MetadataError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if apply:
+        episode.title = result["title"] or episode.title
+        episode.show_notes = result["show_notes"]
+        episode.tags = ",".join(result["tags"])
+        session.add(episode)
+        session.commit()
+        if episode.status == EpisodeStatus.published:
+            feeds.invalidate(episode.template_id)
+    return result
+
+def _utc_naive(moment: datetime) -> datetime:
+    """Stored datetimes are naive UTC, like datetime.utcnow()."""
+    if moment.tzinfo:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+@router.patch("/{episode_id}", response_model=Episode)
+async def update_episode(
+    episode_id: UUID,
+    episode_in: EpisodeUpdate,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Edits an episode's details. A published episode's feed is refreshed on its next poll."""
+    episode = session.get(Episode, episode_id)
+    if not episode:
+        raise HTTPException(status_code=404, detail="Episode not found.")
+    if episode.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to edit this episode.")
+    changes = episode_in.model_dump(exclude_unset=True)
+    if changes.get("publish_at"):
+        changes["publish_at"] = _utc_naive(changes["publish_at"])
+    for field, value in changes.items():
+        setattr(episode, field, value)
+    session.add(episode)
+    session.commit()
+    session.refresh(episode)
+    if episode.status == EpisodeStatus.published:
+        feeds.invalidate(episode.template_id)
+    return episode
+
+@router.post("/{episode_id}/publish", status_code=status.HTTP_200_OK)
+async def publish_episode(
+    episode_id: UUID,
+    publish_at: Optional[datetime] = Body(None, embed=True),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Publishes an episode to its show's feed, now or at `publish_at`. A scheduled episode
+    appears in the feed by itself once its time comes.
+    """
+    episode = session.get(Episode, episode_id)
+    if not episode:
+        raise HTTPException(status_code=404, detail="Episode not found.")
+    if episode.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to publish this episode.")
+    if episode.status not in (EpisodeStatus.processed, EpisodeStatus.published):
+        raise HTTPException(status_code=400, detail=f"An episode that is {episode.status.value} cannot be published.")
+    episode.status = EpisodeStatus.published
+    episode.publish_at = _utc_naive(publish_at) if publish_at else datetime.utcnow()
+    session.add(episode)
+    session.commit()
+    feeds.invalidate(episode.template_id)
+    return {
+        "episode_id": str(episode.id),
+        "status": episode.status,
+        "publish_at": episode.publish_at,
+        "feed_url": f"/feeds/{episode.template_id}/rss.xml"
+    }
+
+def _ad_context(session: Session, episode: Episode):
+    """The episode's MP3 rendition, its frame index, bitrate and loudness target, and the owner's commercials."""
+    output = ad_insertion.mp3_output(json.loads(episode.audio_outputs_json or "[]"))
+    body_path = Path(output["path"])
+    body = mp3_frames.load_index(body_path)
+    template = crud.get_template_by_id(session=session, template_id=episode.template_id)
+    target = LoudnessTarget.model_validate_json(template.loudness_json) if template else LoudnessTarget()
+    commercials = session.exec(
+        select(MediaItem).where(MediaItem.user_id == episode.user_id, MediaItem.category == MediaCategory.commercial)
+    ).all()
+    return body_path, body, output["bitrate_kbps"], target, commercials
+
+def _prepare_ad_renditions(episode_id: UUID) -> None:
+    """Encodes the owner's commercials to match the episode, in the background."""
+    with Session(engine) as session:
+        episode = session.get(Episode, episode_id)
+        if not episode:
+            return
+        try:
+            _, body, bitrate_kbps, target, commercials = _ad_context(session, episode)
+        except (ad_insertion.AdInsertionError, mp3_frames.Mp3FramesError) as e:
+            print(f"Could not prepare ads for episode {episode_id}: {e}")
+            return
+        for item in commercials:
+            try:
+                ad_insertion.prepare_rendition(MEDIA_DIR / item.filename, item.id, body, bitrate_kbps, target)
+            except (ad_insertion.AdInsertionError, mp3_frames.Mp3FramesError) as e:
+                print(f"Could not prepare commercial {item.filename}: {e}")
+
+def _byte_range(range_header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """Parses a single-range Range header into [start, stop); None means the whole file."""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", (range_header or "").strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, stop = max(length - int(last), 0), length
+    else:
+        start, stop = int(first), min(int(last) + 1, length) if last else length
+    if start >= length or start >= stop:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+    return start, stop
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match compares weakly and may list several tags, or "*"."""
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+@router.put("/{episode_id}/ad-markers", status_code=status.HTTP_200_OK)
+async def set_ad_markers(
+    episode_id: UUID,
+    background_tasks: BackgroundTasks,
+    markers_s: List[float] = Body(..., embed=True),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Sets where commercials are inserted into the episode when it is downloaded from
+    /episodes/{episode_id}/audio.mp3. Each time is moved to a nearby MP3 frame boundary
+    that splices cleanly; the response says where every ad will actually start. The
+    library's commercials are encoded to match the episode in the background.
+    """
+    episode = session.get(Episode, episode_id)
+    if not episode:
+        raise HTTPException(status_code=404, detail="Episode not found.")
+    if episode.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this episode.")
+    try:
+        output = ad_insertion.mp3_output(json.loads(episode.audio_outputs_json or "[]"))
+        body = await run_in_threadpool(mp3_frames.load_index, Path(output["path"]))
+        markers = ad_insertion.resolve_markers(body, markers_s)
+    except (ad_insertion.AdInsertionError, mp3_frames.Mp3FramesError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    episode.ad_markers_json = json.dumps(markers)
+    session.add(episode)
+    session.commit()
+    background_tasks.add_task(_prepare_ad_renditions, episode.id)
+    return {"markers": markers, "audio_url": f"/episodes/{episode.id}/audio.mp3"}
+
+@router.get("/{episode_id}/audio.mp3")
+async def stream_episode_with_ads(
+    episode_id: UUID,
+    background_tasks: BackgroundTasks,
+    seed: Optional[str] = Query(None, max_length=128),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(get_session),
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    """
+    Serves the episode's MP3 with commercials from the owner's library spliced in at
+    its ad markers. The pre-encoded episode and ad renditions are joined frame by frame
+    under a fresh Xing header, so this costs about as much as serving a static file.
+    Ads rotate daily (or per `seed`), and byte ranges are supported for podcast players.
+    Because the file changes when the ads do, a range is only served if If-Range (when
+    sent) still names the current ETag; otherwise the whole new file is sent.
+    This is the public enclosure URL, so published episodes that are live need no
+    login; processed drafts and scheduled episodes are only served to their owner.
+    """
+    episode = session.get(Episode, episode_id)
+    if not episode or episode.status not in (EpisodeStatus.processed, EpisodeStatus.published):
+        raise HTTPException(status_code=404, detail="Episode not found.")
+    if not (episode.status == EpisodeStatus.published and feeds.is_live(episode, datetime.utcnow())):
+        if current_user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Log in to listen to an unpublished episode.",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        if episode.user_id != current_user.id:
+            raise HTTPException(status_code=404, detail="Episode not found.")
+    try:
+        body_path, body, bitrate_kbps, target, commercials = await run_in_threadpool(_ad_context, session, episode)
+    except (ad_insertion.AdInsertionError, mp3_frames.Mp3FramesError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    markers = json.loads(episode.ad_markers_json or "[]")
+    renditions = {item.id: ad_insertion.rendition_path(item.id, body, bitrate_kbps, target) for item in commercials}
+    ready = {item_id: path for item_id, path in renditions.items() if path.exists()}
+    if markers and len(ready) < len(renditions):
+        # Never encode on the download path: serve what is ready and catch up meanwhile.
+        background_tasks.add_task(_prepare_ad_renditions, episode.id)
+
+    picks = ad_insertion.choose_ads(list(ready), len(markers), f"{episode.id}:{seed or date.today().isoformat()}")
+    ads = [ready[item_id] for item_id in picks]
+    etag = ad_insertion.stream_etag(body_path, markers, ads)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Cache-Control": "private, max-age=3600",
+    }
+    if if_none_match is not None and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if if_range is not None and if_range.strip() != etag:
+        # The player's partial file belongs to another splice (or a date, and no
+        # Last-Modified is sent): resuming would stitch two files together.
+        range_header = None
+    try:
+        stream = await run_in_threadpool(ad_insertion.build_stream, body_path, body, markers, ads)
+    except mp3_frames.Mp3FramesError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    length = stream.length
+    byte_range = _byte_range(range_header, length)
+    start, stop = byte_range or (0, length)
+    headers["Content-Length"] = str(stop - start)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{length}"
+    return StreamingResponse(
+        stream.iter_range(start, stop),
+        status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        media_type="audio/mpeg",
+        headers=headers
+    )
+
 @router.post("/publish/spreaker/{filename}", status_code=status.HTTP_200_OK)
 async def publish_to_spreaker(
     filename: str,
+    session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
     show_id: str = Body(..., embed=True),
     title: str = Body(..., embed=True),
     description: Optional[str] = Body(None, embed=True)
 ):
     """Uploads a processed audio file to Spreaker as a draft."""
-    file_to_upload = find_file_in_dirs(filename)
+    file_to_upload = find_file_in_dirs(filename, session, current_user.id)
     if not file_to_upload:
         raise HTTPException(status_code=404, detail=f"File '{filename}' not found in any output directory.")
     try:
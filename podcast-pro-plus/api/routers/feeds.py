@@ -0,0 +1,70 @@
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import APIRouter, HTTPException, Header, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+from uuid import UUID
+from sqlmodel import Session, select
+
+from ..core.config import settings
+from ..core.database import engine
+from ..models.podcast import Episode, EpisodeStatus, PodcastTemplate
+from ..services import feeds
+
+router = APIRouter(
+    prefix="/feeds",
+    tags=["Feeds"],
+)
+
+def _build_feed(template_id: UUID) -> feeds.CachedFeed:
+    """Renders a show's feed from the database; only runs after an invalidation."""
+    loaded_generation = feeds.generation(template_id)
+    with Session(engine) as session:
+        template = session.get(PodcastTemplate, template_id)
+        if not template:
+            raise HTTPException(status_code=404, detail="Show not found.")
+        episodes = session.exec(
+            select(Episode).where(Episode.template_id == template_id, Episode.status == EpisodeStatus.published)
+        ).all()
+        try:
+            return feeds.render(template, episodes, settings.PUBLIC_BASE_URL.rstrip("/"), loaded_generation)
+        except feeds.FeedError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+def _not_modified(feed: feeds.CachedFeed, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    """Evaluates the conditional headers as RFC 9110 asks: If-None-Match wins when present."""
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or feed.etag in tags
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        return feed.last_modified <= since
+    return False
+
+@router.get("/{template_id}/rss.xml")
+async def get_show_feed(
+    template_id: UUID,
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None)
+):
+    """
+    The show's public podcast feed. The serialized XML is cached until an episode is
+    published or edited, so polls are answered from the cache (mostly with a 304)
+    without a database query.
+    """
+    feed = feeds.cached(template_id)
+    if feed is None:
+        feed = await run_in_threadpool(_build_feed, template_id)
+    headers = {
+        "ETag": feed.etag,
+        "Last-Modified": format_datetime(feed.last_modified.replace(tzinfo=timezone.utc), usegmt=True),
+        "Cache-Control": feeds.CACHE_CONTROL,
+    }
+    if _not_modified(feed, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+    return Response(content=feed.xml, media_type="application/rss+xml; charset=utf-8", headers=headers)
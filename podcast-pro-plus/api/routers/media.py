@@ -1,13 +1,18 @@
+import base64
 import shutil
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
-from typing import List
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional, Tuple
 from uuid import UUID
 from pathlib import Path
-from sqlmodel import Session, select
+from sqlmodel import Session, select, or_, and_
 
 from ..models.podcast import MediaItem, MediaCategory
 from ..models.user import User
 from ..core.database import get_session
+from ..core import directories
+from ..services import waveform, fingerprint, ad_insertion
 from .auth import get_current_user
 
 router = APIRouter(
@@ -16,7 +21,38 @@ router = APIRouter(
 )
 
 MEDIA_DIR = Path("media_uploads")
-MEDIA_DIR.mkdir(exist_ok=True)
+directories.register(MEDIA_DIR)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(item: MediaItem) -> str:
+    """Opaque keyset cursor pointing just past the given item."""
+    raw = f"{item.created_at.isoformat()}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        created_at, item_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(item_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+def waveform_response(
+    peaks_path: Path,
+    max_peaks: Optional[int],
+    level: Optional[int],
+    start_s: float,
+    end_s: Optional[float]
+) -> Response:
+    """Serves one zoom level of a .peaks file as raw int8 (min, max) pairs."""
+    try:
+        info, data = waveform.read_level(peaks_path, max_peaks=max_peaks, level=level, start_s=start_s, end_s=end_s)
+    except waveform.WaveformError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    headers = {f"X-Waveform-{key.replace('_', '-').title()}": str(value) for key, value in info.items()}
+    headers["Cache-Control"] = "private, max-age=3600"
+    return Response(content=data, media_type="application/octet-stream", headers=headers)
 
 @router.post("/upload/{category}", response_model=List[MediaItem], status_code=status.HTTP_201_CREATED)
 async def upload_media_files(
@@ -50,20 +86,81 @@ async def upload_media_files(
         session.add(media_item)
         created_items.append(media_item)
 
+        try:
+            await run_in_threadpool(waveform.generate_for_file, file_path)
+        except waveform.WaveformError as e:
+            print(f"Could not generate waveform for {safe_filename}: {e}")
+
     session.commit()
     for item in created_items:
         session.refresh(item)
+
+    # Main content is fingerprinted so a re-export of an earlier recording is recognised
+    # and its transcript and cleanup can be reused.
+    for item in created_items:
+        if item.category != MediaCategory.main_content:
+            continue
+        try:
+            audio_print = await run_in_threadpool(fingerprint.fingerprint_file, MEDIA_DIR / item.filename)
+            record = fingerprint.register(session, current_user.id, audio_print, item.filename, media_item_id=item.id)
+            if record.duplicate_of:
+                print(f"{item.filename} matches an earlier upload (score {record.match_score}).")
+        except fingerprint.FingerprintError as e:
+            print(f"Could not fingerprint {item.filename}: {e}")
     
     return created_items
 
 @router.get("/", response_model=List[MediaItem])
 async def list_user_media(
+    response: Response,
+    category: Optional[MediaCategory] = None,
+    prefix: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
-    """Retrieve a list of the current user's uploaded media files."""
+    """
+    Retrieve one page of the current user's media, newest first. When more items exist,
+    the cursor for the next page is returned in the X-Next-Cursor header.
+    """
     statement = select(MediaItem).where(MediaItem.user_id == current_user.id)
-    return session.exec(statement).all()
+    if category:
+        statement = statement.where(MediaItem.category == category)
+    if prefix:
+        # Stored filenames carry the owner's id as a prefix; see upload_media_files.
+        statement = statement.where(MediaItem.filename.startswith(f"{current_user.id}_{prefix}", autoescape=True))
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        statement = statement.where(or_(
+            MediaItem.created_at < created_at,
+            and_(MediaItem.created_at == created_at, MediaItem.id < item_id),
+        ))
+    statement = statement.order_by(MediaItem.created_at.desc(), MediaItem.id.desc()).limit(limit + 1)
+
+    items = session.exec(statement).all()
+    if len(items) > limit:
+        items = items[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(items[-1])
+    return items
+
+@router.get("/{media_id}/waveform")
+async def get_media_waveform(
+    media_id: UUID,
+    max_peaks: Optional[int] = Query(None, ge=1),
+    level: Optional[int] = Query(None, ge=0),
+    start_s: float = Query(0.0, ge=0),
+    end_s: Optional[float] = Query(None, gt=0),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Returns precomputed waveform peaks for a library item at the requested zoom level."""
+    media_item = session.get(MediaItem, media_id)
+    if not media_item:
+        raise HTTPException(status_code=404, detail="Media item not found.")
+    if media_item.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this item.")
+    return waveform_response(waveform.peaks_path_for(media_item.filename), max_peaks, level, start_s, end_s)
 
 @router.delete("/{media_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_media_item(
@@ -83,7 +180,13 @@ async def delete_media_item(
     file_path = MEDIA_DIR / media_item.filename
     if file_path.exists():
         file_path.unlink()
+    peaks_path = waveform.peaks_path_for(media_item.filename)
+    if peaks_path.exists():
+        peaks_path.unlink()
         
+    fingerprint.forget_media_item(session, media_item.id)
+    if media_item.category == MediaCategory.commercial:
+        ad_insertion.forget_renditions(media_item.id)
     session.delete(media_item)
     session.commit()
     
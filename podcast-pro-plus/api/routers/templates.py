@@ -8,6 +8,7 @@ from ..models.podcast import PodcastTemplate, PodcastTemplateCreate, PodcastTemp
 from ..models.user import User
 from ..core.database import get_session
 from ..core import crud
+from ..services import feeds
 from .auth import get_current_user
 
 router = APIRouter(
@@ -23,7 +24,8 @@ def convert_db_template_to_public(db_template: PodcastTemplate) -> PodcastTempla
         name=db_template.name,
         segments=json.loads(db_template.segments_json),
         background_music_rules=json.loads(db_template.background_music_rules_json),
-        timing=json.loads(db_template.timing_json)
+        timing=json.loads(db_template.timing_json),
+        loudness=json.loads(db_template.loudness_json)
     )
 
 @router.get("/", response_model=List[PodcastTemplatePublic])
@@ -81,8 +83,10 @@ async def update_template(
     db_template.segments_json = json.dumps([s.model_dump(mode='json') for s in template_in.segments])
     db_template.background_music_rules_json = json.dumps([r.model_dump(mode='json') for r in template_in.background_music_rules])
     db_template.timing_json = template_in.timing.model_dump_json()
+    db_template.loudness_json = template_in.loudness.model_dump_json()
     
     session.add(db_template)
     session.commit()
     session.refresh(db_template)
+    feeds.invalidate(db_template.id) # The show's name heads its feed
     return convert_db_template_to_public(db_template)
\ No newline at end of file
@@ -0,0 +1,124 @@
+import hashlib
+import random
+from pathlib import Path
+from typing import List, Dict, Any
+from uuid import UUID
+
+from ..core import directories
+from ..models.podcast import ExportProfile, LoudnessTarget
+from . import exporter, loudness, mp3_frames
+from .audio_buffer import AudioBuffer, conform
+
+# Commercials are encoded once per episode format (sample rate, channels, bitrate and
+# loudness target), so that at download time they can be joined to the episode frame
+# by frame, without decoding or encoding anything.
+RENDITIONS_DIR = Path("ad_renditions")
+directories.register(RENDITIONS_DIR)
+
+# A marker may move by up to this much to land on a frame boundary that splices cleanly.
+SPLICE_SEARCH_S = 2.0
+MAX_MARKERS = 20
+
+class AdInsertionError(Exception):
+    """Custom exception for dynamic ad insertion failures."""
+    pass
+
+def mp3_output(outputs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """The episode's MP3 rendition, which ads are spliced into."""
+    for output in outputs:
+        if output.get("format") == "mp3" and Path(output["path"]).exists():
+            return output
+    raise AdInsertionError("The episode has no MP3 rendition to insert ads into.")
+
+def resolve_markers(body: mp3_frames.FrameIndex, times_s: List[float]) -> List[Dict[str, Any]]:
+    """
+    Moves each requested insertion time to the nearest frame boundary that splices
+    cleanly. The frame is what downloads use; time_s is where the ad actually starts.
+    """
+    if len(times_s) > MAX_MARKERS:
+        raise AdInsertionError(f"At most {MAX_MARKERS} ad markers are allowed.")
+    markers = []
+    for requested in sorted(times_s):
+        if not 0 <= requested <= body.duration_s:
+            raise AdInsertionError(f"Ad marker at {requested}s is outside the episode (0-{body.duration_s:.1f}s).")
+        frame, clean = body.splice_point(requested, SPLICE_SEARCH_S)
+        if markers and frame == markers[-1]["frame"]:
+            continue
+        markers.append({
+            "requested_s": requested,
+            "frame": frame,
+            "time_s": round(body.frame_time(frame), 3),
+            "clean": clean,
+        })
+    return markers
+
+def rendition_path(media_item_id: UUID, body: mp3_frames.FrameIndex, bitrate_kbps: int, target: LoudnessTarget) -> Path:
+    variant = f"{body.sample_rate}hz_{body.channels}ch_{bitrate_kbps}k_{target.integrated_lufs:g}lufs"
+    return RENDITIONS_DIR / f"{media_item_id}_{variant}.mp3"
+
+def prepare_rendition(
+    media_path: Path,
+    media_item_id: UUID,
+    body: mp3_frames.FrameIndex,
+    bitrate_kbps: int,
+    target: LoudnessTarget
+) -> Path:
+    """
+    Encodes a commercial to match the episode (format and loudness), unless that has
+    been done already. This is the only place ads are ever encoded.
+    """
+    path = rendition_path(media_item_id, body, bitrate_kbps, target)
+    if path.exists():
+        return path
+    try:
+        audio = conform(AudioBuffer.from_file(media_path), body.sample_rate, body.channels, 2)
+    except Exception as e:
+        raise AdInsertionError(f"Could not read commercial {media_path.name}: {e}")
+    gain_db = loudness.plan_gain(loudness.measure(audio), target).gain_db
+    # Encode under a temporary name so a download never picks up a half-written file.
+    profile = ExportProfile(name=path.stem.split("_", 1)[1], format="mp3", bitrate_kbps=bitrate_kbps)
+    try:
+        output = exporter.export_profiles(audio, f"{media_item_id}.partial", RENDITIONS_DIR, [profile], gain_db=gain_db)
+    except exporter.ExportError as e:
+        raise AdInsertionError(f"Could not encode commercial {media_path.name}: {e}")
+    partial = Path(output[0]["path"])
+    if not body.compatible_with(mp3_frames.load_index(partial)):
+        partial.unlink()
+        raise AdInsertionError(f"The encoder did not produce a rendition of {media_path.name} matching the episode.")
+    partial.replace(path)
+    return path
+
+def forget_renditions(media_item_id: UUID) -> None:
+    """Deletes every rendition of a commercial, e.g. when it leaves the library."""
+    for path in RENDITIONS_DIR.glob(f"{media_item_id}_*.mp3"):
+        path.unlink(missing_ok=True)
+
+def choose_ads(pool: List[UUID], count: int, seed: str) -> List[UUID]:
+    """
+    Picks an ad for each of `count` markers. Ads do not repeat within an episode until
+    the pool runs out, and the same seed always gives the same picks, so the byte
+    ranges a player requests separately belong to one and the same file.
+    """
+    if not pool or count == 0:
+        return []
+    order = random.Random(seed).sample(sorted(pool), len(pool))
+    return [order[i % len(order)] for i in range(count)]
+
+def build_stream(
+    body_path: Path,
+    body: mp3_frames.FrameIndex,
+    markers: List[Dict[str, Any]],
+    ads: List[Path]
+) -> mp3_frames.SplicedStream:
+    """Splices one ad into each marker (in order) for as many ads as there are."""
+    inserts = [(marker["frame"], path, mp3_frames.load_index(path)) for marker, path in zip(markers, ads)]
+    return mp3_frames.splice(body_path, body, inserts)
+
+def stream_etag(body_path: Path, markers: List[Dict[str, Any]], ads: List[Path]) -> str:
+    """Identifies one personalised file: the body and ads as they are on disk, and where they go."""
+    digest = hashlib.sha1()
+    for path in [body_path, *ads]:
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    digest.update(",".join(str(marker["frame"]) for marker in markers).encode())
+    return f'"{digest.hexdigest()}"'
@@ -1,15 +1,10 @@
-import openai
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List
 from pydub import AudioSegment
-from elevenlabs.client import ElevenLabs
 import io
 
-from ..core.config import settings
-
-# Initialize clients
-openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-elevenlabs_client = ElevenLabs(api_key=settings.ELEVENLABS_API_KEY)
+from ..core.clients import get_openai_client, get_elevenlabs_client
+from . import provider_gateway
 
 
 class AIEnhancerError(Exception):
@@ -24,18 +19,78 @@ def generate_metadata_from_transcript(transcript: str) -> Dict[str, Any]:
     relevant keywords or tags. The output must be a valid JSON object.
     """
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo-1106",
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Here is the transcript:\n\n{transcript}"}
-            ]
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Here is the transcript:\n\n{transcript}"}
+        ]
+        response = provider_gateway.call(
+            "openai", "gpt-3.5-turbo-1106",
+            lambda: get_openai_client().chat.completions.create(
+                model="gpt-3.5-turbo-1106",
+                response_format={"type": "json_object"},
+                messages=messages
+            ),
+            key=messages
         )
         return json.loads(response.choices[0].message.content)
     except Exception as e:
         raise AIEnhancerError(f"Failed to generate metadata: {e}")
 
+def summarize_transcript_section(section_text: str, start_s: float, end_s: float) -> Dict[str, Any]:
+    """Map step of metadata generation: summarizes one timestamped transcript section."""
+    system_prompt = """
+    You are an expert podcast producer. You will receive one section of a longer podcast
+    transcript, with [HH:MM:SS] timestamps. Summarize what is discussed in it, list its key
+    topics, and propose chapter titles with the start time (in seconds) where each topic
+    begins. The output must be a valid JSON object of the form
+    {"summary": "...", "topics": ["..."], "chapters": [{"title": "...", "start_s": 0}]}
+    """
+    try:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Section from {start_s:.0f}s to {end_s:.0f}s:\n\n{section_text}"}
+        ]
+        response = provider_gateway.call(
+            "openai", "gpt-3.5-turbo-1106",
+            lambda: get_openai_client().chat.completions.create(
+                model="gpt-3.5-turbo-1106",
+                response_format={"type": "json_object"},
+                messages=messages
+            ),
+            key=messages
+        )
+        return json.loads(response.choices[0].message.content)
+    except Exception as e:
+        raise AIEnhancerError(f"Failed to summarize transcript section: {e}")
+
+def merge_section_summaries(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reduce step of metadata generation: merges section summaries into episode metadata."""
+    system_prompt = """
+    You are an expert podcast producer. You will receive summaries of consecutive sections
+    of one podcast episode, each with its time range, topics and proposed chapters. Write a
+    compelling episode title, show notes covering the whole episode, a list of relevant tags,
+    and a final list of chapters (merge or drop proposed chapters so there is one per major
+    topic, keeping their start times in seconds). The output must be a valid JSON object of
+    the form {"title": "...", "show_notes": "...", "tags": ["..."], "chapters": [{"title": "...", "start_s": 0}]}
+    """
+    try:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": json.dumps(summaries)}
+        ]
+        response = provider_gateway.call(
+            "openai", "gpt-4-turbo",
+            lambda: get_openai_client().chat.completions.create(
+                model="gpt-4-turbo",
+                response_format={"type": "json_object"},
+                messages=messages
+            ),
+            key=messages
+        )
+        return json.loads(response.choices[0].message.content)
+    except Exception as e:
+        raise AIEnhancerError(f"Failed to merge section summaries: {e}")
+
 def interpret_intern_command(command_text: str) -> Dict[str, Any]:
     """Interprets a spoken command to determine action and topic."""
     system_prompt = """
@@ -43,18 +98,61 @@ def interpret_intern_command(command_text: str) -> Dict[str, Any]:
     ('add_to_shownotes' or 'generate_audio') and the topic. Output must be valid JSON.
     """
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4-turbo",
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": command_text}
-            ]
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": command_text}
+        ]
+        response = provider_gateway.call(
+            "openai", "gpt-4-turbo",
+            lambda: get_openai_client().chat.completions.create(
+                model="gpt-4-turbo",
+                response_format={"type": "json_object"},
+                messages=messages
+            ),
+            key=messages
         )
         return json.loads(response.choices[0].message.content)
     except Exception as e:
         raise AIEnhancerError(f"Failed to interpret command: {e}")
 
+def interpret_intern_commands(command_texts: List[str]) -> List[Dict[str, Any]]:
+    """
+    Interprets several spoken commands in one LLM call. Returns one {action, topic}
+    per command, in order; any the model leaves out are interpreted individually.
+    """
+    if not command_texts:
+        return []
+    system_prompt = """
+    You are an assistant that interprets spoken commands for a podcast AI. For each numbered
+    command, determine the action ('add_to_shownotes' or 'generate_audio') and the topic.
+    Output must be valid JSON of the form
+    {"commands": [{"index": 0, "action": "generate_audio", "topic": "..."}]}
+    with exactly one entry per command.
+    """
+    numbered = "\n".join(f"{i}. {text}" for i, text in enumerate(command_texts))
+    try:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": numbered}
+        ]
+        response = provider_gateway.call(
+            "openai", "gpt-4-turbo",
+            lambda: get_openai_client().chat.completions.create(
+                model="gpt-4-turbo",
+                response_format={"type": "json_object"},
+                messages=messages
+            ),
+            key=messages
+        )
+        parsed = json.loads(response.choices[0].message.content).get("commands", [])
+        by_index = {int(c["index"]): c for c in parsed if isinstance(c, dict) and "index" in c}
+    except Exception as e:
+        raise AIEnhancerError(f"Failed to interpret commands: {e}")
+    return [
+        by_index[i] if i in by_index else interpret_intern_command(text)
+        for i, text in enumerate(command_texts)
+    ]
+
 def get_answer_for_topic(topic: str) -> str:
     """Gets a concise answer to a topic from an LLM."""
     # --- FIX: Updated prompt to be more specific about length ---
@@ -64,12 +162,14 @@ def get_answer_for_topic(topic: str) -> str:
     The response is for a spoken answer in a podcast, so keep it brief and natural.
     """
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": topic}
-            ]
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": topic}
+        ]
+        response = provider_gateway.call(
+            "openai", "gpt-4-turbo",
+            lambda: get_openai_client().chat.completions.create(model="gpt-4-turbo", messages=messages),
+            key=messages
         )
         return response.choices[0].message.content
     except Exception as e:
@@ -78,11 +178,13 @@ def get_answer_for_topic(topic: str) -> str:
 def generate_speech_from_text(text: str, voice_id: str = "19B4gjtpL5m876wS3Dfg") -> AudioSegment:
     """Generates an audio segment from text using ElevenLabs."""
     try:
-        audio_stream = elevenlabs_client.text_to_speech.stream(
-            text=text,
-            voice_id=voice_id
+        # The stream is drained inside the gateway call so a retry re-requests the
+        # whole clip, and the bytes can be shared with identical in-flight requests.
+        audio_bytes = provider_gateway.call(
+            "elevenlabs", "text_to_speech",
+            lambda: b"".join(get_elevenlabs_client().text_to_speech.stream(text=text, voice_id=voice_id)),
+            key={"text": text, "voice_id": voice_id}
         )
-        audio_bytes = b"".join(chunk for chunk in audio_stream)
         if not audio_bytes:
             raise AIEnhancerError("Failed to generate speech: Received empty audio stream from ElevenLabs.")
         audio_buffer = io.BytesIO(audio_bytes)
@@ -0,0 +1,336 @@
+import asyncio
+import hashlib
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Dict, List
+from uuid import UUID
+from pydub import AudioSegment
+from sqlmodel import Session, select
+
+from ..core.config import settings
+from ..core.database import engine
+from ..models.artifact import Artifact, ArtifactKind
+from .audio_buffer import AudioBuffer
+
+# How long each kind of artifact is kept after it is written. None keeps it until it
+# is deleted explicitly. Intermediates only need to outlive the job that made them
+# (plus some slack for re-runs); deliverables are kept.
+RETENTION_POLICIES: Dict[ArtifactKind, Optional[timedelta]] = {
+    ArtifactKind.upload: timedelta(days=7),
+    ArtifactKind.cleaned_audio: timedelta(days=3),
+    ArtifactKind.edited_audio: timedelta(days=3),
+    ArtifactKind.ai_segment: timedelta(days=1),
+    ArtifactKind.final_audio: None,
+    ArtifactKind.transcript: None,
+    ArtifactKind.waveform: None,
+}
+
+# Intermediates are written as WAV so they can be memory-mapped while a job is using
+# them. Only kinds kept long term (no expiry, or at least COMPRESS_MIN_RETENTION) are
+# compressed to FLAC (lossless, roughly half the size) once cold; with the default
+# policies above that is none of them, as an encode for a file deleted a few days
+# later costs more than the space it saves. Cleaned audio is never compressed: the
+# fingerprint cache reuses it by path as a WAV.
+COMPRESSIBLE_KINDS = {ArtifactKind.edited_audio, ArtifactKind.ai_segment}
+COMPRESS_AFTER = timedelta(days=1)
+COMPRESS_MIN_RETENTION = timedelta(days=14)
+COMPRESS_MIN_BYTES = 16 * 1024 * 1024
+
+# Remote artifacts are downloaded here on first local use.
+CACHE_DIR = Path("artifact_cache")
+HASH_BLOCK_BYTES = 1024 * 1024
+GC_BATCH_SIZE = 500
+
+class ArtifactStoreError(Exception):
+    """Custom exception for artifact storage failures."""
+    pass
+
+class LocalBackend:
+    """Stores artifacts on the local filesystem; keys are paths relative to `root`."""
+    name = "local"
+
+    def __init__(self, root: Path = Path(".")):
+        self.root = root
+
+    def put(self, key: str, source: Path) -> None:
+        target = self.root / key
+        if target.resolve() != source.resolve():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, target)
+
+    def fetch(self, key: str) -> Path:
+        path = self.root / key
+        if not path.exists():
+            raise ArtifactStoreError(f"Artifact missing from local storage: {key}")
+        return path
+
+    def delete(self, key: str) -> None:
+        (self.root / key).unlink(missing_ok=True)
+
+class S3Backend:
+    """
+    Stores artifacts in an S3-compatible bucket. Works against AWS or any local
+    stand-in (MinIO, moto server) via `endpoint_url`. The pipeline's own copy under
+    `root` is left in place for the job and the routes that read it directly, and is
+    removed along with the object when the artifact is deleted.
+    """
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        cache_dir: Path = CACHE_DIR,
+        root: Path = Path(".")
+    ):
+        try:
+            import boto3
+        except ImportError:
+            raise ArtifactStoreError("The S3 artifact backend requires boto3 (pip install boto3).")
+        self.bucket = bucket
+        self.cache_dir = cache_dir
+        self.root = root
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+        )
+
+    def put(self, key: str, source: Path) -> None:
+        self.client.upload_file(str(source), self.bucket, key)
+
+    def fetch(self, key: str) -> Path:
+        path = self.cache_dir / key
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            partial = path.with_name(path.name + ".part")
+            self.client.download_file(self.bucket, key, str(partial))
+            partial.replace(path)
+        return path
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        (self.cache_dir / key).unlink(missing_ok=True)
+        (self.root / key).unlink(missing_ok=True)
+
+_backend = None
+
+def get_backend():
+    """Returns the configured backend, created once per process."""
+    global _backend
+    if _backend is None:
+        if settings.ARTIFACT_BACKEND == "s3":
+            _backend = S3Backend(
+                bucket=settings.S3_BUCKET,
+                endpoint_url=settings.S3_ENDPOINT_URL,
+                region=settings.S3_REGION,
+                access_key_id=settings.S3_ACCESS_KEY_ID,
+                secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            )
+        elif settings.ARTIFACT_BACKEND == "local":
+            _backend = LocalBackend()
+        else:
+            raise ArtifactStoreError(f"Unknown artifact backend: {settings.ARTIFACT_BACKEND}")
+    return _backend
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def register(session: Session, path: Path, kind: ArtifactKind, user_id: Optional[UUID] = None) -> Artifact:
+    """
+    Stores a pipeline output through the configured backend and records it in the
+    index. Re-registering the same key updates the existing entry.
+    """
+    if not path.exists():
+        raise ArtifactStoreError(f"Cannot register missing file: {path}")
+    key = path.as_posix()
+    backend = get_backend()
+    try:
+        backend.put(key, path)
+    except Exception as e:
+        raise ArtifactStoreError(f"Failed to store {key}: {e}")
+
+    now = datetime.utcnow()
+    retention = RETENTION_POLICIES.get(kind)
+    artifact = session.exec(select(Artifact).where(Artifact.key == key)).first() or Artifact(
+        key=key, name=path.name, kind=kind, size_bytes=0, sha256=""
+    )
+    artifact.kind = kind
+    artifact.user_id = user_id
+    artifact.backend = backend.name
+    artifact.size_bytes = path.stat().st_size
+    artifact.sha256 = _sha256(path)
+    artifact.created_at = now
+    artifact.expires_at = now + retention if retention else None
+    session.add(artifact)
+    session.commit()
+    session.refresh(artifact)
+    return artifact
+
+def register_many(session: Session, entries: List[Dict[str, str]], user_id: Optional[UUID] = None) -> List[Artifact]:
+    """Registers the {"kind", "path"} entries a pipeline run reports in its result."""
+    return [register(session, Path(e["path"]), ArtifactKind(e["kind"]), user_id) for e in entries]
+
+def lookup(session: Session, name: str, user_id: Optional[UUID] = None) -> Optional[Artifact]:
+    """The newest index entry for a filename."""
+    statement = select(Artifact).where(Artifact.name == name)
+    if user_id is not None:
+        statement = statement.where(Artifact.user_id == user_id)
+    return session.exec(statement.order_by(Artifact.created_at.desc())).first()
+
+def fetch(artifact: Artifact) -> Optional[Path]:
+    """
+    A local path to an indexed artifact's bytes, or None if the backend no longer has
+    them. A WAV that was compressed to FLAC is decoded back into the cache, so callers
+    always get the container the name promises.
+    """
+    try:
+        path = get_backend().fetch(artifact.key)
+        if _is_compressed(artifact):
+            path = _decoded_wav(artifact.key, path)
+        return path
+    except ArtifactStoreError:
+        return None
+    except Exception as e:
+        raise ArtifactStoreError(f"Failed to fetch {artifact.key}: {e}")
+
+def find(session: Session, name: str, user_id: Optional[UUID] = None) -> Optional[Path]:
+    """Looks up an artifact by filename through the index and returns a local path to it."""
+    artifact = lookup(session, name, user_id)
+    return fetch(artifact) if artifact else None
+
+def collect_garbage(session: Session, now: Optional[datetime] = None) -> int:
+    """Deletes every artifact whose retention period has passed. Returns the count."""
+    now = now or datetime.utcnow()
+    backend = get_backend()
+    deleted = 0
+    while True:
+        expired = session.exec(
+            select(Artifact).where(Artifact.expires_at != None, Artifact.expires_at <= now).limit(GC_BATCH_SIZE)
+        ).all()
+        batch_deleted = 0
+        for artifact in expired:
+            try:
+                backend.delete(artifact.key)
+                if _is_compressed(artifact):
+                    _decoded_path(artifact.key).unlink(missing_ok=True)
+            except Exception as e:
+                print(f"Artifact GC could not delete {artifact.key}: {e}")
+                continue
+            session.delete(artifact)
+            batch_deleted += 1
+        session.commit()
+        deleted += batch_deleted
+        # Stop on a short batch, or if nothing in a full batch could be deleted (the
+        # failures stay expired and are retried on the next run).
+        if len(expired) < GC_BATCH_SIZE or batch_deleted == 0:
+            return deleted
+
+def _kept_long_term(kind: ArtifactKind) -> bool:
+    retention = RETENTION_POLICIES.get(kind)
+    return retention is None or retention >= COMPRESS_MIN_RETENTION
+
+def _should_compress(artifact: Artifact, now: datetime) -> bool:
+    return (
+        artifact.kind in COMPRESSIBLE_KINDS
+        and _kept_long_term(artifact.kind)
+        and artifact.key.lower().endswith(".wav")
+        and artifact.size_bytes >= COMPRESS_MIN_BYTES
+        and artifact.created_at <= now - COMPRESS_AFTER
+        and (artifact.expires_at is None or artifact.expires_at - now >= COMPRESS_MIN_RETENTION)
+    )
+
+def _is_compressed(artifact: Artifact) -> bool:
+    return artifact.key.lower().endswith(".flac") and artifact.name.lower().endswith(".wav")
+
+def _decoded_path(key: str) -> Path:
+    return CACHE_DIR / "decoded" / Path(key).with_suffix(".wav")
+
+def _transcode(source: Path, target: Path, codec: str) -> None:
+    command = [AudioSegment.converter, "-y", "-hide_banner", "-loglevel", "error", "-i", str(source), "-c:a", codec, str(target)]
+    completed = subprocess.run(command, stderr=subprocess.PIPE)
+    if completed.returncode != 0:
+        raise ArtifactStoreError(f"{codec} transcode failed: {completed.stderr.decode(errors='replace').strip()}")
+
+def _decoded_wav(key: str, flac_path: Path) -> Path:
+    path = _decoded_path(key)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(path.stem + ".part.wav")
+        _transcode(flac_path, partial, "pcm_s16le")
+        partial.replace(path)
+    return path
+
+def compress_cold_intermediates(session: Session, now: Optional[datetime] = None) -> int:
+    """
+    Re-stores cold, long-kept WAV intermediates as FLAC. The artifact keeps its name,
+    so lookups by filename still find it; only its key and stored bytes change.
+    """
+    now = now or datetime.utcnow()
+    kinds = [kind for kind in COMPRESSIBLE_KINDS if _kept_long_term(kind)]
+    if not kinds:
+        return 0
+    backend = get_backend()
+    candidates = session.exec(
+        select(Artifact).where(
+            Artifact.kind.in_(kinds),
+            Artifact.size_bytes >= COMPRESS_MIN_BYTES,
+            Artifact.created_at <= now - COMPRESS_AFTER
+        )
+    ).all()
+    compressed = 0
+    for artifact in candidates:
+        if not _should_compress(artifact, now):
+            continue
+        new_key = artifact.key[:-len(".wav")] + ".flac"
+        try:
+            source = backend.fetch(artifact.key)
+            if AudioBuffer.open_wav(source).sample_width != 2:
+                continue  # Decoded back as 16-bit PCM; float mixes are left as they are.
+            with tempfile.TemporaryDirectory() as tmp:
+                flac_path = Path(tmp) / Path(new_key).name
+                _transcode(source, flac_path, "flac")
+                backend.put(new_key, flac_path)
+                artifact.size_bytes = flac_path.stat().st_size
+                artifact.sha256 = _sha256(flac_path)
+            backend.delete(artifact.key)
+        except Exception as e:
+            print(f"Artifact compression skipped {artifact.key}: {e}")
+            continue
+        artifact.key = new_key
+        session.add(artifact)
+        session.commit()
+        compressed += 1
+    return compressed
+
+def _collect_garbage_once() -> int:
+    with Session(engine) as session:
+        deleted = collect_garbage(session)
+        compressed = compress_cold_intermediates(session)
+        if compressed:
+            print(f"Artifact maintenance compressed {compressed} intermediates to FLAC.")
+        return deleted
+
+async def run_garbage_collector() -> None:
+    """Background loop, started with the app, that applies retention policies."""
+    interval_s = settings.ARTIFACT_GC_INTERVAL_MINUTES * 60
+    while True:
+        try:
+            deleted = await asyncio.to_thread(_collect_garbage_once)
+            if deleted:
+                print(f"Artifact GC removed {deleted} expired artifacts.")
+        except Exception as e:
+            print(f"Artifact GC failed: {e}")
+        await asyncio.sleep(interval_s)
@@ -0,0 +1,361 @@
+import struct
+import subprocess
+import wave
+import numpy as np
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+from pydub import AudioSegment
+
+# Only 16- and 32-bit PCM are handled natively. Other widths (8- and 24-bit) are
+# widened when a segment enters a buffer.
+SAMPLE_DTYPES = {2: np.int16, 4: np.int32}
+
+# In-place mixing and float write-back work on blocks of this many frames, so no
+# full-length temporary is ever allocated.
+MIX_BLOCK_FRAMES = 256 * 1024
+
+# WAV format tags accepted for memory mapping (integer PCM only).
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+RIFF_HEADER = struct.Struct("<4sI4s")
+CHUNK_HEADER = struct.Struct("<4sI")
+FMT_CHUNK = struct.Struct("<HHIIHH")
+
+class AudioBufferError(Exception):
+    """Custom exception for audio buffer failures."""
+    pass
+
+class AudioBuffer:
+    """
+    Interleaved integer PCM held as a (frames, channels) NumPy array.
+
+    Slicing returns views and gain, fades and overlays work in place, so the pipeline
+    can cut and mix an episode without a bytes copy per operation the way pydub does.
+    It exposes the AudioSegment attributes the analysis and export services read
+    (frame_rate, channels, sample_width, frame_width, raw_data, duration_seconds), so
+    either type can be passed to them. Convert with from_segment/to_segment at the
+    edges, where audio is decoded or handed to pydub.
+    """
+    __slots__ = ("samples", "frame_rate")
+
+    def __init__(self, samples: np.ndarray, frame_rate: int):
+        if samples.ndim != 2 or samples.dtype not in (np.int16, np.int32):
+            raise AudioBufferError("Samples must be a (frames, channels) int16 or int32 array.")
+        self.samples = samples
+        self.frame_rate = frame_rate
+
+    # --- Construction and conversion ---
+
+    @classmethod
+    def from_segment(cls, audio: AudioSegment, copy: bool = False) -> "AudioBuffer":
+        """
+        Wraps a segment's PCM. Without copy the buffer is a read-only view of the
+        segment's bytes; pass copy=True (or call writable()) before editing in place.
+        """
+        if audio.sample_width not in SAMPLE_DTYPES:
+            audio = audio.set_sample_width(4 if audio.sample_width > 2 else 2)
+        samples = np.frombuffer(audio.raw_data, dtype=SAMPLE_DTYPES[audio.sample_width]).reshape(-1, audio.channels)
+        return cls(samples.copy() if copy else samples, audio.frame_rate)
+
+    @classmethod
+    def from_file(cls, path: Path) -> "AudioBuffer":
+        """Memory-maps integer PCM WAV files; anything else is decoded through pydub."""
+        if path.suffix.lower() == ".wav":
+            try:
+                return cls.open_wav(path)
+            except AudioBufferError:
+                pass  # e.g. float or 24-bit WAV: let ffmpeg convert it.
+        return cls.from_segment(AudioSegment.from_file(path))
+
+    @classmethod
+    def open_wav(cls, path: Path) -> "AudioBuffer":
+        """
+        Maps a 16/32-bit PCM WAV file read-only without decoding it. Pages are read
+        on demand and shared through the page cache, so any number of stages or
+        worker processes can open the same intermediate at no extra memory cost.
+        """
+        with open(path, "rb") as f:
+            header = f.read(RIFF_HEADER.size)
+            if len(header) < RIFF_HEADER.size:
+                raise AudioBufferError(f"Not a WAV file: {path.name}")
+            riff, _, wave_id = RIFF_HEADER.unpack(header)
+            if riff != b"RIFF" or wave_id != b"WAVE":
+                raise AudioBufferError(f"Not a WAV file: {path.name}")
+            fmt = None
+            while True:
+                chunk = f.read(CHUNK_HEADER.size)
+                if len(chunk) < CHUNK_HEADER.size:
+                    raise AudioBufferError(f"WAV file has no data chunk: {path.name}")
+                chunk_id, chunk_size = CHUNK_HEADER.unpack(chunk)
+                if chunk_id == b"fmt ":
+                    body = f.read(chunk_size + chunk_size % 2)
+                    fmt = FMT_CHUNK.unpack(body[:FMT_CHUNK.size])
+                    if fmt[0] == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                        fmt = (struct.unpack("<H", body[24:26])[0],) + fmt[1:]
+                elif chunk_id == b"data":
+                    data_offset = f.tell()
+                    break
+                else:
+                    f.seek(chunk_size + chunk_size % 2, 1)
+        if fmt is None:
+            raise AudioBufferError(f"WAV file has no fmt chunk: {path.name}")
+        format_tag, channels, frame_rate, _, _, bits = fmt
+        sample_width = bits // 8
+        if format_tag != WAVE_FORMAT_PCM or sample_width not in SAMPLE_DTYPES:
+            raise AudioBufferError(f"Only 16/32-bit integer PCM WAV can be mapped: {path.name}")
+        # Streamed WAVs can carry a placeholder data size, so the file size is used.
+        frame_count = (path.stat().st_size - data_offset) // (sample_width * channels)
+        if frame_count <= 0:
+            return cls.silent(0, frame_rate, channels, sample_width)
+        samples = np.memmap(
+            path, dtype=SAMPLE_DTYPES[sample_width], mode="r",
+            offset=data_offset, shape=(frame_count, channels)
+        )
+        return cls(samples, frame_rate)
+
+    @classmethod
+    def create_wav(cls, path: Path, frame_count: int, frame_rate: int, channels: int, sample_width: int = 2) -> "AudioBuffer":
+        """
+        Creates a silent PCM WAV file of the given length and maps it writable. Whatever
+        is written to the buffer lands in the file through the page cache, so a
+        full-length render never has to fit in the process's own memory.
+        """
+        if sample_width not in SAMPLE_DTYPES:
+            raise AudioBufferError(f"Unsupported sample width: {sample_width}")
+        frame_count = max(0, frame_count)
+        data_size = frame_count * channels * sample_width
+        fmt = FMT_CHUNK.pack(WAVE_FORMAT_PCM, channels, frame_rate, frame_rate * channels * sample_width,
+                             channels * sample_width, 8 * sample_width)
+        header = (
+            RIFF_HEADER.pack(b"RIFF", min(0xFFFFFFFF, 4 + CHUNK_HEADER.size * 2 + len(fmt) + data_size), b"WAVE")
+            + CHUNK_HEADER.pack(b"fmt ", len(fmt)) + fmt
+            + CHUNK_HEADER.pack(b"data", min(0xFFFFFFFF, data_size))
+        )
+        with open(path, "wb") as f:
+            f.write(header)
+            f.truncate(len(header) + data_size) # Sparse zeros: silence
+        if frame_count == 0:
+            return cls.silent(0, frame_rate, channels, sample_width)
+        samples = np.memmap(
+            path, dtype=SAMPLE_DTYPES[sample_width], mode="r+",
+            offset=len(header), shape=(frame_count, channels)
+        )
+        return cls(samples, frame_rate)
+
+    @classmethod
+    def decode_to_wav(cls, source: Path, target: Path) -> "AudioBuffer":
+        """
+        Decodes any file ffmpeg reads to 16-bit PCM WAV on disk and maps the result, so
+        compressed uploads are never decoded into memory.
+        """
+        command = [
+            AudioSegment.converter, "-y", "-hide_banner", "-loglevel", "error",
+            "-i", str(source), "-vn", "-acodec", "pcm_s16le", "-f", "wav", str(target),
+        ]
+        completed = subprocess.run(command, capture_output=True)
+        if completed.returncode != 0:
+            raise AudioBufferError(f"Could not decode {source.name}: {completed.stderr.decode(errors='replace').strip()}")
+        return cls.open_wav(target)
+
+    def write_wav(self, path: Path) -> Path:
+        """Writes the buffer as a PCM WAV file in blocks, without building a bytes copy."""
+        with wave.open(str(path), "wb") as f:
+            f.setnchannels(self.channels)
+            f.setsampwidth(self.sample_width)
+            f.setframerate(self.frame_rate)
+            for start in range(0, len(self.samples), MIX_BLOCK_FRAMES):
+                f.writeframesraw(np.ascontiguousarray(self.samples[start:start + MIX_BLOCK_FRAMES]))
+        return path
+
+    @classmethod
+    def silent(cls, frame_count: int, frame_rate: int, channels: int, sample_width: int = 2) -> "AudioBuffer":
+        if sample_width not in SAMPLE_DTYPES:
+            raise AudioBufferError(f"Unsupported sample width: {sample_width}")
+        return cls(np.zeros((max(0, frame_count), channels), dtype=SAMPLE_DTYPES[sample_width]), frame_rate)
+
+    @classmethod
+    def concatenate(cls, buffers: List["AudioBuffer"]) -> "AudioBuffer":
+        """Joins same-format buffers with a single allocation."""
+        if not buffers:
+            raise AudioBufferError("Nothing to concatenate.")
+        first = buffers[0]
+        if any(b.format != first.format for b in buffers):
+            raise AudioBufferError("Cannot concatenate buffers of different formats.")
+        return cls(np.concatenate([b.samples for b in buffers]), first.frame_rate)
+
+    def to_segment(self) -> AudioSegment:
+        """Copies the PCM into a new AudioSegment (the one copy pydub requires)."""
+        return AudioSegment(
+            self.samples.tobytes(),
+            frame_rate=self.frame_rate,
+            sample_width=self.sample_width,
+            channels=self.channels
+        )
+
+    def writable(self) -> "AudioBuffer":
+        """Returns self if its samples can be edited in place, otherwise a copy."""
+        return self if self.samples.flags.writeable else AudioBuffer(self.samples.copy(), self.frame_rate)
+
+    def to_float(self) -> np.ndarray:
+        """Returns a float32 copy of the samples in [-1, 1)."""
+        return self.samples.astype(np.float32) * np.float32(1.0 / self.full_scale)
+
+    def write_float(self, samples: np.ndarray) -> None:
+        """Quantizes float samples in [-1, 1) back into this buffer in place, clipping."""
+        if samples.shape != self.samples.shape:
+            raise AudioBufferError("Float samples must match the buffer's shape.")
+        limits = np.iinfo(self.samples.dtype)
+        for start in range(0, len(self.samples), MIX_BLOCK_FRAMES):
+            block = samples[start:start + MIX_BLOCK_FRAMES] * self.full_scale
+            np.clip(block, limits.min, limits.max, out=block)
+            self.samples[start:start + MIX_BLOCK_FRAMES] = block
+
+    # --- Format ---
+
+    @property
+    def channels(self) -> int:
+        return self.samples.shape[1]
+
+    @property
+    def sample_width(self) -> int:
+        return self.samples.dtype.itemsize
+
+    @property
+    def frame_width(self) -> int:
+        return self.sample_width * self.channels
+
+    @property
+    def format(self) -> Tuple[int, int, int]:
+        return self.frame_rate, self.channels, self.sample_width
+
+    @property
+    def full_scale(self) -> float:
+        return float(1 << (8 * self.sample_width - 1))
+
+    @property
+    def raw_data(self) -> memoryview:
+        """Zero-copy byte view of the interleaved PCM (copies only if non-contiguous)."""
+        return memoryview(np.ascontiguousarray(self.samples)).cast("B")
+
+    @property
+    def duration_seconds(self) -> float:
+        return len(self.samples) / self.frame_rate if self.frame_rate else 0.0
+
+    def __len__(self) -> int:
+        """Length in milliseconds, like AudioSegment."""
+        return round(1000 * len(self.samples) / self.frame_rate)
+
+    @property
+    def frame_count(self) -> int:
+        return len(self.samples)
+
+    def ms_to_frames(self, ms: float) -> int:
+        # Truncates like pydub, so edits land on the same frames as before.
+        return int(ms * self.frame_rate / 1000)
+
+    # --- Views ---
+
+    def __getitem__(self, key: slice) -> "AudioBuffer":
+        """Millisecond slicing like AudioSegment, returning a view instead of a copy."""
+        if not isinstance(key, slice) or key.step is not None:
+            raise AudioBufferError("AudioBuffer only supports [start_ms:end_ms] slicing.")
+        start = 0 if key.start is None else self.ms_to_frames(key.start)
+        end = len(self.samples) if key.stop is None else self.ms_to_frames(key.stop)
+        return AudioBuffer(self.samples[start:end], self.frame_rate)
+
+    def frames(self, start: int, end: int) -> "AudioBuffer":
+        return AudioBuffer(self.samples[start:end], self.frame_rate)
+
+    # --- In-place editing ---
+
+    def apply_gain(self, gain_db: float) -> "AudioBuffer":
+        if gain_db:
+            limits = np.iinfo(self.samples.dtype)
+            factor = 10 ** (gain_db / 20)
+            for start in range(0, len(self.samples), MIX_BLOCK_FRAMES):
+                block = self.samples[start:start + MIX_BLOCK_FRAMES]
+                block[:] = np.clip(block * factor, limits.min, limits.max)
+        return self
+
+    def fade_in(self, duration_ms: float) -> "AudioBuffer":
+        n = min(len(self.samples), self.ms_to_frames(duration_ms))
+        if n > 0:
+            ramp = np.linspace(0.0, 1.0, n, endpoint=False, dtype=np.float32)[:, None]
+            self.samples[:n] = self.samples[:n] * ramp
+        return self
+
+    def fade_out(self, duration_ms: float) -> "AudioBuffer":
+        n = min(len(self.samples), self.ms_to_frames(duration_ms))
+        if n > 0:
+            ramp = np.linspace(1.0, 0.0, n, endpoint=False, dtype=np.float32)[:, None]
+            self.samples[-n:] = self.samples[-n:] * ramp
+        return self
+
+    def overlay(self, other: "AudioBuffer", position_ms: float = 0) -> "AudioBuffer":
+        """
+        Mixes `other` into this buffer in place, starting at position_ms and clipping
+        at full scale. Like AudioSegment.overlay, anything past the end is dropped.
+        """
+        if other.format != self.format:
+            raise AudioBufferError("Cannot overlay buffers of different formats.")
+        start = self.ms_to_frames(position_ms)
+        source = other.samples
+        if start < 0:
+            source, start = source[-start:], 0
+        end = min(len(self.samples), start + len(source))
+        if end <= start:
+            return self
+        limits = np.iinfo(self.samples.dtype)
+        for offset in range(0, end - start, MIX_BLOCK_FRAMES):
+            count = min(MIX_BLOCK_FRAMES, end - start - offset)
+            target = self.samples[start + offset:start + offset + count]
+            mixed = target.astype(np.int64) + source[offset:offset + count]
+            target[:] = np.clip(mixed, limits.min, limits.max)
+        return self
+
+    def with_channels(self, channels: int, out_path: Optional[Path] = None) -> "AudioBuffer":
+        """
+        Returns the buffer down- or up-mixed the way pydub does (average / duplicate).
+        With out_path the result is converted a block at a time into a WAV file there.
+        """
+        if channels == self.channels:
+            return self
+        if out_path is not None:
+            if channels != 1 and self.channels != 1:
+                raise AudioBufferError(f"Cannot convert {self.channels} channels to {channels}.")
+            out = AudioBuffer.create_wav(out_path, self.frame_count, self.frame_rate, channels, self.sample_width)
+            for start in range(0, self.frame_count, MIX_BLOCK_FRAMES):
+                block = self.frames(start, start + MIX_BLOCK_FRAMES).with_channels(channels)
+                out.samples[start:start + MIX_BLOCK_FRAMES] = block.samples
+            return out
+        if channels == 1:
+            return AudioBuffer(self.samples.mean(axis=1, keepdims=True).astype(self.samples.dtype), self.frame_rate)
+        if self.channels == 1:
+            return AudioBuffer(np.repeat(self.samples, channels, axis=1), self.frame_rate)
+        raise AudioBufferError(f"Cannot convert {self.channels} channels to {channels}.")
+
+AudioLike = Union[AudioSegment, AudioBuffer]
+
+def common_format(items: Iterable[AudioLike]) -> Tuple[int, int, int]:
+    """The (frame_rate, channels, sample_width) that pydub would sync these to."""
+    items = list(items)
+    if not items:
+        raise AudioBufferError("No audio to take a format from.")
+    frame_rate = max(a.frame_rate for a in items)
+    channels = max(a.channels for a in items)
+    sample_width = 4 if max(a.sample_width for a in items) > 2 else 2
+    return frame_rate, channels, sample_width
+
+def conform(audio: AudioLike, frame_rate: int, channels: int, sample_width: int) -> AudioBuffer:
+    """
+    Returns the audio as a buffer in the given format. Matching buffers are returned
+    as is; resampling and width changes go through pydub at this edge.
+    """
+    if isinstance(audio, AudioBuffer):
+        if audio.format == (frame_rate, channels, sample_width):
+            return audio
+        if audio.frame_rate == frame_rate and audio.sample_width == sample_width:
+            return audio.with_channels(channels)
+        audio = audio.to_segment()
+    audio = audio.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(sample_width)
+    return AudioBuffer.from_segment(audio)
@@ -2,13 +2,15 @@ import os
 import time
 from datetime import datetime
 from pydub import AudioSegment
-from pydub.effects import normalize
 from pathlib import Path
-from typing import List, Optional, Dict, Any, Set, Tuple
+from typing import List, Optional, Dict, Any, Set, Tuple, Callable
 
 # Import the necessary models and services
-from ..models.podcast import PodcastTemplate, TemplateSegment
-from . import ai_enhancer, transcription, keyword_detector
+from ..models.podcast import PodcastTemplatePublic, TemplateSegment, ExportProfile
+from ..core import directories
+from ..core.config import settings
+from . import ai_enhancer, transcription, keyword_detector, exporter, loudness, music_bed, transcript_export, waveform, audio_buffer, intern, fingerprint, timeline, memory_budget
+from .audio_buffer import AudioBuffer, AudioBufferError
 
 # The Recommended Fix: Tell pydub directly where FFmpeg is
 AudioSegment.converter = "C:\\ffmpeg\\ffmpeg-7.1.1-essentials_build\\bin\\ffmpeg.exe"
@@ -22,96 +24,194 @@ AI_SEGMENTS_DIR = Path("ai_segments")
 CLEANED_DIR = Path("cleaned_audio")
 EDITED_DIR = Path("edited_audio")
 TRANSCRIPTS_DIR = Path("transcripts")
-for d in [UPLOAD_DIR, OUTPUT_DIR, AI_SEGMENTS_DIR, CLEANED_DIR, EDITED_DIR, TRANSCRIPTS_DIR]:
-    d.mkdir(exist_ok=True)
+directories.register(UPLOAD_DIR, OUTPUT_DIR, AI_SEGMENTS_DIR, CLEANED_DIR, EDITED_DIR, TRANSCRIPTS_DIR)
 
 class AudioProcessingError(Exception):
     """Custom exception for audio processing failures."""
     pass
 
-def _format_timestamp(seconds: float) -> str:
-    """Helper function to format seconds into HH:MM:SS,ms format."""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds * 1000) % 1000)
-    return f"{hours:02}:{minutes:02}:{secs:02},{millis:03}"
-
 def process_and_assemble_episode(
-    template: PodcastTemplate,
+    template: PodcastTemplatePublic,
     main_content_filename: str,
     output_filename: str,
     cleanup_options: Dict[str, bool],
-    tts_overrides: Dict[str, str]
-) -> Tuple[Path, List[str]]:
+    tts_overrides: Dict[str, str],
+    export_profiles: Optional[List[ExportProfile]] = None,
+    progress: Optional[Callable[..., None]] = None,
+    content_cache: Optional[Callable[[AudioBuffer, str], Dict[str, Any]]] = None
+) -> Tuple[Path, List[str], Dict[str, Any]]:
     """
     The master function for the entire episode creation workflow.
+    Returns the primary output path, the human-readable log and a structured job result.
+    If given, progress(event, **data) is called as stages start and finish.
+    content_cache(audio, cleanup_key) may return results saved for an earlier upload of
+    the same recording (see services.fingerprint.cached_results); new results to save
+    are returned in result["content_cache"].
+    The job's memory estimate and the peak RSS measured in each stage are returned in
+    result["memory"].
     """
+    with memory_budget.StageTracker() as tracker:
+        emit = tracker.wrap(progress or (lambda event, **data: None))
+        output_path, log, result = _assemble_episode(
+            template, main_content_filename, output_filename, cleanup_options, tts_overrides,
+            export_profiles, progress, content_cache, emit
+        )
+    result["memory"]["stages"] = tracker.stages
+    return output_path, log, result
+
+def _assemble_episode(
+    template: PodcastTemplatePublic,
+    main_content_filename: str,
+    output_filename: str,
+    cleanup_options: Dict[str, bool],
+    tts_overrides: Dict[str, str],
+    export_profiles: Optional[List[ExportProfile]],
+    progress: Optional[Callable[..., None]],
+    content_cache: Optional[Callable[[AudioBuffer, str], Dict[str, Any]]],
+    emit: Callable[..., None]
+) -> Tuple[Path, List[str], Dict[str, Any]]:
     log = []
+    result: Dict[str, Any] = {"artifacts": []}
     total_start_time = time.time()
     start_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     log.append(f"Workflow started at {start_timestamp}")
 
     # --- Step 1: Load Main Content & Get Initial Transcript ---
     step_start_time = time.time()
+    emit("stage_started", stage="transcription")
     content_path = UPLOAD_DIR / main_content_filename
     if not content_path.exists():
         raise AudioProcessingError(f"Main content file not found: {main_content_filename}")
-    
-    main_content_audio = AudioSegment.from_file(content_path)
+
+    # Memory is planned from the upload's header before any audio is decoded. Over
+    # budget, every full-length intermediate is rendered into a mapped WAV file instead
+    # of memory, so the job only holds a few blocks at a time.
+    try:
+        source_info = memory_budget.probe(content_path)
+    except memory_budget.MemoryBudgetError as e:
+        raise AudioProcessingError(str(e))
+    memory_plan = memory_budget.plan(source_info, settings.PIPELINE_MEMORY_BUDGET_MB, template.loudness.channels)
+    streaming = memory_plan.streaming
+    result["memory"] = memory_plan.to_dict()
+    log.append(
+        f"Estimated a {memory_plan.peak_bytes / memory_budget.MB:.0f} MB peak for {source_info.duration_s:.0f}s of "
+        f"{source_info.channels}-channel audio against a {settings.PIPELINE_MEMORY_BUDGET_MB} MB budget: "
+        + ("processing block-wise from mapped files." if streaming else "processing in memory.")
+    )
+
+    if streaming and not source_info.mappable:
+        decoded_path = CLEANED_DIR / f"decoded_{Path(main_content_filename).stem}.wav"
+        try:
+            main_content_audio = AudioBuffer.decode_to_wav(content_path, decoded_path)
+        except AudioBufferError as e:
+            raise AudioProcessingError(str(e))
+        result["artifacts"].append({"kind": "cleaned_audio", "path": str(decoded_path)})
+    else:
+        main_content_audio = AudioBuffer.from_file(content_path)
     log.append(f"Loaded main content: {main_content_filename}")
+    result["artifacts"].append({"kind": "upload", "path": str(content_path)})
     
-    word_timestamps = transcription.get_word_timestamps(main_content_filename)
+    content_duration_s = main_content_audio.duration_seconds
+
+    def transcription_progress(event: str, **data: Any) -> None:
+        if content_duration_s:
+            data["percent"] = round(min(100.0, 100 * data["end_s"] / content_duration_s), 1)
+        emit(event, **data)
+
+    voices = [rule.source.voice_id for rule in template.segments if hasattr(rule.source, 'voice_id')]
+    voice_id = voices[0] if voices else None
+    cache_key = fingerprint.cleanup_key(cleanup_options, voice_id)
+    cached = content_cache(main_content_audio, cache_key) if content_cache else {}
+    if "words" in cached:
+        word_timestamps = cached["words"]
+        log.append(f"Reused the transcript of an earlier upload of this recording (match score {cached['match_score']}).")
+    else:
+        word_timestamps = transcription.get_word_timestamps(main_content_filename, progress=transcription_progress)
     log.append(f"[TIMING] Initial transcription took {time.time() - step_start_time:.2f}s")
+    emit("stage_finished", stage="transcription", seconds=round(time.time() - step_start_time, 2))
     
     # --- Step 2: Content Cleanup ---
     step_start_time = time.time()
-    cleaned_audio = main_content_audio
-    if cleanup_options.get('removeFillers') or cleanup_options.get('removePauses'):
-        default_fillers = {"um", "uh", "ah", "er", "like", "you know", "so", "actually"}
-        cleaned_audio = cleanup_audio(cleaned_audio, word_timestamps, default_fillers, 1.25, 500)
-        log.append("Applied filler word and pause removal.")
+    emit("stage_started", stage="cleanup")
+    cached_cleanup = cached.get("cleanup")
+    if cached_cleanup:
+        cleaned_path = Path(cached_cleanup["cleaned_path"])
+        edit_list = None if cached_cleanup["edit_list"] is None else [tuple(e) for e in cached_cleanup["edit_list"]]
+        result["show_notes_additions"] = cached_cleanup["show_notes_additions"]
+        result["intern_commands"] = cached_cleanup["intern_commands"]
+        log.append(f"Reused cleaned content {cleaned_path.name} from an earlier upload of this recording.")
+    else:
+        cleaned_filename = f"cleaned_{Path(main_content_filename).stem}.wav"
+        cleaned_path = CLEANED_DIR / cleaned_filename
+        cleaned_audio = main_content_audio
+        edit_list = None
+        fills: Dict[int, AudioBuffer] = {}
+        if cleanup_options.get('removeFillers') or cleanup_options.get('removePauses'):
+            default_fillers = {"um", "uh", "ah", "er", "like", "you know", "so", "actually"}
+            edit_list = plan_cleanup(word_timestamps, default_fillers, 1.25, 500, len(main_content_audio))
+            log.append("Planned filler word and pause removal.")
+        if cleanup_options.get('checkForIntern'):
+            intern_plan = intern.plan_intern_edits(
+                word_timestamps, main_content_audio.format,
+                voice_id=voice_id,
+                save_dir=AI_SEGMENTS_DIR, file_stem=Path(main_content_filename).stem,
+                log=log, progress=progress
+            )
+            if intern_plan.cuts or intern_plan.insertions:
+                edit_list, fills = splice_edit_list(
+                    edit_list or [(0, len(main_content_audio))], intern_plan.cuts, intern_plan.insertions
+                )
+            result["show_notes_additions"] = intern_plan.show_notes
+            result["intern_commands"] = intern_plan.commands
+            result["artifacts"].extend({"kind": "ai_segment", "path": str(path)} for path in intern_plan.files)
+        if edit_list is not None:
+            # Cleanup cuts and Intern answers are rendered together in a single pass,
+            # straight into the file when streaming.
+            cleaned_audio = render_edit_list(main_content_audio, edit_list, fills, out_path=cleaned_path if streaming else None)
+            log.append("Rendered content edits.")
     
-    cleaned_filename = f"cleaned_{Path(main_content_filename).stem}.mp3"
-    cleaned_path = CLEANED_DIR / cleaned_filename
-    cleaned_audio.export(cleaned_path, format="mp3")
-    log.append(f"Saved cleaned content to {cleaned_filename}")
+        # Intermediates are lossless WAV: MP3 is only ever encoded at final export. The
+        # rendered audio is swapped for a read-only map of the file it was just written
+        # to, so its pages can be dropped and re-read instead of held for the whole job.
+        if not (streaming and edit_list is not None):
+            cleaned_audio.write_wav(cleaned_path)
+        del cleaned_audio
+        log.append(f"Saved cleaned content to {cleaned_filename}")
+        result["artifacts"].append({"kind": "cleaned_audio", "path": str(cleaned_path)})
+        result["content_cache"] = {
+            "key": cache_key,
+            "words": word_timestamps,
+            "cleanup": {
+                "cleaned_path": str(cleaned_path),
+                "edit_list": edit_list,
+                "show_notes_additions": result.get("show_notes_additions", []),
+                "intern_commands": result.get("intern_commands", []),
+            },
+        }
+    # The upload is not needed past this point; only its format is kept.
+    content_format = main_content_audio.format
+    del main_content_audio
+    cleaned_audio = AudioBuffer.open_wav(cleaned_path)
     log.append(f"[TIMING] Content cleanup took {time.time() - step_start_time:.2f}s")
+    emit("stage_finished", stage="cleanup", seconds=round(time.time() - step_start_time, 2))
 
     # --- Step 3: Final Transcript for AI Context & Saving ---
     # We use the original word_timestamps to build the final transcript
     final_transcript_text = " ".join([word['word'] for word in word_timestamps])
     
-    transcript_filename = f"{output_filename}.txt"
-    transcript_path = TRANSCRIPTS_DIR / transcript_filename
-    with open(transcript_path, "w", encoding="utf-8") as f:
-        # Group words into sentences or phrases for a cleaner transcript
-        current_line = ""
-        line_start_time = 0
-        for i, word_data in enumerate(word_timestamps):
-            if not current_line:
-                line_start_time = word_data['start']
-            
-            current_line += word_data['word'] + " "
-            
-            # End line after about 15 words or if there's a long pause
-            is_last_word = (i == len(word_timestamps) - 1)
-            long_pause = False
-            if not is_last_word:
-                pause = word_timestamps[i+1]['start'] - word_data['end']
-                if pause > 0.7:
-                    long_pause = True
-
-            if len(current_line.split()) >= 15 or is_last_word or long_pause:
-                line_end_time = word_data['end']
-                f.write(f"[{_format_timestamp(line_start_time)} --> {_format_timestamp(line_end_time)}]\n")
-                f.write(f"{current_line.strip()}\n\n")
-                current_line = ""
-
-    log.append(f"Saved final timestamped transcript to {transcript_filename}")
+    try:
+        transcripts = transcript_export.export_transcript(word_timestamps, output_filename, TRANSCRIPTS_DIR, edit_list)
+    except transcript_export.TranscriptExportError as e:
+        raise AudioProcessingError(str(e))
+    transcript_path = Path(transcripts["paths"]["txt"])
+    result["transcripts"] = transcripts["paths"]
+    result["artifacts"].extend({"kind": "transcript", "path": path} for path in transcripts["paths"].values())
+    result["chapters"] = transcripts["chapters"]
+    log.append(f"Saved transcript, SRT/VTT captions and word-level JSON with {len(transcripts['chapters'])} chapters")
 
     # --- Step 4: Prepare Template Segments ---
     step_start_time = time.time()
+    emit("stage_started", stage="segments", segment_count=len(template.segments))
     processed_segments = []
     for segment_rule in template.segments:
         audio = None
@@ -134,90 +234,213 @@ def process_and_assemble_episode(
             log.append(f"Generated TTS segment from script.")
         if audio:
             processed_segments.append((segment_rule, audio))
+            emit(
+                "segment_generated",
+                segment_id=str(segment_rule.id),
+                segment_type=segment_rule.segment_type,
+                source_type=segment_rule.source.source_type,
+                duration_s=round(audio.duration_seconds, 2)
+            )
     log.append(f"[TIMING] Template segments prepared in {time.time() - step_start_time:.2f}s")
+    emit("stage_finished", stage="segments", seconds=round(time.time() - step_start_time, 2))
 
-    # --- Step 5: Stitch with Overlaps & Apply Music ---
+    # --- Step 5: Lay Out the Timeline & Render ---
     step_start_time = time.time()
-    intros = [audio for rule, audio in processed_segments if rule.segment_type == 'intro']
-    content_segments = [audio for rule, audio in processed_segments if rule.segment_type == 'content']
-    outros = [audio for rule, audio in processed_segments if rule.segment_type == 'outro']
-    
-    stitched_intros = sum(intros) if intros else AudioSegment.empty()
-    stitched_content = sum(content_segments) if content_segments else AudioSegment.empty()
-    stitched_outros = sum(outros) if outros else AudioSegment.empty()
-
-    intro_len_ms = len(stitched_intros)
-    content_len_ms = len(stitched_content)
-    outro_len_ms = len(stitched_outros)
-
-    content_start_ms = intro_len_ms + (template.timing.content_start_offset_s * 1000)
-    outro_start_ms = content_start_ms + content_len_ms + (template.timing.outro_start_offset_s * 1000)
-
-    total_duration_ms = max(intro_len_ms, content_start_ms + content_len_ms, outro_start_ms + outro_len_ms)
-    
-    final_audio = AudioSegment.silent(duration=total_duration_ms)
+    emit("stage_started", stage="mixing")
+    # Everything is brought to one format (as pydub's overlay would), placed as clips on
+    # the timeline and rendered a block at a time into a single buffer.
+    if processed_segments:
+        mix_format = audio_buffer.common_format(audio for _, audio in processed_segments)
+    else:
+        mix_format = content_format
+    episode_timeline = timeline.Timeline(*mix_format)
+    try:
+        timeline.place_segments(
+            episode_timeline,
+            [(rule, audio_buffer.conform(audio, *mix_format)) for rule, audio in processed_segments],
+            template.timing, log
+        )
+        tracks = timeline.place_music(
+            episode_timeline, template.background_music_rules, lambda filename: UPLOAD_DIR / filename, log
+        )
+        mix_path = EDITED_DIR / f"mix_{output_filename}.wav" if streaming else None
+        final_audio = timeline.render(episode_timeline, tracks, out_path=mix_path)
+    except (timeline.TimelineError, music_bed.MusicBedError) as e:
+        raise AudioProcessingError(f"Mixing failed: {e}")
+    result["timeline"] = episode_timeline.describe()
+    if mix_path:
+        result["artifacts"].append({"kind": "edited_audio", "path": str(mix_path)})
 
-    final_audio = final_audio.overlay(stitched_intros, position=0)
-    final_audio = final_audio.overlay(stitched_content, position=content_start_ms)
-    final_audio = final_audio.overlay(stitched_outros, position=outro_start_ms)
-    
-    for music_rule in template.background_music_rules:
-        music_path = UPLOAD_DIR / music_rule.music_filename
-        if not music_path.exists(): continue
-        background_music = AudioSegment.from_file(music_path)
-        
-        if 'intro' in music_rule.apply_to_segments and intro_len_ms > 0:
-            start_pos = music_rule.start_offset_s * 1000
-            end_pos = intro_len_ms - (music_rule.end_offset_s * 1000)
-            music_duration = end_pos - start_pos
-            if music_duration > 0:
-                music_to_apply = background_music
-                if len(music_to_apply) < music_duration:
-                    multiplier = int((music_duration / len(music_to_apply)) + 1)
-                    music_to_apply *= multiplier
-                music_to_apply = music_to_apply[:music_duration].fade_in(int(music_rule.fade_in_s * 1000)).fade_out(int(music_rule.fade_out_s * 1000))
-                final_audio = final_audio.overlay(music_to_apply + music_rule.volume_db, position=start_pos)
-
-    log.append(f"[TIMING] Stitching and music application took {time.time() - step_start_time:.2f}s")
+    log.append(f"[TIMING] Timeline layout and rendering took {time.time() - step_start_time:.2f}s")
+    emit("stage_finished", stage="mixing", seconds=round(time.time() - step_start_time, 2))
 
     # --- Step 6: Finalize ---
     step_start_time = time.time()
-    final_audio = normalize(final_audio)
-    output_path = OUTPUT_DIR / f"{output_filename}.mp3"
-    final_audio.export(output_path, format="mp3")
-    log.append(f"[TIMING] Final normalization and export took {time.time() - step_start_time:.2f}s")
+    emit("stage_started", stage="export")
+    if template.loudness.channels:
+        converted_path = EDITED_DIR / f"mix_{output_filename}_{template.loudness.channels}ch.wav" if streaming else None
+        if converted_path and final_audio.channels != template.loudness.channels:
+            result["artifacts"].append({"kind": "edited_audio", "path": str(converted_path)})
+        final_audio = final_audio.with_channels(template.loudness.channels, out_path=converted_path)
+    try:
+        loudness_result = loudness.plan_gain(loudness.measure(final_audio), template.loudness)
+    except loudness.LoudnessError as e:
+        raise AudioProcessingError(f"Loudness measurement failed: {e}")
+    log.append(
+        f"Measured {loudness_result.integrated_lufs:.1f} LUFS / {loudness_result.true_peak_dbtp:.1f} dBTP, "
+        f"applying {loudness_result.gain_db:+.1f} dB for a {template.loudness.integrated_lufs:.1f} LUFS target"
+    )
+    result["loudness"] = loudness_result.to_dict()
+    mp3_workers = 1
+    if final_audio.duration_seconds >= settings.MP3_SEGMENTED_MIN_DURATION_S:
+        mp3_workers = settings.MP3_ENCODE_WORKERS or os.cpu_count() or 1
+    try:
+        outputs = exporter.export_profiles(
+            final_audio, output_filename, OUTPUT_DIR, export_profiles, gain_db=loudness_result.gain_db,
+            progress=progress, mp3_workers=mp3_workers
+        )
+    except exporter.ExportError as e:
+        raise AudioProcessingError(f"Export failed: {e}")
+    output_path = Path(outputs[0]["path"])
+    for output in outputs:
+        log.append(f"Exported {output['profile']} ({output['format']} @ {output['bitrate_kbps']}kbps) to {Path(output['path']).name}")
+    result["outputs"] = outputs
+    peaks_path = waveform.write_peaks(final_audio, waveform.peaks_path_for(output_path.name), gain_db=loudness_result.gain_db)
+    result["artifacts"].extend({"kind": "final_audio", "path": output["path"]} for output in outputs)
+    result["artifacts"].append({"kind": "waveform", "path": str(peaks_path)})
+    result["transcript_path"] = str(transcript_path)
+    result["total_length_seconds"] = final_audio.duration_seconds
+    log.append(f"[TIMING] Loudness normalization and export took {time.time() - step_start_time:.2f}s")
+    emit("stage_finished", stage="export", seconds=round(time.time() - step_start_time, 2))
     
     log.append(f"--- Workflow Finished. Total time: {time.time() - total_start_time:.2f}s ---")
-    return output_path, log
+    return output_path, log, result
 
 
-def cleanup_audio(
-    audio_segment: AudioSegment,
+def plan_cleanup(
     word_timestamps: List[Dict[str, Any]],
     filler_words: Set[str],
     min_pause_s: float,
-    leave_pause_ms: int
-) -> AudioSegment:
-    if not word_timestamps: return audio_segment
-    final_audio = AudioSegment.empty()
+    leave_pause_ms: int,
+    audio_length_ms: int
+) -> List[Tuple[Optional[int], int]]:
+    """
+    Builds the cleanup edit list: the pieces of the source audio to keep, in order.
+    Each piece is (source_start_ms, source_end_ms), or (None, duration_ms) for an
+    inserted silence. Adjacent kept pieces are merged.
+    """
+    if not word_timestamps:
+        return [(0, audio_length_ms)]
+    pieces: List[Tuple[Optional[int], int]] = []
+
+    def keep(start_ms: int, end_ms: int) -> None:
+        if end_ms <= start_ms:
+            return
+        if pieces and pieces[-1][0] is not None and pieces[-1][1] == start_ms:
+            pieces[-1] = (pieces[-1][0], end_ms)
+        else:
+            pieces.append((start_ms, end_ms))
+
     last_cut_end_ms = 0
     first_word_start_s = word_timestamps[0]['start']
     if first_word_start_s > min_pause_s:
-        final_audio += AudioSegment.silent(duration=leave_pause_ms)
+        pieces.append((None, leave_pause_ms))
         last_cut_end_ms = int(first_word_start_s * 1000)
     for i in range(len(word_timestamps)):
         word_data = word_timestamps[i]
         word_text = word_data['word'].strip().lower()
         start_s, end_s = word_data['start'], word_data['end']
-        final_audio += audio_segment[last_cut_end_ms:int(start_s * 1000)]
+        keep(last_cut_end_ms, int(start_s * 1000))
         if word_text not in filler_words:
-            final_audio += audio_segment[int(start_s * 1000):int(end_s * 1000)]
+            keep(int(start_s * 1000), int(end_s * 1000))
         last_cut_end_ms = int(end_s * 1000)
         if i < len(word_timestamps) - 1:
             start_of_next_word_s = word_timestamps[i+1]['start']
             pause_duration_s = start_of_next_word_s - end_s
             if pause_duration_s > min_pause_s:
-                final_audio += AudioSegment.silent(duration=leave_pause_ms)
+                pieces.append((None, leave_pause_ms))
                 last_cut_end_ms = int(start_of_next_word_s * 1000)
-    final_audio += audio_segment[last_cut_end_ms:]
-    return final_audio
+    keep(last_cut_end_ms, audio_length_ms)
+    return pieces
+
+def splice_edit_list(
+    edit_list: List[Tuple[Optional[int], int]],
+    cuts: List[Tuple[int, int]],
+    insertions: List[Tuple[int, AudioBuffer]]
+) -> Tuple[List[Tuple[Optional[int], int]], Dict[int, AudioBuffer]]:
+    """
+    Applies extra cuts and insertions, both in source milliseconds, to an edit list.
+    Each insertion becomes a (None, duration_ms) entry, so timestamp remapping treats
+    it like inserted silence; the returned dict maps those entries' positions to the
+    audio render_edit_list should place there. An insertion that lands inside removed
+    audio goes at the start of the next kept piece.
+    """
+    cuts = sorted(cuts)
+    pending = sorted(insertions, key=lambda insertion: insertion[0])
+    spliced: List[Tuple[Optional[int], int]] = []
+    fills: Dict[int, AudioBuffer] = {}
+
+    def insert(audio: AudioBuffer) -> None:
+        fills[len(spliced)] = audio
+        spliced.append((None, len(audio)))
+
+    j = 0
+    for start_ms, end_ms in edit_list:
+        if start_ms is None:
+            spliced.append((start_ms, end_ms))
+            continue
+        kept = [(start_ms, end_ms)]
+        for cut_start, cut_end in cuts:
+            kept = [
+                piece
+                for s, e in kept
+                for piece in ((s, min(e, cut_start)), (max(s, cut_end), e))
+                if piece[1] > piece[0]
+            ]
+        for s, e in kept:
+            while j < len(pending) and pending[j][0] < e:
+                at = max(pending[j][0], s)
+                if at > s:
+                    spliced.append((s, at))
+                    s = at
+                insert(pending[j][1])
+                j += 1
+            if e > s:
+                spliced.append((s, e))
+    for _, audio in pending[j:]:
+        insert(audio)
+    return spliced, fills
+
+def render_edit_list(
+    audio: AudioBuffer,
+    edit_list: List[Tuple[Optional[int], int]],
+    fills: Optional[Dict[int, AudioBuffer]] = None,
+    out_path: Optional[Path] = None
+) -> AudioBuffer:
+    """
+    Renders a cleanup edit list against its source audio into one preallocated
+    buffer, copying each kept piece exactly once. Inserted entries are silence unless
+    `fills` (from splice_edit_list) supplies audio for them. With out_path the buffer
+    is a WAV file mapped there.
+    """
+    fills = fills or {}
+    pieces = []
+    for i, (start_ms, end_ms) in enumerate(edit_list):
+        if i in fills:
+            pieces.append((fills[i].samples, fills[i].frame_count))
+        elif start_ms is None:
+            pieces.append((None, audio.ms_to_frames(end_ms)))
+        else:
+            piece = audio[start_ms:end_ms].samples
+            pieces.append((piece, len(piece)))
+    frame_count = sum(n for _, n in pieces)
+    if out_path is not None:
+        rendered = AudioBuffer.create_wav(out_path, frame_count, audio.frame_rate, audio.channels, audio.sample_width)
+    else:
+        rendered = AudioBuffer.silent(frame_count, audio.frame_rate, audio.channels, audio.sample_width)
+    position = 0
+    for piece, n in pieces:
+        if piece is not None:
+            rendered.samples[position:position + n] = piece
+        position += n
+    return rendered
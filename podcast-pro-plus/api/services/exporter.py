@@ -0,0 +1,323 @@
+import queue
+import subprocess
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from pydub import AudioSegment
+
+from ..models.podcast import ExportProfile
+from . import mp3_frames
+from .audio_buffer import AudioBuffer, AudioLike
+
+# The default distribution set: one MP3 for the podcast hosts plus AAC and Opus
+# renditions for players that prefer them.
+DEFAULT_EXPORT_PROFILES = [
+    ExportProfile(name="mp3_128", format="mp3", bitrate_kbps=128),
+    ExportProfile(name="m4a_96", format="m4a", bitrate_kbps=96),
+    ExportProfile(name="opus_64", format="opus", bitrate_kbps=64),
+]
+
+# How much raw PCM (in frames) is written to each encoder's stdin per write call,
+# and how many blocks may queue up in front of a slow encoder.
+FEED_BLOCK_FRAMES = 256 * 1024
+MAX_QUEUED_BLOCKS = 4
+
+CODEC_ARGS = {
+    "mp3": ["-c:a", "libmp3lame", "-f", "mp3"],
+    "m4a": ["-c:a", "aac", "-f", "ipod"],
+    "opus": ["-c:a", "libopus", "-f", "ogg"],
+}
+
+FILE_EXTENSIONS = {"mp3": "mp3", "m4a": "m4a", "opus": "opus"}
+
+# Segmented MP3 encoding: the episode is cut at frame boundaries and each piece is
+# encoded by its own LAME process. Every piece after the first starts a few frames
+# early and runs a few frames long, so the encoder is primed with the audio that
+# really surrounds it; those extra frames are dropped when the pieces are joined.
+# Without the bit reservoir every frame carries its own audio data, so frames from
+# different encoders can follow each other.
+SEGMENT_PREROLL_FRAMES = 4
+SEGMENT_POSTROLL_FRAMES = 2
+MIN_SEGMENT_S = 30.0
+SEGMENT_MP3_ARGS = ["-reservoir", "0", "-write_xing", "0", "-id3v2_version", "0"]
+
+class ExportError(Exception):
+    """Custom exception for export failures."""
+    pass
+
+def _pcm_format(sample_width: int) -> str:
+    """Maps a pydub sample width to the matching ffmpeg raw PCM format."""
+    formats = {1: "u8", 2: "s16le", 3: "s24le", 4: "s32le"}
+    if sample_width not in formats:
+        raise ExportError(f"Unsupported sample width: {sample_width}")
+    return formats[sample_width]
+
+def _encoder_command(audio: AudioLike, profile: ExportProfile, output_path: Path) -> List[str]:
+    """Builds an ffmpeg command that reads raw PCM on stdin and writes one encoded file."""
+    return [
+        AudioSegment.converter, "-y", "-hide_banner", "-loglevel", "error",
+        "-f", _pcm_format(audio.sample_width),
+        "-ar", str(audio.frame_rate),
+        "-ac", str(audio.channels),
+        "-i", "pipe:0",
+        *CODEC_ARGS[profile.format],
+        "-b:a", f"{profile.bitrate_kbps}k",
+        str(output_path),
+    ]
+
+class _Encoder:
+    """One ffmpeg process plus the thread that drains its queue of PCM blocks."""
+
+    def __init__(self, command: List[str]):
+        try:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise ExportError(f"Could not start the encoder: {e}")
+        self.blocks: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=MAX_QUEUED_BLOCKS)
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def _drain(self) -> None:
+        broken = False
+        while True:
+            block = self.blocks.get()
+            if block is None:
+                break
+            if broken:
+                continue  # Keep consuming so the producer never blocks on us.
+            try:
+                self.process.stdin.write(block)
+            except BrokenPipeError:
+                broken = True  # The encoder died early; its stderr explains why.
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def finish(self) -> None:
+        self.blocks.put(None)
+        self.thread.join()
+        stderr = self.process.stderr.read()
+        if self.process.wait() != 0:
+            raise ExportError(f"Encoder failed: {stderr.decode(errors='replace').strip()}")
+
+    def abort(self) -> None:
+        """Stops the encoder without letting it finalize a file from partial input."""
+        self.process.kill()
+        self.blocks.put(None)  # The drain thread sees a broken pipe and keeps consuming.
+        self.thread.join()
+        self.process.wait()
+        self.process.stderr.close()
+
+class _Progress:
+    """Reports encode_progress each time another whole percent of the PCM has been fed."""
+
+    def __init__(self, progress: Optional[Callable[..., None]], total_bytes: int):
+        self.progress = progress
+        self.total_bytes = max(1, total_bytes)
+        self.bytes_fed = 0
+        self.reported_percent = -1
+        self.lock = threading.Lock()
+
+    def add(self, n_bytes: int) -> None:
+        with self.lock:
+            self.bytes_fed += n_bytes
+            percent = min(100, int(100 * self.bytes_fed / self.total_bytes))
+            if not self.progress or percent <= self.reported_percent:
+                return
+            self.reported_percent = percent
+            self.progress("encode_progress", bytes_encoded=self.bytes_fed, total_bytes=self.total_bytes, percent=percent)
+
+def _iter_pcm_blocks(audio: AudioLike, gain_db: float):
+    """
+    Yields the segment's PCM in blocks, applying the gain on the fly so the gained
+    episode never exists in memory as a whole.
+    """
+    raw = memoryview(audio.raw_data)
+    block_bytes = FEED_BLOCK_FRAMES * audio.frame_width
+    if gain_db == 0.0:
+        for offset in range(0, len(raw), block_bytes):
+            yield raw[offset:offset + block_bytes]
+        return
+
+    dtypes = {2: np.int16, 4: np.int32}
+    if audio.sample_width not in dtypes:
+        raise ExportError(f"Cannot apply gain to sample width {audio.sample_width}")
+    dtype = dtypes[audio.sample_width]
+    limits = np.iinfo(dtype)
+    factor = 10 ** (gain_db / 20)
+    for offset in range(0, len(raw), block_bytes):
+        block = np.frombuffer(raw[offset:offset + block_bytes], dtype=dtype)
+        gained = np.clip(block * factor, limits.min, limits.max)
+        yield gained.astype(dtype).tobytes()
+
+def _encode_teed(audio: AudioLike, jobs: List[Tuple[ExportProfile, Path, List[str]]], gain_db: float, report: _Progress) -> None:
+    """
+    Streams the PCM a single time, tee'd into one concurrent ffmpeg process per job.
+    If anything fails, no output file is left behind.
+    """
+    encoders: List[_Encoder] = []
+    try:
+        for _, _, command in jobs:
+            encoders.append(_Encoder(command))
+        for block in _iter_pcm_blocks(audio, gain_db):
+            for encoder in encoders:
+                encoder.blocks.put(block)
+            report.add(len(block))
+    except BaseException:
+        for encoder in encoders:
+            encoder.abort()
+        for _, output_path, _ in jobs:
+            output_path.unlink(missing_ok=True)
+        raise
+    errors = []
+    for encoder in encoders:
+        try:
+            encoder.finish()
+        except ExportError as e:
+            errors.append(str(e))
+    if errors:
+        for _, output_path, _ in jobs:
+            output_path.unlink(missing_ok=True)
+        raise ExportError("; ".join(errors))
+
+def plan_segments(frame_count: int, frame_rate: int, workers: int) -> List[Tuple[int, int, int, Optional[int]]]:
+    """
+    Cuts the audio into at most `workers` pieces of whole MP3 frames, each at least
+    MIN_SEGMENT_S long. Returns (first PCM frame fed, end PCM frame fed, first MP3
+    frame kept, MP3 frames kept) per piece; the last piece keeps every frame its
+    encoder flushes (None).
+    """
+    samples = mp3_frames.samples_per_frame(frame_rate)
+    mp3_frame_count = -(-frame_count // samples)
+    pieces = max(1, min(workers, int(frame_count / (MIN_SEGMENT_S * frame_rate))))
+    per_piece = -(-mp3_frame_count // pieces)
+    plan = []
+    for first in range(0, mp3_frame_count, per_piece):
+        end = min(first + per_piece, mp3_frame_count)
+        preroll = min(SEGMENT_PREROLL_FRAMES, first)
+        last = end == mp3_frame_count
+        plan.append((
+            (first - preroll) * samples,
+            frame_count if last else min((end + SEGMENT_POSTROLL_FRAMES) * samples, frame_count),
+            preroll,
+            None if last else end - first,
+        ))
+    return plan
+
+def _encode_segment(audio: AudioBuffer, profile: ExportProfile, start: int, end: int, path: Path, gain_db: float, report: _Progress) -> mp3_frames.FrameIndex:
+    command = _encoder_command(audio, profile, path)
+    command[-1:-1] = SEGMENT_MP3_ARGS
+    encoder = _Encoder(command)
+    try:
+        for block in _iter_pcm_blocks(audio.frames(start, end), gain_db):
+            encoder.blocks.put(block)
+            report.add(len(block))
+    except BaseException:
+        encoder.abort()
+        raise
+    encoder.finish()
+    try:
+        return mp3_frames.scan(path)
+    except mp3_frames.Mp3FramesError as e:
+        raise ExportError(f"Segment encoder produced no usable MP3: {e}")
+
+def encode_mp3_segmented(
+    audio: AudioLike,
+    profile: ExportProfile,
+    output_path: Path,
+    workers: int,
+    gain_db: float = 0.0,
+    report: Optional[_Progress] = None
+) -> None:
+    """
+    Encodes an MP3 on up to `workers` cores at once (see plan_segments) and joins the
+    pieces frame by frame, behind a Xing/Info frame with a LAME tag for the encoder
+    delay and padding, so the result plays back gaplessly as one file.
+    """
+    audio = audio if isinstance(audio, AudioBuffer) else AudioBuffer.from_segment(audio)
+    try:
+        plan = plan_segments(audio.frame_count, audio.frame_rate, workers)
+    except mp3_frames.Mp3FramesError as e:
+        raise ExportError(str(e))
+    report = report or _Progress(None, 0)
+    paths = [output_path.with_name(f"{output_path.stem}.part{i}.mp3") for i in range(len(plan))]
+    try:
+        with ThreadPoolExecutor(max_workers=len(plan), thread_name_prefix="mp3-segment") as pool:
+            futures = [
+                pool.submit(_encode_segment, audio, profile, start, end, path, gain_db, report)
+                for (start, end, _, _), path in zip(plan, paths)
+            ]
+            indexes = [future.result() for future in futures]
+
+        runs = []
+        for (_, _, keep_first, keep_count), path, index in zip(plan, paths, indexes):
+            keep_end = index.frame_count if keep_count is None else keep_first + keep_count
+            if keep_end > index.frame_count or index.sample_rate != audio.frame_rate:
+                raise ExportError(f"Segment {path.name} does not have the frames it was cut for.")
+            if runs and not index.clean[keep_first]:
+                raise ExportError(f"Segment {path.name} starts in the bit reservoir; the encoder ignored -reservoir 0.")
+            runs.append((path, index, keep_first, keep_end))
+        try:
+            stream = mp3_frames.join(runs, encoder_delay=mp3_frames.ENCODER_DELAY, samples=audio.frame_count)
+        except mp3_frames.Mp3FramesError as e:
+            raise ExportError(f"Could not join the MP3 segments: {e}")
+        with open(output_path, "wb") as f:
+            for chunk in stream.iter_range():
+                f.write(chunk)
+    finally:
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+def export_profiles(
+    audio: AudioLike,
+    output_stem: str,
+    output_dir: Path,
+    profiles: Optional[List[ExportProfile]] = None,
+    gain_db: float = 0.0,
+    progress: Optional[Callable[..., None]] = None,
+    mp3_workers: int = 1
+) -> List[Dict[str, Any]]:
+    """
+    Encodes the rendered audio once per profile. The PCM is streamed a single time
+    (with the gain applied block by block) and tee'd into concurrent ffmpeg processes.
+    With mp3_workers > 1, MP3 profiles are instead encoded in segments on that many
+    cores (encode_mp3_segmented), after the others.
+    If given, progress("encode_progress", ...) is called each time another whole
+    percent of the PCM has been fed to the encoders.
+    """
+    profiles = profiles or DEFAULT_EXPORT_PROFILES
+    if len({p.name for p in profiles}) != len(profiles):
+        raise ExportError("Export profile names must be unique.")
+
+    jobs = []
+    for profile in profiles:
+        output_path = output_dir / f"{output_stem}_{profile.name}.{FILE_EXTENSIONS[profile.format]}"
+        jobs.append((profile, output_path, _encoder_command(audio, profile, output_path)))
+    segmented = [job for job in jobs if mp3_workers > 1 and job[0].format == "mp3"]
+    teed = [job for job in jobs if job not in segmented]
+
+    # Segmented encodes feed a little more than the PCM once (the overlaps), which
+    # the progress total leaves out.
+    report = _Progress(progress, len(audio.raw_data) * (bool(teed) + len(segmented)))
+    if teed:
+        _encode_teed(audio, teed, gain_db, report)
+    for profile, output_path, command in segmented:
+        try:
+            encode_mp3_segmented(audio, profile, output_path, mp3_workers, gain_db, report)
+        except ExportError as e:
+            print(f"WARNING: Segmented MP3 encoding failed ({e}); encoding {profile.name} in one pass.")
+            _encode_teed(audio, [(profile, output_path, command)], gain_db, report)
+
+    return [
+        {
+            "profile": profile.name,
+            "format": profile.format,
+            "bitrate_kbps": profile.bitrate_kbps,
+            "path": str(output_path),
+            "size_bytes": output_path.stat().st_size,
+        }
+        for profile, output_path, _ in jobs
+    ]
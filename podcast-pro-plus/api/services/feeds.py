@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from pathlib import Path
+from time import time_ns
+from typing import List, Dict, Optional, Tuple
+from uuid import UUID
+from xml.sax.saxutils import escape, quoteattr
+
+from ..core import directories
+from ..models.podcast import Episode, PodcastTemplate
+
+# Serialized feeds live on disk, one per show (template), so every worker process and
+# every restart serves the same bytes. A feed file is only removed when one of its
+# episodes is published or edited; polls in between are answered without the database.
+FEEDS_DIR = Path("feeds")
+directories.register(FEEDS_DIR)
+
+CACHE_CONTROL = "public, max-age=300"
+NAMESPACES = 'xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd" xmlns:atom="http://www.w3.org/2005/Atom"'
+
+class FeedError(Exception):
+    """Custom exception for feed generation failures."""
+    pass
+
+@dataclass
+class CachedFeed:
+    xml: bytes
+    etag: str
+    last_modified: datetime
+    expires_at: Optional[datetime] # When a scheduled episode is due to appear
+    mtime_ns: int
+
+_lock = threading.Lock()
+_feeds: Dict[UUID, CachedFeed] = {}
+# Bumped by every invalidation, so a render that read the database before an edit
+# does not store its (now stale) result.
+_generations: Dict[UUID, int] = {}
+# Rendered <item> elements, keyed by episode and a digest of the fields they show,
+# so a rebuild only serializes the episodes that changed.
+_items: Dict[UUID, Tuple[str, str]] = {}
+
+def _feed_path(template_id: UUID) -> Path:
+    return FEEDS_DIR / f"{template_id}.xml"
+
+def _meta_path(template_id: UUID) -> Path:
+    return FEEDS_DIR / f"{template_id}.json"
+
+def invalidate(template_id: UUID) -> None:
+    """Drops a show's cached feed; the next poll renders it again."""
+    with _lock:
+        _feeds.pop(template_id, None)
+        _generations[template_id] = _generations.get(template_id, 0) + 1
+    for path in (_feed_path(template_id), _meta_path(template_id)):
+        path.unlink(missing_ok=True)
+
+def generation(template_id: UUID) -> int:
+    """Taken before loading a show's episodes, and handed back to render()."""
+    with _lock:
+        return _generations.get(template_id, 0)
+
+def _load(xml: bytes, mtime_ns: int, expires_at: Optional[datetime]) -> CachedFeed:
+    return CachedFeed(
+        xml=xml,
+        etag=f'"{hashlib.sha1(xml).hexdigest()}"',
+        last_modified=datetime.utcfromtimestamp(mtime_ns // 1_000_000_000),
+        expires_at=expires_at,
+        mtime_ns=mtime_ns,
+    )
+
+def cached(template_id: UUID, now: Optional[datetime] = None) -> Optional[CachedFeed]:
+    """
+    The show's feed if a current copy exists, else None. Costs one stat() when this
+    process has already read the file, and never queries the database.
+    """
+    now = now or datetime.utcnow()
+    path = _feed_path(template_id)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    with _lock:
+        feed = _feeds.get(template_id)
+    if feed is None or feed.mtime_ns != stat.st_mtime_ns:
+        try:
+            xml = path.read_bytes()
+            meta = json.loads(_meta_path(template_id).read_text())
+        except (OSError, ValueError):
+            return None
+        expires_at = datetime.fromisoformat(meta["expires_at"]) if meta.get("expires_at") else None
+        feed = _load(xml, stat.st_mtime_ns, expires_at)
+        with _lock:
+            _feeds[template_id] = feed
+    if feed.expires_at and now >= feed.expires_at:
+        return None
+    return feed
+
+def is_live(episode: Episode, now: datetime) -> bool:
+    return episode.publish_at is None or episode.publish_at <= now
+
+def _rfc822(moment: datetime) -> str:
+    return format_datetime(moment.replace(tzinfo=timezone.utc), usegmt=True)
+
+def _duration(seconds: Optional[float]) -> Optional[str]:
+    if seconds is None:
+        return None
+    total = int(round(seconds))
+    return f"{total // 3600:02d}:{total % 3600 // 60:02d}:{total % 60:02d}"
+
+def _enclosure(episode: Episode, base_url: str) -> Optional[Tuple[str, int]]:
+    """The episode's MP3 as served with its ads (see ad_insertion), and its size without them."""
+    for output in json.loads(episode.audio_outputs_json or "[]"):
+        if output.get("format") == "mp3":
+            return f"{base_url}/episodes/{episode.id}/audio.mp3", output.get("size_bytes", 0)
+    return None
+
+def render_item(episode: Episode, base_url: str) -> str:
+    """One <item> element. Its digest covers every field used, so edits re-render it."""
+    pub_date = episode.publish_at or episode.processed_at
+    fields = [
+        ("title", episode.title),
+        ("description", episode.show_notes),
+        ("guid", str(episode.id)),
+        ("pubDate", _rfc822(pub_date)),
+        ("itunes:duration", _duration(episode.total_length_seconds)),
+        ("itunes:season", episode.season_number),
+        ("itunes:episode", episode.episode_number),
+        ("itunes:keywords", episode.tags),
+    ]
+    enclosure = _enclosure(episode, base_url)
+    digest = hashlib.sha1(json.dumps([fields, enclosure, base_url], default=str).encode()).hexdigest()
+    with _lock:
+        hit = _items.get(episode.id)
+    if hit and hit[0] == digest:
+        return hit[1]
+
+    lines = ["<item>"]
+    for tag, value in fields:
+        if value is None or value == "":
+            continue
+        if tag == "guid":
+            lines.append(f'<guid isPermaLink="false">{escape(str(value))}</guid>')
+        else:
+            lines.append(f"<{tag}>{escape(str(value))}</{tag}>")
+    if enclosure:
+        url, length = enclosure
+        lines.append(f'<enclosure url={quoteattr(url)} length="{length}" type="audio/mpeg"/>')
+    lines.append("</item>")
+    item = "".join(lines)
+    with _lock:
+        _items[episode.id] = (digest, item)
+    return item
+
+def render(
+    template: PodcastTemplate,
+    episodes: List[Episode],
+    base_url: str,
+    loaded_generation: int,
+    now: Optional[datetime] = None
+) -> CachedFeed:
+    """
+    Serializes the show's live episodes (newest first) and stores the feed on disk,
+    unless the show was invalidated since its episodes were loaded. Scheduled episodes
+    are left out, and the feed expires when the first one is due.
+    """
+    now = now or datetime.utcnow()
+    live = sorted((e for e in episodes if is_live(e, now)), key=lambda e: e.publish_at or e.processed_at, reverse=True)
+    upcoming = [e.publish_at for e in episodes if not is_live(e, now)]
+    feed_url = f"{base_url}/feeds/{template.id}/rss.xml"
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f"<rss version=\"2.0\" {NAMESPACES}><channel>",
+        f"<title>{escape(template.name)}</title>",
+        f"<link>{escape(base_url)}</link>",
+        f"<description>{escape(template.name)}</description>",
+        f'<atom:link href={quoteattr(feed_url)} rel="self" type="application/rss+xml"/>',
+        "<generator>Podcast Pro Plus</generator>",
+        f"<lastBuildDate>{_rfc822(now)}</lastBuildDate>",
+    ]
+    parts.extend(render_item(episode, base_url) for episode in live)
+    parts.append("</channel></rss>")
+    xml = "\n".join(parts).encode("utf-8")
+
+    expires_at = min(upcoming) if upcoming else None
+    path = _feed_path(template.id)
+    temp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        temp_path.write_bytes(xml)
+        with _lock:
+            if _generations.get(template.id, 0) != loaded_generation:
+                temp_path.unlink()
+                return _load(xml, time_ns(), expires_at)
+            _meta_path(template.id).write_text(json.dumps({"expires_at": expires_at.isoformat() if expires_at else None}))
+            temp_path.replace(path)
+            feed = _load(xml, path.stat().st_mtime_ns, expires_at)
+            _feeds[template.id] = feed
+    except OSError as e:
+        temp_path.unlink(missing_ok=True)
+        raise FeedError(f"Could not store the feed: {e}")
+    return feed
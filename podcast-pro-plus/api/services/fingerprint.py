@@ -0,0 +1,309 @@
+import json
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from math import gcd
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from ..core import directories
+from ..models.fingerprint import AudioFingerprint, FingerprintHash
+from .audio_buffer import AudioBuffer, AudioLike
+
+# Landmark fingerprints: prominent peaks of a spectrogram of the audio at 8 kHz are
+# paired into (f1, f2, dt) hashes. Peaks survive re-encoding at another bitrate,
+# container or sample rate, so two exports of the same recording share most hashes,
+# always at the same relative offset.
+FINGERPRINT_RATE = 8000
+N_FFT = 512
+HOP = 256
+FRAMES_PER_S = FINGERPRINT_RATE / HOP
+N_BINS = 256 # Bins 0-255 (the Nyquist bin is dropped), so frequencies fit in 8 bits
+BLOCK_FRAMES = 2048 # Spectrogram frames analysed at a time (about a minute)
+PEAK_NEIGHBOURHOOD_FRAMES = 15
+PEAK_NEIGHBOURHOOD_BINS = 15
+MIN_PEAK_DB = -60.0 # Relative to a full-scale sine
+PEAKS_PER_SECOND = 8
+FAN_OUT = 5 # Each anchor peak is paired with this many peaks after it
+MAX_DT_FRAMES = 63 # dt fits in 6 bits
+MAX_DF_BINS = 64
+# Only hashes whose mixed value falls in the lowest 1/HASH_SAMPLE are kept. The choice
+# depends on the hash alone, so every copy of a recording keeps the same ones.
+HASH_SAMPLE = 4
+
+# Matching: enough hashes must agree on one offset (give or take a frame), and the
+# durations must be close, before a recording counts as a re-upload.
+MATCH_MIN_HASHES = 25
+MATCH_MIN_SCORE = 0.15
+OFFSET_TOLERANCE_FRAMES = 1
+DURATION_TOLERANCE = 0.02
+DURATION_TOLERANCE_S = 1.0
+# Hashes repeated this often in one recording (steady tones, loops) are not informative.
+MAX_HASH_REPEATS = 16
+QUERY_CHUNK = 500
+# Cleanup results are only shared between copies whose timelines line up this closely.
+CLEANUP_OFFSET_TOLERANCE_S = 0.05
+
+CACHE_DIR = Path("content_cache")
+directories.register(CACHE_DIR)
+
+class FingerprintError(Exception):
+    """Custom exception for fingerprinting failures."""
+    pass
+
+@dataclass
+class Fingerprint:
+    hashes: np.ndarray # int64
+    offsets: np.ndarray # int64, anchor frame of each hash
+    duration_s: float
+
+def _mono_signal(buffer: AudioBuffer) -> np.ndarray:
+    """The audio as mono float32 at FINGERPRINT_RATE, converted a minute at a time."""
+    from scipy.signal import resample_poly
+    divisor = gcd(buffer.frame_rate, FINGERPRINT_RATE)
+    up, down = FINGERPRINT_RATE // divisor, buffer.frame_rate // divisor
+    block = buffer.frame_rate * 60
+    parts = []
+    for start in range(0, buffer.frame_count, block):
+        mono = buffer.frames(start, start + block).to_float().mean(axis=1)
+        parts.append(resample_poly(mono, up, down).astype(np.float32) if up != down else mono)
+    return np.concatenate(parts) if parts else np.zeros(0, np.float32)
+
+def _peaks(signal: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spectral peaks as (time, bin) arrays, sorted by time, at most PEAKS_PER_SECOND a
+    second. Times are in frames, refined between frames by fitting a parabola through
+    the neighbouring frames, so copies whose frame grids differ still agree.
+    """
+    from scipy.ndimage import maximum_filter
+    n_frames = 1 + (len(signal) - N_FFT) // HOP if len(signal) >= N_FFT else 0
+    window = np.hanning(N_FFT).astype(np.float32)
+    reference = window.sum() / 2 # Magnitude of a full-scale sine
+    margin = PEAK_NEIGHBOURHOOD_FRAMES // 2
+    times, bins, strengths = [], [], []
+    for start in range(0, n_frames, BLOCK_FRAMES):
+        end = min(n_frames, start + BLOCK_FRAMES)
+        lo, hi = max(0, start - margin), min(n_frames, end + margin)
+        frames = np.lib.stride_tricks.sliding_window_view(signal[lo * HOP:(hi - 1) * HOP + N_FFT], N_FFT)[::HOP]
+        magnitude = np.abs(np.fft.rfft(frames * window, axis=1))[:, :N_BINS]
+        db = 20 * np.log10(magnitude / reference + 1e-10)
+        local_max = maximum_filter(
+            db, size=(PEAK_NEIGHBOURHOOD_FRAMES, PEAK_NEIGHBOURHOOD_BINS), mode="constant", cval=-np.inf
+        ) == db
+        t, f = np.nonzero(local_max & (db > MIN_PEAK_DB))
+        core = (t + lo >= start) & (t + lo < end) & (t > 0) & (t < len(db) - 1)
+        t, f = t[core], f[core]
+        before, peak, after = db[t - 1, f], db[t, f], db[t + 1, f]
+        curvature = before - 2 * peak + after
+        shift = np.where(curvature < 0, 0.5 * (before - after) / np.where(curvature < 0, curvature, -1), 0.0)
+        times.append(t + lo + np.clip(shift, -0.5, 0.5))
+        bins.append(f)
+        strengths.append(peak)
+    if not times:
+        return np.zeros(0), np.zeros(0, np.int64)
+    times, bins, strengths = np.concatenate(times), np.concatenate(bins), np.concatenate(strengths)
+
+    # Keep the strongest few peaks in each second.
+    second = (times / FRAMES_PER_S).astype(np.int64)
+    order = np.lexsort((-strengths, second))
+    grouped = second[order]
+    rank = np.arange(len(order)) - np.searchsorted(grouped, grouped)
+    keep = order[rank < PEAKS_PER_SECOND]
+    keep = keep[np.lexsort((bins[keep], times[keep]))]
+    return times[keep], bins[keep].astype(np.int64)
+
+def _landmarks(times: np.ndarray, bins: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    hashes, offsets = [], []
+    count = len(times)
+    for i in range(count):
+        t1, f1 = times[i], bins[i]
+        paired = 0
+        for j in range(i + 1, count):
+            dt = int(round(times[j] - t1))
+            if dt > MAX_DT_FRAMES or paired == FAN_OUT:
+                break
+            if dt > 0 and abs(bins[j] - f1) <= MAX_DF_BINS:
+                hashes.append((f1 << 14) | (bins[j] << 6) | dt)
+                offsets.append(int(round(t1)))
+                paired += 1
+    hashes, offsets = np.array(hashes, np.int64), np.array(offsets, np.int64)
+    mixed = (hashes.astype(np.uint64) * np.uint64(0x9E3779B1)) & np.uint64(0xFFFFFFFF)
+    sampled = mixed < np.uint64(0x100000000 // HASH_SAMPLE)
+    pairs = np.unique(np.stack([hashes[sampled], offsets[sampled]], axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+def compute(audio: AudioLike) -> Fingerprint:
+    buffer = audio if isinstance(audio, AudioBuffer) else AudioBuffer.from_segment(audio)
+    times, bins = _peaks(_mono_signal(buffer))
+    hashes, offsets = _landmarks(times, bins)
+    return Fingerprint(hashes=hashes, offsets=offsets, duration_s=buffer.duration_seconds)
+
+def fingerprint_file(path: Path) -> Fingerprint:
+    try:
+        return compute(AudioBuffer.from_file(path))
+    except Exception as e:
+        raise FingerprintError(f"Could not fingerprint {path.name}: {e}")
+
+def _durations_match(a: float, b: float) -> bool:
+    return abs(a - b) <= max(DURATION_TOLERANCE_S, DURATION_TOLERANCE * max(a, b))
+
+def find_match(
+    session: Session,
+    user_id: UUID,
+    fingerprint: Fingerprint
+) -> Optional[Tuple[AudioFingerprint, float, float]]:
+    """
+    Looks for an earlier recording of the user's with the same audio. Returns the
+    original's record, the match score (fraction of hashes agreeing on one offset)
+    and the offset in seconds from this recording's timeline to the original's.
+    """
+    if len(fingerprint.hashes) < MATCH_MIN_HASHES:
+        return None
+    query_offsets: Dict[int, List[int]] = defaultdict(list)
+    for h, offset in zip(fingerprint.hashes.tolist(), fingerprint.offsets.tolist()):
+        query_offsets[h].append(offset)
+    informative = [h for h, offsets in query_offsets.items() if len(offsets) <= MAX_HASH_REPEATS]
+
+    deltas: Dict[UUID, Counter] = defaultdict(Counter)
+    for i in range(0, len(informative), QUERY_CHUNK):
+        statement = (
+            select(FingerprintHash.fingerprint_id, FingerprintHash.hash, FingerprintHash.offset)
+            .join(AudioFingerprint, AudioFingerprint.id == FingerprintHash.fingerprint_id)
+            .where(AudioFingerprint.user_id == user_id, FingerprintHash.hash.in_(informative[i:i + QUERY_CHUNK]))
+        )
+        for fingerprint_id, h, offset in session.exec(statement):
+            for query_offset in query_offsets[h]:
+                deltas[fingerprint_id][offset - query_offset] += 1
+
+    best = None
+    for fingerprint_id, counts in deltas.items():
+        delta, votes = max(
+            ((d, sum(counts.get(d + k, 0) for k in range(-OFFSET_TOLERANCE_FRAMES, OFFSET_TOLERANCE_FRAMES + 1)))
+             for d in counts),
+            key=lambda item: item[1]
+        )
+        if votes < MATCH_MIN_HASHES or (best and votes <= best[1]):
+            continue
+        best = (fingerprint_id, votes, delta)
+    if not best:
+        return None
+    fingerprint_id, votes, delta = best
+    score = votes / len(fingerprint.hashes)
+    original = session.get(AudioFingerprint, fingerprint_id)
+    if score < MATCH_MIN_SCORE or not _durations_match(original.duration_s, fingerprint.duration_s):
+        return None
+    return original, score, delta / FRAMES_PER_S
+
+def register(
+    session: Session,
+    user_id: UUID,
+    fingerprint: Fingerprint,
+    source_name: str,
+    media_item_id: Optional[UUID] = None
+) -> AudioFingerprint:
+    """Records a fingerprint, linking it to an earlier copy of the same recording if there is one."""
+    match = find_match(session, user_id, fingerprint)
+    record = AudioFingerprint(
+        user_id=user_id,
+        media_item_id=media_item_id,
+        source_name=source_name,
+        duration_s=fingerprint.duration_s,
+        hash_count=len(fingerprint.hashes),
+    )
+    if match:
+        original, score, offset_s = match
+        record.duplicate_of = original.id
+        record.match_score = round(score, 3)
+        record.offset_s = offset_s
+    session.add(record)
+    session.flush()
+    if not match and len(fingerprint.hashes):
+        session.execute(insert(FingerprintHash), [
+            {"hash": h, "fingerprint_id": record.id, "offset": offset}
+            for h, offset in zip(fingerprint.hashes.tolist(), fingerprint.offsets.tolist())
+        ])
+    session.commit()
+    session.refresh(record)
+    return record
+
+def find_record(session: Session, user_id: UUID, source_name: str, duration_s: float) -> Optional[AudioFingerprint]:
+    """
+    The fingerprint already taken of an upload, preferring the one recorded with its
+    media item. A record whose duration does not match belongs to an earlier file that
+    was uploaded under the same name and is ignored.
+    """
+    records = session.exec(
+        select(AudioFingerprint)
+        .where(AudioFingerprint.user_id == user_id, AudioFingerprint.source_name == source_name)
+        .order_by(AudioFingerprint.media_item_id.is_(None), AudioFingerprint.created_at.desc())
+    )
+    return next((r for r in records if _durations_match(r.duration_s, duration_s)), None)
+
+def forget_media_item(session: Session, media_item_id: UUID) -> None:
+    """Detaches fingerprints from a deleted media item; their cached results stay usable."""
+    for record in session.exec(select(AudioFingerprint).where(AudioFingerprint.media_item_id == media_item_id)):
+        record.media_item_id = None
+        session.add(record)
+
+def cleanup_key(cleanup_options: Dict[str, bool], voice_id: Optional[str]) -> str:
+    """Identifies the settings a cleanup result depends on."""
+    return json.dumps({"options": cleanup_options, "voice_id": voice_id}, sort_keys=True)
+
+def _original(session: Session, record: AudioFingerprint) -> AudioFingerprint:
+    return session.get(AudioFingerprint, record.duplicate_of) if record.duplicate_of else record
+
+def _shift(words: List[Dict[str, Any]], seconds: float) -> List[Dict[str, Any]]:
+    if not seconds:
+        return words
+    return [{**w, "start": w["start"] + seconds, "end": w["end"] + seconds} for w in words]
+
+def _file_stamp(path: Path) -> List[int]:
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+def cached_results(session: Session, record: AudioFingerprint, key: str) -> Dict[str, Any]:
+    """
+    Transcript and cleanup results saved for the same recording. With a cached cleanup
+    the words stay in the original's timeline, matching the cleaned audio and edit list
+    that come with it; otherwise they are moved onto this recording's timeline.
+    """
+    original = _original(session, record)
+    cached: Dict[str, Any] = {}
+    cleanup = json.loads(original.cleanup_json).get(key)
+    # The cleaned file may since have been collected, compressed or overwritten by a
+    # later upload with the same name.
+    cleaned_path = Path(cleanup["cleaned_path"]) if cleanup else None
+    if cleaned_path and cleaned_path.exists() and _file_stamp(cleaned_path) == cleanup.get("stamp"):
+        cached["cleanup"] = cleanup
+    if original.transcript_path and Path(original.transcript_path).exists():
+        with open(original.transcript_path, encoding="utf-8") as f:
+            words = json.load(f)
+        cached["words"] = words if "cleanup" in cached else _shift(words, -record.offset_s)
+    if cached:
+        cached["match_score"] = record.match_score
+    return cached
+
+def save_results(
+    session: Session,
+    record: AudioFingerprint,
+    words: List[Dict[str, Any]],
+    key: str,
+    cleanup: Optional[Dict[str, Any]]
+) -> None:
+    """Caches a processed recording's transcript and cleanup on the original, in its timeline."""
+    original = _original(session, record)
+    if not original.transcript_path or not Path(original.transcript_path).exists():
+        path = CACHE_DIR / f"words_{original.id.hex}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(_shift(words, record.offset_s), f)
+        original.transcript_path = str(path)
+    if cleanup and abs(record.offset_s) <= CLEANUP_OFFSET_TOLERANCE_S:
+        results = json.loads(original.cleanup_json)
+        results[key] = {**cleanup, "stamp": _file_stamp(Path(cleanup["cleaned_path"]))}
+        original.cleanup_json = json.dumps(results)
+    session.add(original)
+    session.commit()
@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+from . import ai_enhancer, keyword_detector, audio_buffer
+from .audio_buffer import AudioBuffer
+
+INTERN_KEYWORD = "intern"
+# Answers and their speech are generated for this many commands at once; the provider
+# gateway still applies its rate limits on top.
+MAX_CONCURRENT_COMMANDS = 4
+
+@dataclass
+class InternPlan:
+    """
+    Edits produced by the Intern stage, in source-recording time. Spoken show-notes
+    commands are cut; generated answers are inserted where their command ends.
+    """
+    cuts: List[Tuple[int, int]] = field(default_factory=list)
+    insertions: List[Tuple[int, AudioBuffer]] = field(default_factory=list)
+    show_notes: List[str] = field(default_factory=list)
+    commands: List[Dict[str, Any]] = field(default_factory=list)
+    files: List[Path] = field(default_factory=list)
+
+def find_commands(word_timestamps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Finds every spoken "Intern, ..." command and the span it occupies."""
+    commands = []
+    for event in keyword_detector.find_keywords(word_timestamps, {INTERN_KEYWORD}):
+        text, end_s = keyword_detector.get_command_after_keyword(word_timestamps, event)
+        if text.strip():
+            commands.append({"text": text, "start_s": event["start_time_s"], "end_s": end_s})
+    return commands
+
+def _answer(topic: str, voice_id: Optional[str]) -> Tuple[str, Any]:
+    answer = ai_enhancer.get_answer_for_topic(topic)
+    voice = {"voice_id": voice_id} if voice_id else {}
+    return answer, ai_enhancer.generate_speech_from_text(answer, **voice)
+
+def plan_intern_edits(
+    word_timestamps: List[Dict[str, Any]],
+    audio_format: Tuple[int, int, int],
+    voice_id: Optional[str] = None,
+    save_dir: Optional[Path] = None,
+    file_stem: str = "intern",
+    log: Optional[List[str]] = None,
+    progress: Optional[Callable[..., None]] = None
+) -> InternPlan:
+    """
+    Runs the whole Intern stage: one batched call interprets every command, then the
+    answers and their speech are generated concurrently. Generated audio is converted
+    to `audio_format` (frame_rate, channels, sample_width) ready to be spliced in.
+    """
+    log = log if log is not None else []
+    plan = InternPlan()
+    commands = find_commands(word_timestamps)
+    if not commands:
+        return plan
+
+    interpretations = ai_enhancer.interpret_intern_commands([c["text"] for c in commands])
+    audio_commands = []
+    for command, interpretation in zip(commands, interpretations):
+        action = interpretation.get("action")
+        topic = interpretation.get("topic") or command["text"]
+        plan.commands.append({**command, "action": action, "topic": topic})
+        if action == "add_to_shownotes":
+            plan.show_notes.append(topic)
+            plan.cuts.append((int(command["start_s"] * 1000), int(command["end_s"] * 1000)))
+        elif action == "generate_audio":
+            audio_commands.append((command, topic))
+        else:
+            log.append(f"WARNING: Intern could not interpret '{command['text']}'. Skipping.")
+
+    if audio_commands:
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_COMMANDS) as executor:
+            futures = [executor.submit(_answer, topic, voice_id) for _, topic in audio_commands]
+            for i, ((command, topic), future) in enumerate(zip(audio_commands, futures)):
+                answer, speech = future.result()
+                answer_audio = audio_buffer.conform(speech, *audio_format)
+                if save_dir:
+                    plan.files.append(answer_audio.write_wav(save_dir / f"{file_stem}_intern_{i}.wav"))
+                plan.insertions.append((int(command["end_s"] * 1000), answer_audio))
+                log.append(f"Intern answered '{topic}' ({answer_audio.duration_seconds:.1f}s)")
+                if progress:
+                    progress("segment_generated", segment_type="intern", topic=topic, duration_s=round(answer_audio.duration_seconds, 2))
+    for note in plan.show_notes:
+        log.append(f"Intern added to show notes: {note}")
+    return plan
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+
+from ..core import directories
+
+# Every job gets one append-only JSON-lines file. Publishing is a single O_APPEND
+# write, so any worker process on the host can publish and any other can tail the
+# file, without a broker.
+JOB_EVENTS_DIR = Path("job_events")
+directories.register(JOB_EVENTS_DIR)
+
+POLL_INTERVAL_S = 0.25
+# A subscriber for a job id that does not exist yet waits this long for it to start.
+JOB_START_TIMEOUT_S = 30.0
+# Gives up on a job that has published nothing for this long (its worker probably died).
+STALE_JOB_S = 3600.0
+# Event files of jobs that have not been touched for this long are removed.
+JOB_EVENTS_RETENTION_S = 24 * 3600
+
+TERMINAL_EVENTS = {"job_finished", "job_failed"}
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# The callback services accept for reporting progress: progress(event, **data).
+Progress = Callable[..., None]
+
+class JobEventsError(Exception):
+    """Custom exception for job event publishing and subscription failures."""
+    pass
+
+def _events_path(job_id: str) -> Path:
+    if not JOB_ID_PATTERN.match(job_id):
+        raise JobEventsError("Job id must be 32 lowercase hex characters.")
+    return JOB_EVENTS_DIR / f"{job_id}.jsonl"
+
+def _append(path: Path, event: Dict[str, Any], create: bool = False) -> None:
+    line = (json.dumps(event, default=str) + "\n").encode("utf-8")
+    flags = os.O_WRONLY | os.O_APPEND | (os.O_CREAT | os.O_EXCL if create else 0)
+    fd = os.open(path, flags, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+def _prune_old_jobs(now: float) -> None:
+    for path in JOB_EVENTS_DIR.glob("*.jsonl"):
+        try:
+            if now - path.stat().st_mtime > JOB_EVENTS_RETENTION_S:
+                path.unlink()
+        except OSError:
+            pass
+
+def create_job(user_id: UUID, job_id: Optional[str] = None) -> str:
+    """Opens the event stream for a new job owned by user_id and returns its id."""
+    job_id = job_id or uuid4().hex
+    now = time.time()
+    _prune_old_jobs(now)
+    try:
+        _append(_events_path(job_id), {"event": "job_created", "ts": now, "user_id": str(user_id)}, create=True)
+    except FileExistsError:
+        raise JobEventsError(f"Job {job_id} already exists.")
+    return job_id
+
+def publish(job_id: str, event: str, **data: Any) -> None:
+    _append(_events_path(job_id), {"event": event, "ts": time.time(), **data})
+
+def reporter(job_id: Optional[str]) -> Optional[Progress]:
+    """
+    Returns a progress callback bound to the job. Publishing failures are printed and
+    swallowed: losing a progress event must never fail the job itself.
+    """
+    if not job_id:
+        return None
+
+    def report(event: str, **data: Any) -> None:
+        try:
+            publish(job_id, event, **data)
+        except (OSError, JobEventsError) as e:
+            print(f"Could not publish {event} for job {job_id}: {e}")
+    return report
+
+def job_owner(job_id: str) -> Optional[UUID]:
+    """Returns the user who created the job, or None if the job does not exist."""
+    try:
+        with open(_events_path(job_id), encoding="utf-8") as f:
+            first = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    return UUID(first["user_id"]) if first.get("event") == "job_created" else None
+
+async def wait_for_job(job_id: str) -> Optional[UUID]:
+    """Waits briefly for a job that a client subscribed to before starting it."""
+    deadline = time.monotonic() + JOB_START_TIMEOUT_S
+    while True:
+        owner = job_owner(job_id)
+        if owner or time.monotonic() > deadline:
+            return owner
+        await asyncio.sleep(POLL_INTERVAL_S)
+
+async def subscribe(job_id: str, after: int = 0) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Tails the job's events as (sequence number, event) pairs, starting after the
+    given sequence number so a reconnecting client can resume. Ends after the job's
+    terminal event.
+    """
+    path = _events_path(job_id)
+    sequence = 0
+    offset = 0
+    partial = b""
+    last_activity = time.monotonic()
+    while True:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        offset += len(data)
+        lines: List[bytes] = (partial + data).split(b"\n")
+        partial = lines.pop()  # An incomplete trailing line is finished by a later read.
+        if data:
+            last_activity = time.monotonic()
+        for line in lines:
+            if not line:
+                continue
+            sequence += 1
+            event = json.loads(line)
+            if sequence > after:
+                yield sequence, event
+            if event.get("event") in TERMINAL_EVENTS:
+                return
+        if time.monotonic() - last_activity > STALE_JOB_S:
+            return
+        await asyncio.sleep(POLL_INTERVAL_S)
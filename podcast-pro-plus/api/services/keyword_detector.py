@@ -53,20 +53,17 @@ def analyze_flubber_instance(
         return segment_to_remove
     return None
 
-def get_text_after_keyword(
+def get_command_after_keyword(
     word_timestamps: List[Dict[str, Any]],
     keyword_event: Dict[str, Any],
     max_pause_s: float = 1.5
-) -> str:
+) -> Tuple[str, float]:
     """
     Extracts the string of text spoken after a keyword, stopping at a long pause.
+    Returns the text and the time at which it ends.
     """
     command_words = []
     start_index = keyword_event['index'] + 1
-    
-    if start_index >= len(word_timestamps):
-        return ""
-
     last_word_end_s = keyword_event['end_time_s']
 
     for i in range(start_index, len(word_timestamps)):
@@ -80,4 +77,14 @@ def get_text_after_keyword(
         command_words.append(word_data['word'])
         last_word_end_s = word_data['end']
     
-    return " ".join(command_words)
+    return " ".join(command_words), last_word_end_s
+
+def get_text_after_keyword(
+    word_timestamps: List[Dict[str, Any]],
+    keyword_event: Dict[str, Any],
+    max_pause_s: float = 1.5
+) -> str:
+    """
+    Extracts the string of text spoken after a keyword, stopping at a long pause.
+    """
+    return get_command_after_keyword(word_timestamps, keyword_event, max_pause_s)[0]
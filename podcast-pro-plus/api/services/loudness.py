@@ -0,0 +1,153 @@
+import numpy as np
+from dataclasses import dataclass, asdict
+from typing import Iterator, Dict, Any
+
+from ..models.podcast import LoudnessTarget
+from .audio_buffer import AudioBuffer, AudioLike
+
+# ITU-R BS.1770-4 / EBU R128 constants.
+HOP_S = 0.1               # Gating blocks are 400ms with 75% overlap, i.e. a 100ms hop.
+HOPS_PER_BLOCK = 4
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+TRUE_PEAK_OVERSAMPLE = 4
+
+# Audio is processed in blocks of this many hops (10s) so memory use stays flat.
+HOPS_PER_STREAM_BLOCK = 100
+
+class LoudnessError(Exception):
+    """Custom exception for loudness measurement failures."""
+    pass
+
+@dataclass
+class LoudnessStats:
+    integrated_lufs: float
+    true_peak_dbtp: float
+
+@dataclass
+class LoudnessResult:
+    integrated_lufs: float
+    true_peak_dbtp: float
+    target_lufs: float
+    target_true_peak_dbtp: float
+    gain_db: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Silence measures as -inf, which JSON cannot represent.
+        return {k: round(v, 2) if np.isfinite(v) else None for k, v in asdict(self).items()}
+
+def _k_weighting_filters(frame_rate: int):
+    """
+    Returns the two biquads of the BS.1770 K-weighting curve (high shelf followed by
+    the RLB high-pass), with coefficients derived for the given sample rate.
+    """
+    # Stage 1: high shelf
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = np.tan(np.pi * f0 / frame_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf_b = np.array([(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0])
+    shelf_a = np.array([1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+
+    # Stage 2: RLB high-pass
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * f0 / frame_rate)
+    a0 = 1 + k / q + k * k
+    hp_b = np.array([1.0, -2.0, 1.0])
+    hp_a = np.array([1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    return (shelf_b, shelf_a), (hp_b, hp_a)
+
+def pcm_view(audio: AudioLike) -> np.ndarray:
+    """Returns a zero-copy (frames, channels) integer view over the audio's PCM."""
+    if isinstance(audio, AudioBuffer):
+        return audio.samples
+    dtypes = {2: np.int16, 4: np.int32}
+    if audio.sample_width not in dtypes:
+        raise LoudnessError(f"Unsupported sample width: {audio.sample_width}")
+    return np.frombuffer(audio.raw_data, dtype=dtypes[audio.sample_width]).reshape(-1, audio.channels)
+
+def full_scale(audio: AudioLike) -> float:
+    return float(1 << (8 * audio.sample_width - 1))
+
+def iter_float_blocks(audio: AudioLike, block_frames: int) -> Iterator[np.ndarray]:
+    """Yields float32 (frames, channels) blocks in [-1, 1) without converting the whole file."""
+    pcm = pcm_view(audio)
+    scale = 1.0 / full_scale(audio)
+    for start in range(0, len(pcm), block_frames):
+        yield pcm[start:start + block_frames].astype(np.float32) * scale
+
+def measure(audio: AudioLike) -> LoudnessStats:
+    """
+    Measures integrated loudness (gated, BS.1770-4) and true peak in a single
+    streaming pass over the audio.
+    """
+    # scipy.signal takes over a second to import, so only processes that measure pay for it.
+    from scipy.signal import lfilter, resample_poly
+
+    if audio.channels > 2:
+        raise LoudnessError("Only mono and stereo audio is supported.")
+    rate = audio.frame_rate
+    hop_frames = int(round(rate * HOP_S))
+    (shelf_b, shelf_a), (hp_b, hp_a) = _k_weighting_filters(rate)
+    shelf_zi = np.zeros((2, audio.channels))
+    hp_zi = np.zeros((2, audio.channels))
+
+    hop_energies = []
+    peak = 0.0
+    tail = np.zeros((0, audio.channels), dtype=np.float32)
+    leftover = np.zeros((0, audio.channels))
+    for block in iter_float_blocks(audio, hop_frames * HOPS_PER_STREAM_BLOCK):
+        # True peak: oversample with a little context from the previous block so the
+        # polyphase filter has no artificial edge at the block boundary.
+        context = np.concatenate([tail, block])
+        oversampled = resample_poly(context, TRUE_PEAK_OVERSAMPLE, 1, axis=0)
+        peak = max(peak, float(np.abs(oversampled).max(initial=0.0)))
+        tail = block[-16:]
+
+        weighted, shelf_zi = lfilter(shelf_b, shelf_a, block, axis=0, zi=shelf_zi)
+        weighted, hp_zi = lfilter(hp_b, hp_a, weighted, axis=0, zi=hp_zi)
+        weighted = np.concatenate([leftover, weighted])
+        usable = (len(weighted) // hop_frames) * hop_frames
+        hops = weighted[:usable].reshape(-1, hop_frames, audio.channels)
+        hop_energies.append(np.square(hops).sum(axis=1))
+        leftover = weighted[usable:]
+
+    true_peak_dbtp = 20 * np.log10(peak) if peak > 0 else -np.inf
+    energies = np.concatenate(hop_energies) if hop_energies else np.zeros((0, audio.channels))
+    if len(energies) < HOPS_PER_BLOCK:
+        return LoudnessStats(integrated_lufs=-np.inf, true_peak_dbtp=true_peak_dbtp)
+
+    # Mean square of every 400ms gating block, built from four consecutive hops.
+    cumulative = np.concatenate([np.zeros((1, audio.channels)), np.cumsum(energies, axis=0)])
+    block_ms = (cumulative[HOPS_PER_BLOCK:] - cumulative[:-HOPS_PER_BLOCK]) / (hop_frames * HOPS_PER_BLOCK)
+    block_power = block_ms.sum(axis=1)  # Channel weights are 1.0 for L/R/C.
+    with np.errstate(divide="ignore"):
+        block_lufs = -0.691 + 10 * np.log10(block_power)
+
+    gated = block_power[block_lufs > ABSOLUTE_GATE_LUFS]
+    if len(gated) == 0:
+        return LoudnessStats(integrated_lufs=-np.inf, true_peak_dbtp=true_peak_dbtp)
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE_LU
+    gated = block_power[block_lufs > max(relative_gate, ABSOLUTE_GATE_LUFS)]
+    integrated = -0.691 + 10 * np.log10(gated.mean())
+    return LoudnessStats(integrated_lufs=float(integrated), true_peak_dbtp=float(true_peak_dbtp))
+
+def plan_gain(stats: LoudnessStats, target: LoudnessTarget) -> LoudnessResult:
+    """
+    Chooses the gain that reaches the integrated target, backing off if it would push
+    the true peak over the template's ceiling.
+    """
+    if not np.isfinite(stats.integrated_lufs):
+        gain_db = 0.0
+    else:
+        gain_db = target.integrated_lufs - stats.integrated_lufs
+        if np.isfinite(stats.true_peak_dbtp):
+            gain_db = min(gain_db, target.true_peak_dbtp - stats.true_peak_dbtp)
+    return LoudnessResult(
+        integrated_lufs=stats.integrated_lufs,
+        true_peak_dbtp=stats.true_peak_dbtp,
+        target_lufs=target.integrated_lufs,
+        target_true_peak_dbtp=target.true_peak_dbtp,
+        gain_db=float(gain_db),
+    )
@@ -0,0 +1,211 @@
+import json
+import subprocess
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable
+
+from pydub import AudioSegment
+
+from .audio_buffer import AudioBuffer, AudioBufferError, MIX_BLOCK_FRAMES
+
+MB = 1024 * 1024
+
+# Decoding through pydub holds ffmpeg's output twice (the pipe buffer and the bytes
+# it becomes) before the first copy is freed.
+DECODE_COPIES = 2
+# Intros, outros, commercials and music make the mix longer than the content alone.
+MIX_HEADROOM = 1.25
+# In streaming mode only a few blocks are ever held: int64 voice sums, float music
+# beds and the float blocks loudness and export work on.
+STREAM_BLOCK_COPIES = 6
+# Used when ffprobe cannot tell how long a compressed upload is (bits per second).
+FALLBACK_BITRATE = 64_000
+FALLBACK_FORMAT = (44100, 2)
+RSS_SAMPLE_INTERVAL_S = 0.02
+
+class MemoryBudgetError(Exception):
+    """Custom exception for memory estimation failures."""
+    pass
+
+@dataclass
+class SourceInfo:
+    duration_s: float
+    frame_rate: int
+    channels: int
+    sample_width: int
+    mappable: bool     # A PCM WAV that is read through a map instead of decoded
+
+    @property
+    def pcm_bytes(self) -> int:
+        return int(self.duration_s * self.frame_rate) * self.channels * self.sample_width
+
+@dataclass
+class MemoryPlan:
+    mode: str                   # "memory" or "streaming"
+    budget_bytes: int
+    stages: Dict[str, int]      # Estimated bytes held by the job, per stage, in memory mode
+    streaming_bytes: int
+
+    @property
+    def streaming(self) -> bool:
+        return self.mode == "streaming"
+
+    @property
+    def peak_bytes(self) -> int:
+        return max(self.stages.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "budget_mb": round(self.budget_bytes / MB, 1),
+            "estimate_mb": {stage: round(n / MB, 1) for stage, n in self.stages.items()},
+            "peak_estimate_mb": round(self.peak_bytes / MB, 1),
+            "streaming_estimate_mb": round(self.streaming_bytes / MB, 1),
+        }
+
+def probe(path: Path) -> SourceInfo:
+    """Reads an upload's duration and channel layout without decoding its audio."""
+    if not path.exists():
+        raise MemoryBudgetError(f"File not found: {path.name}")
+    if path.suffix.lower() == ".wav":
+        try:
+            audio = AudioBuffer.open_wav(path)
+            return SourceInfo(audio.duration_seconds, audio.frame_rate, audio.channels, audio.sample_width, True)
+        except AudioBufferError:
+            pass  # Not mappable: decoded like any other format.
+    command = [
+        AudioSegment.ffprobe, "-v", "error", "-select_streams", "a:0",
+        "-show_entries", "stream=sample_rate,channels:format=duration", "-of", "json", str(path),
+    ]
+    try:
+        completed = subprocess.run(command, capture_output=True, check=True)
+        info = json.loads(completed.stdout)
+        stream = info["streams"][0]
+        return SourceInfo(float(info["format"]["duration"]), int(stream["sample_rate"]), int(stream["channels"]), 2, False)
+    except (OSError, subprocess.CalledProcessError, ValueError, KeyError, IndexError) as e:
+        print(f"WARNING: Could not probe {path.name} ({e}); estimating its length from the file size.")
+    frame_rate, channels = FALLBACK_FORMAT
+    return SourceInfo(path.stat().st_size * 8 / FALLBACK_BITRATE, frame_rate, channels, 2, False)
+
+def plan(source: SourceInfo, budget_mb: int, mix_channels: Optional[int] = None) -> MemoryPlan:
+    """
+    Estimates what each stage holds when the job runs in memory, and picks streaming
+    mode (intermediates rendered into mapped files, a block at a time) if the largest
+    stage would not fit the budget.
+    """
+    content = source.pcm_bytes
+    source_held = 0 if source.mappable else content
+    mix = int(content * MIX_HEADROOM)
+    converted = mix * mix_channels // source.channels if mix_channels else 0
+    # Named after the pipeline's stages; the upload is loaded during transcription.
+    stages = {
+        "transcription": 0 if source.mappable else DECODE_COPIES * content,
+        "cleanup": source_held + content,
+        "mixing": mix,
+        "export": mix + converted,
+    }
+    streaming = STREAM_BLOCK_COPIES * MIX_BLOCK_FRAMES * max(source.channels, mix_channels or 0) * 8
+    budget = budget_mb * MB
+    mode = "memory" if max(stages.values()) <= budget else "streaming"
+    return MemoryPlan(mode, budget, stages, streaming)
+
+def _status_kb(fields: List[str]) -> Dict[str, int]:
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in fields:
+                values[name] = int(rest.split()[0])
+    return values
+
+def current_rss() -> Optional[Dict[str, int]]:
+    """
+    The process's resident set in bytes: "rss" in total and "anon" for the part that
+    cannot simply be dropped (mapped WAV pages count towards rss but are reclaimable).
+    None where neither /proc nor psutil is available.
+    """
+    try:
+        values = _status_kb(["VmRSS", "RssAnon"])
+        rss = values["VmRSS"] * 1024
+        return {"rss": rss, "anon": values.get("RssAnon", values["VmRSS"]) * 1024}
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    rss = psutil.Process().memory_info().rss
+    return {"rss": rss, "anon": rss}
+
+class StageTracker:
+    """
+    Samples the process's RSS in a background thread and records, for every stage
+    between stage_started and stage_finished, the RSS at its start and end and the
+    highest value seen in between. RSS is process-wide: jobs running concurrently on
+    other workers show up in each other's numbers.
+    """
+    def __init__(self, interval_s: float = RSS_SAMPLE_INTERVAL_S):
+        self.interval_s = interval_s
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._open: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.available = current_rss() is not None
+
+    def __enter__(self) -> "StageTracker":
+        if self.available:
+            self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self._observe()
+
+    def _observe(self) -> Optional[Dict[str, int]]:
+        usage = current_rss()
+        if usage:
+            with self._lock:
+                for peaks in self._open.values():
+                    peaks["rss"] = max(peaks["rss"], usage["rss"])
+                    peaks["anon"] = max(peaks["anon"], usage["anon"])
+        return usage
+
+    def start(self, stage: str) -> None:
+        usage = current_rss()
+        if usage:
+            with self._lock:
+                self._open[stage] = {"start": usage["rss"], **usage}
+
+    def finish(self, stage: str) -> Optional[Dict[str, float]]:
+        usage = self._observe()
+        with self._lock:
+            peaks = self._open.pop(stage, None)
+        if not usage or not peaks:
+            return None
+        self.stages[stage] = {
+            "start_rss_mb": round(peaks["start"] / MB, 1),
+            "peak_rss_mb": round(peaks["rss"] / MB, 1),
+            "peak_anon_mb": round(peaks["anon"] / MB, 1),
+            "end_rss_mb": round(usage["rss"] / MB, 1),
+        }
+        return self.stages[stage]
+
+    def wrap(self, emit: Callable[..., None]) -> Callable[..., None]:
+        """Returns a progress callback that also tracks stages, adding peak_rss_mb to stage_finished."""
+        def tracked(event: str, **data: Any) -> None:
+            if event == "stage_started":
+                self.start(data["stage"])
+            elif event == "stage_finished":
+                stats = self.finish(data["stage"])
+                if stats:
+                    data["peak_rss_mb"] = stats["peak_rss_mb"]
+            emit(event, **data)
+        return tracked
@@ -0,0 +1,125 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable
+
+from . import ai_enhancer
+
+# Sections are sized by an estimated token count (about four characters per token for
+# English) so each summarization request stays well inside the model's context.
+CHARS_PER_TOKEN = 4
+SECTION_TOKEN_BUDGET = 6000
+# Prefer to end a section at a pause once it is this full.
+SECTION_SOFT_LIMIT = 0.85
+SECTION_BREAK_PAUSE_S = 1.0
+MAX_CONCURRENT_SECTIONS = 6
+# Sections carry a [HH:MM:SS] marker this often so the model can place chapters.
+TIMESTAMP_EVERY_S = 30.0
+MAX_TAGS = 15
+
+class MetadataError(Exception):
+    """Custom exception for metadata generation failures."""
+    pass
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _clock(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02}:{seconds % 3600 // 60:02}:{seconds % 60:02}"
+
+def load_words(json_path: Path) -> List[Dict[str, Any]]:
+    """Reads the word-level JSON written by transcript_export."""
+    try:
+        with open(json_path, encoding="utf-8") as f:
+            return json.load(f)["words"]
+    except (OSError, ValueError, KeyError) as e:
+        raise MetadataError(f"Could not read transcript {json_path.name}: {e}")
+
+def split_sections(words: List[Dict[str, Any]], token_budget: int = SECTION_TOKEN_BUDGET) -> List[Dict[str, Any]]:
+    """
+    Splits a word-level transcript into sections of at most `token_budget` estimated
+    tokens, ending early at a pause once a section is nearly full, with periodic
+    timestamp markers in the text.
+    """
+    budget_chars = token_budget * CHARS_PER_TOKEN
+    sections = []
+    parts: List[str] = []
+    length = 0
+    start_s = None
+    next_marker_s = 0.0
+    for i, word in enumerate(words):
+        if start_s is None:
+            start_s = word['start']
+            next_marker_s = word['start']
+        if word['start'] >= next_marker_s:
+            marker = f"[{_clock(word['start'])}]"
+            parts.append(marker)
+            length += len(marker) + 1
+            next_marker_s = word['start'] + TIMESTAMP_EVERY_S
+        text = word['word'].strip()
+        parts.append(text)
+        length += len(text) + 1
+
+        is_last = i == len(words) - 1
+        pause_s = 0.0 if is_last else words[i + 1]['start'] - word['end']
+        full = length >= budget_chars
+        nearly_full = length >= budget_chars * SECTION_SOFT_LIMIT and pause_s >= SECTION_BREAK_PAUSE_S
+        if is_last or full or nearly_full:
+            sections.append({"text": " ".join(parts), "start_s": start_s, "end_s": word['end']})
+            parts, length, start_s = [], 0, None
+    return sections
+
+def _clean_chapters(chapters: Any, duration_s: float) -> List[Dict[str, Any]]:
+    """Keeps well-formed chapters inside the episode, sorted, one per start time."""
+    cleaned = {}
+    for chapter in chapters if isinstance(chapters, list) else []:
+        try:
+            start_s = float(chapter["start_s"])
+            title = str(chapter["title"]).strip()
+        except (KeyError, TypeError, ValueError):
+            continue
+        if title and 0 <= start_s <= duration_s:
+            cleaned.setdefault(round(start_s, 1), title)
+    result = [{"title": title, "start_s": start_s} for start_s, title in sorted(cleaned.items())]
+    if result:
+        result[0]["start_s"] = 0.0
+    return result
+
+def generate_metadata(
+    words: List[Dict[str, Any]],
+    progress: Optional[Callable[..., None]] = None
+) -> Dict[str, Any]:
+    """
+    Map-reduce metadata generation: sections are summarized concurrently, then the
+    section summaries are merged into a title, show notes, tags and chapters.
+    """
+    if not words:
+        raise MetadataError("Transcript is empty.")
+    sections = split_sections(words)
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_SECTIONS) as executor:
+        futures = [
+            executor.submit(ai_enhancer.summarize_transcript_section, s["text"], s["start_s"], s["end_s"])
+            for s in sections
+        ]
+        summaries = []
+        for i, (section, future) in enumerate(zip(sections, futures)):
+            summaries.append({**future.result(), "start_s": section["start_s"], "end_s": section["end_s"]})
+            if progress:
+                progress("metadata_section_summarized", section=i + 1, sections=len(sections))
+
+    merged = ai_enhancer.merge_section_summaries(summaries)
+    duration_s = words[-1]['end']
+    chapters = _clean_chapters(merged.get("chapters"), duration_s)
+    if not chapters:
+        chapters = _clean_chapters([c for s in summaries for c in s.get("chapters", [])], duration_s)
+    tags = merged.get("tags") or []
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(",")]
+    return {
+        "title": merged.get("title", ""),
+        "show_notes": merged.get("show_notes", ""),
+        "tags": [str(t) for t in tags if str(t).strip()][:MAX_TAGS],
+        "chapters": chapters,
+        "sections": len(sections),
+    }
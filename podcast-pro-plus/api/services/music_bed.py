@@ -0,0 +1,122 @@
+import numpy as np
+from pathlib import Path
+from typing import Tuple, Optional
+from pydub import AudioSegment
+
+from ..models.podcast import BackgroundMusicRule
+from .loudness import pcm_view, full_scale
+
+# Sidechain ducking parameters. The voice envelope is measured on 10ms frames.
+ENVELOPE_FRAME_S = 0.01
+VOICE_THRESHOLD_DB = -40.0
+DUCK_ATTACK_S = 0.15   # Ducking starts this far ahead of the voice...
+DUCK_HOLD_S = 0.3      # ...is held this long after the voice stops...
+DUCK_RELEASE_S = 0.6   # ...and then recovers with this time constant.
+
+class MusicBedError(Exception):
+    """Custom exception for background music failures."""
+    pass
+
+def segment_to_array(audio: AudioSegment) -> np.ndarray:
+    """Converts a segment to a float32 (frames, channels) array in [-1, 1)."""
+    return pcm_view(audio).astype(np.float32) / full_scale(audio)
+
+def load_track(path: Path, frame_rate: int, channels: int) -> np.ndarray:
+    """Decodes a music file once, matched to the mix's rate and channel layout."""
+    track = AudioSegment.from_file(path).set_frame_rate(frame_rate).set_channels(channels)
+    if track.sample_width not in (2, 4):
+        track = track.set_sample_width(2)
+    samples = segment_to_array(track)
+    if len(samples) == 0:
+        raise MusicBedError(f"Music file is empty: {path.name}")
+    return samples
+
+def voice_envelope_db(voice: np.ndarray, frame_rate: int) -> np.ndarray:
+    """RMS level of the voice mix on short frames, in dBFS."""
+    frame = max(1, int(frame_rate * ENVELOPE_FRAME_S))
+    usable = (len(voice) // frame) * frame
+    frames = voice[:usable].reshape(-1, frame, voice.shape[1])
+    power = np.square(frames).mean(axis=(1, 2))
+    with np.errstate(divide="ignore"):
+        return 10 * np.log10(power)
+
+def ducking_gain(envelope_db: np.ndarray, duck_db: float) -> np.ndarray:
+    """
+    Turns the voice envelope into a per-frame linear gain for the music: fully ducked
+    while the voice is active (with look-ahead and hold), recovering smoothly after.
+    """
+    if duck_db <= 0 or len(envelope_db) == 0:
+        return np.ones(len(envelope_db), dtype=np.float32)
+    from scipy.ndimage import maximum_filter1d  # Imported on use; see loudness.measure.
+    from scipy.signal import lfilter
+    active = (envelope_db > VOICE_THRESHOLD_DB).astype(np.float32)
+    attack = int(DUCK_ATTACK_S / ENVELOPE_FRAME_S)
+    hold = int(DUCK_HOLD_S / ENVELOPE_FRAME_S)
+    # A window reaching `attack` frames forward and `hold` frames back, so the duck
+    # engages just before speech starts and lingers just after it ends.
+    size = attack + hold + 1
+    active = maximum_filter1d(active, size=size, origin=(size - 1) // 2 - attack)
+    alpha = np.exp(-ENVELOPE_FRAME_S / DUCK_RELEASE_S)
+    smoothed = lfilter([1 - alpha], [1, -alpha], active)
+    smoothed = np.maximum(smoothed, active)  # Attack is instant; only release is smoothed.
+    reduction = 1 - 10 ** (-duck_db / 20)
+    return (1 - reduction * smoothed).astype(np.float32)
+
+def _tiled(track: np.ndarray, offset: int, n: int, out: np.ndarray) -> None:
+    """Writes n frames of the endlessly looped track, starting at `offset`, into out."""
+    written = 0
+    position = offset % len(track)
+    while written < n:
+        take = min(n - written, len(track) - position)
+        out[written:written + take] = track[position:position + take]
+        written += take
+        position = 0
+
+def fade_ramps(rule: BackgroundMusicRule, n: int, frame_rate: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Precomputes the fade-in and fade-out gain ramps, clamped to the bed length."""
+    fade_in = min(n, int(rule.fade_in_s * frame_rate))
+    fade_out = min(n, int(rule.fade_out_s * frame_rate))
+    return (
+        np.linspace(0.0, 1.0, fade_in, endpoint=False, dtype=np.float32),
+        np.linspace(1.0, 0.0, fade_out, endpoint=False, dtype=np.float32),
+    )
+
+def bed_block(
+    track: np.ndarray,
+    start: int,
+    end: int,
+    rule: BackgroundMusicRule,
+    frame_rate: int,
+    duck_frames: np.ndarray,
+    ramps: Tuple[np.ndarray, np.ndarray],
+    lo: int,
+    hi: int,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Renders frames [lo, hi) of one looped, faded and ducked music bed spanning
+    [start, end) of the mix. `ramps` comes from fade_ramps for the bed's length.
+    """
+    n = end - start
+    count = hi - lo
+    block_start = lo - start
+    fade_in, fade_out = ramps
+    music = out[:count] if out is not None else np.empty((count, track.shape[1]), dtype=np.float32)
+    _tiled(track, block_start, count, music)
+
+    # Gain envelope for this block: base volume x ducking, with fade ramps
+    # multiplied in only where the block overlaps them.
+    frame = frame_rate * ENVELOPE_FRAME_S
+    positions = np.arange(lo, hi) / frame
+    gain = np.interp(positions, np.arange(len(duck_frames)), duck_frames, right=1.0).astype(np.float32)
+    gain *= 10 ** (rule.volume_db / 20)
+    if block_start < len(fade_in):
+        overlap = min(count, len(fade_in) - block_start)
+        gain[:overlap] *= fade_in[block_start:block_start + overlap]
+    fade_out_start = n - len(fade_out)
+    if block_start + count > fade_out_start:
+        first = max(0, fade_out_start - block_start)
+        gain[first:] *= fade_out[block_start + first - fade_out_start:block_start + count - fade_out_start]
+
+    music *= gain[:, None]
+    return music
@@ -0,0 +1,114 @@
+import cProfile
+import io
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Optional
+
+from ..core import directories
+from ..core.config import settings
+
+# Opt-in cProfile captures, one .prof (loadable with pstats, snakeviz, etc.) plus a
+# plain-text summary per profiled job, named after the job they belong to.
+PROFILES_DIR = Path("profiles")
+directories.register(PROFILES_DIR)
+
+SUMMARY_LINES = 60
+PROFILE_NAME_PATTERN = re.compile(r"^[0-9a-f]{32}_[a-z_]+\.(prof|txt)$")
+
+# Newer Pythons allow only one active cProfile per interpreter, so profiled jobs take
+# turns; a job that finds the profiler busy simply runs unprofiled.
+_profiler_lock = threading.Lock()
+
+class ProfilerError(Exception):
+    """Custom exception for profile storage failures."""
+    pass
+
+def _summary(profiler: cProfile.Profile) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats("cumulative").print_stats(SUMMARY_LINES)
+    out.write("\n")
+    stats.sort_stats("tottime").print_stats(SUMMARY_LINES)
+    return out.getvalue()
+
+def prune_profiles(now: Optional[float] = None) -> int:
+    """Applies the retention limits: a maximum age and a maximum number of files."""
+    now = now or time.time()
+    max_age_s = settings.PROFILE_RETENTION_DAYS * 86400
+    files = sorted(PROFILES_DIR.glob("*_*.*"), key=lambda p: p.stat().st_mtime, reverse=True)
+    removed = 0
+    for i, path in enumerate(files):
+        if i >= settings.MAX_STORED_PROFILES or now - path.stat().st_mtime > max_age_s:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+def save_profile(profiler: cProfile.Profile, job_id: str, label: str) -> List[str]:
+    """Writes the profile and its summary for a job; returns the stored file names."""
+    stem = f"{job_id}_{label}"
+    profiler.dump_stats(PROFILES_DIR / f"{stem}.prof")
+    (PROFILES_DIR / f"{stem}.txt").write_text(_summary(profiler), encoding="utf-8")
+    prune_profiles()
+    return [f"{stem}.prof", f"{stem}.txt"]
+
+@contextmanager
+def profiled(job_id: str, label: str, enabled: bool, saved: Optional[List[str]] = None) -> Iterator[None]:
+    """
+    Profiles the enclosed block with cProfile when enabled. cProfile only sees the
+    calling thread, so enter it in the thread doing the work; time spent waiting on
+    helper threads and subprocesses shows up in the call that waits. Names of the
+    stored files are appended to `saved`.
+    """
+    if not enabled:
+        yield
+        return
+    if not _profiler_lock.acquire(blocking=False):
+        print(f"Profiler busy; job {job_id} runs unprofiled.")
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        _profiler_lock.release()
+        print(f"Could not start profiler for job {job_id}: {e}")
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profiler_lock.release()
+        try:
+            names = save_profile(profiler, job_id, label)
+            if saved is not None:
+                saved.extend(names)
+        except OSError as e:
+            print(f"Could not save profile for job {job_id}: {e}")
+
+def list_profiles() -> List[Dict[str, Any]]:
+    profiles = []
+    for path in sorted(PROFILES_DIR.glob("*_*.*"), key=lambda p: p.stat().st_mtime, reverse=True):
+        if not PROFILE_NAME_PATTERN.match(path.name):
+            continue
+        stat = path.stat()
+        profiles.append({
+            "name": path.name,
+            "job_id": path.name.split("_", 1)[0],
+            "size_bytes": stat.st_size,
+            "created_at": datetime.utcfromtimestamp(stat.st_mtime).isoformat(),
+        })
+    return profiles
+
+def profile_path(name: str) -> Path:
+    if not PROFILE_NAME_PATTERN.match(name):
+        raise ProfilerError("Invalid profile name.")
+    path = PROFILES_DIR / name
+    if not path.exists():
+        raise ProfilerError("Profile not found.")
+    return path
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Rate-limit state lives in its own SQLite file so every worker process on the host
+# draws from the same buckets and sees the same backoff.
+GATEWAY_DB_PATH = Path("provider_limits.db")
+
+# Token buckets as (requests per minute, burst), per provider and model. A provider's
+# "*" entry covers models without their own limit.
+RATE_LIMITS: Dict[Tuple[str, str], Tuple[float, float]] = {
+    ("openai", "whisper-1"): (50, 5),
+    ("openai", "gpt-4-turbo"): (60, 10),
+    ("openai", "gpt-3.5-turbo-1106"): (300, 20),
+    ("openai", "*"): (60, 10),
+    ("elevenlabs", "*"): (60, 5),
+}
+DEFAULT_RATE_LIMIT = (30, 5)
+
+# Retries for throttling and transient server errors. Without a Retry-After header the
+# delay grows exponentially (with jitter) from BACKOFF_BASE_S.
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_S = 1.0
+MAX_BACKOFF_S = 60.0
+# A caller gives up if it cannot get a token within this long.
+MAX_WAIT_S = 300.0
+
+class ProviderGatewayError(Exception):
+    """Custom exception for provider rate limiting failures."""
+    pass
+
+@contextmanager
+def _connect():
+    connection = sqlite3.connect(GATEWAY_DB_PATH, timeout=30, isolation_level=None)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "bucket TEXT PRIMARY KEY, tokens REAL, updated_at REAL, blocked_until REAL)"
+        )
+        yield connection
+    except sqlite3.Error as e:
+        raise ProviderGatewayError(f"Rate limit store error: {e}")
+    finally:
+        connection.close()
+
+def rate_limit_for(provider: str, model: str) -> Tuple[float, float]:
+    return RATE_LIMITS.get((provider, model)) or RATE_LIMITS.get((provider, "*")) or DEFAULT_RATE_LIMIT
+
+def _bucket_name(provider: str, model: str) -> str:
+    return f"{provider}/{model}" if (provider, model) in RATE_LIMITS else f"{provider}/*"
+
+def _try_acquire(bucket: str, per_minute: float, burst: float, cost: float) -> float:
+    """Takes `cost` tokens if available. Returns 0 on success, else seconds to wait."""
+    rate = per_minute / 60.0
+    with _connect() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        row = connection.execute(
+            "SELECT tokens, updated_at, blocked_until FROM buckets WHERE bucket = ?", (bucket,)
+        ).fetchone()
+        tokens, updated_at, blocked_until = row if row else (burst, now, 0.0)
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if blocked_until > now:
+            wait = blocked_until - now
+        elif tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (cost - tokens) / rate
+        connection.execute(
+            "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)", (bucket, tokens, now, blocked_until)
+        )
+        connection.execute("COMMIT")
+    return wait
+
+def acquire(provider: str, model: str, cost: float = 1.0) -> None:
+    """Blocks until the provider/model bucket grants `cost` requests."""
+    per_minute, burst = rate_limit_for(provider, model)
+    bucket = _bucket_name(provider, model)
+    deadline = time.monotonic() + MAX_WAIT_S
+    while True:
+        wait = _try_acquire(bucket, per_minute, burst, cost)
+        if wait <= 0:
+            return
+        if time.monotonic() + wait > deadline:
+            raise ProviderGatewayError(f"Timed out waiting for the {bucket} rate limit.")
+        # A little jitter so processes that woke together don't collide again.
+        time.sleep(wait + random.uniform(0, 0.05))
+
+def block(provider: str, model: str, seconds: float) -> None:
+    """Pauses a bucket for every process (e.g. after a 429) and empties it."""
+    bucket = _bucket_name(provider, model)
+    with _connect() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        row = connection.execute("SELECT blocked_until FROM buckets WHERE bucket = ?", (bucket,)).fetchone()
+        blocked_until = max(row[0] if row else 0.0, now + seconds)
+        connection.execute("INSERT OR REPLACE INTO buckets VALUES (?, 0, ?, ?)", (bucket, now, blocked_until))
+        connection.execute("COMMIT")
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def _retry_after_s(error: Exception) -> Optional[float]:
+    """Reads retry-after-ms / Retry-After (seconds or HTTP date) from the error's response."""
+    headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def _call_with_limits(provider: str, model: str, fn: Callable[[], T], cost: float) -> T:
+    for attempt in range(MAX_ATTEMPTS):
+        acquire(provider, model, cost)
+        try:
+            return fn()
+        except Exception as e:
+            status = _status_code(e)
+            if status not in RETRYABLE_STATUS or attempt == MAX_ATTEMPTS - 1:
+                raise
+            delay = _retry_after_s(e)
+            if delay is None:
+                delay = min(MAX_BACKOFF_S, BACKOFF_BASE_S * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"{provider}/{model} returned {status}; backing off {delay:.1f}s (attempt {attempt + 1}/{MAX_ATTEMPTS})")
+            block(provider, model, delay)
+
+# Identical requests in flight in this process share one provider call.
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+def _request_key(provider: str, model: str, key: Any) -> str:
+    payload = json.dumps([provider, model, key], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def call(provider: str, model: str, fn: Callable[[], T], key: Any = None, cost: float = 1.0) -> T:
+    """
+    Runs one provider request under its rate limit, retrying throttled and transient
+    failures. If `key` (any JSON-serializable description of the request) is given,
+    concurrent calls with the same key share a single request and its result, so the
+    result must be safe to share between callers.
+    """
+    if key is None:
+        return _call_with_limits(provider, model, fn, cost)
+
+    request_key = _request_key(provider, model, key)
+    with _inflight_lock:
+        future = _inflight.get(request_key)
+        leader = future is None
+        if leader:
+            future = _inflight[request_key] = Future()
+    if not leader:
+        return future.result()
+    try:
+        result = _call_with_limits(provider, model, fn, cost)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[request_key]
@@ -7,10 +7,9 @@ class SpreakerClient:
     """
     A client for interacting with the Spreaker API.
     """
-    BASE_URL = "https://api.spreaker.com/v2"
-
-    def __init__(self, api_token: str):
+    def __init__(self, api_token: str, base_url: Optional[str] = None):
         self.api_token = api_token
+        self.base_url = (base_url or settings.SPREAKER_API_BASE_URL).rstrip("/")
         self.headers = {
             "Authorization": f"Bearer {self.api_token}",
             "Accept": "application/json",
@@ -35,7 +34,7 @@ class SpreakerClient:
         Returns:
             A tuple containing a boolean for success and a status message.
         """
-        endpoint = f"{self.BASE_URL}/shows/{show_id}/episodes"
+        endpoint = f"{self.base_url}/shows/{show_id}/episodes"
 
         data = {
             "title": title,
@@ -0,0 +1,345 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque, defaultdict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+import numpy as np
+
+from ..core.config import settings
+
+# Jobs run in one of two lanes. Short jobs (metadata, previews, short episodes) go
+# first and have workers reserved for them. Long jobs may borrow a reserved worker
+# while no short job is waiting, but only so many at a time that a short arrival waits
+# for at most one long render to finish; long jobs that have waited too long are
+# served before short ones and may borrow every idle reserved worker.
+LANE_SHORT = "short"
+LANE_LONG = "long"
+LANES = (LANE_SHORT, LANE_LONG)
+
+# Recent queue waits kept per tenant for the exported percentiles.
+WAIT_SAMPLES_PER_USER = 1000
+
+class SchedulerError(Exception):
+    """Custom exception for job scheduling failures."""
+    pass
+
+@dataclass
+class Job:
+    user_id: Hashable
+    lane: str
+    cost: float # Expected work, in any unit as long as it is the same for every job
+    submitted_at: float
+    payload: Any = None
+    id: int = field(default_factory=itertools.count().__next__)
+    start_tag: float = 0.0
+    started_at: Optional[float] = None
+
+    @property
+    def wait_s(self) -> Optional[float]:
+        return None if self.started_at is None else self.started_at - self.submitted_at
+
+class WaitStats:
+    """Queue wait per tenant and lane: counts plus a window of recent samples."""
+
+    def __init__(self):
+        self.samples: Dict[Hashable, Deque[float]] = defaultdict(lambda: deque(maxlen=WAIT_SAMPLES_PER_USER))
+        self.dispatched: Dict[Hashable, int] = defaultdict(int)
+        self.by_lane: Dict[str, Deque[float]] = {lane: deque(maxlen=WAIT_SAMPLES_PER_USER) for lane in LANES}
+
+    def record(self, job: Job) -> None:
+        self.samples[job.user_id].append(job.wait_s)
+        self.dispatched[job.user_id] += 1
+        self.by_lane[job.lane].append(job.wait_s)
+
+    @staticmethod
+    def summarize(samples) -> Dict[str, float]:
+        if not samples:
+            return {"count": 0}
+        values = np.fromiter(samples, dtype=float)
+        return {
+            "count": len(values),
+            "mean_s": round(float(values.mean()), 3),
+            "p50_s": round(float(np.percentile(values, 50)), 3),
+            "p95_s": round(float(np.percentile(values, 95)), 3),
+            "max_s": round(float(values.max()), 3),
+        }
+
+class FairQueue:
+    """
+    The scheduling policy, with no threads or clocks of its own so that it can be
+    simulated offline (see simulate()).
+
+    Each lane keeps a queue per tenant and shares workers between tenants by
+    start-time fair queuing: a job's tag is where its tenant's previous job ended in
+    virtual time (cost / weight), or the lane's current virtual time if the tenant was
+    idle. The waiting job with the smallest tag runs next, so a tenant who submits a
+    batch gets their share without pushing everyone else's jobs to the back, and a
+    tenant with twice the weight gets twice the share. Tenants at their concurrency
+    cap are passed over.
+
+    While no short job is waiting, up to `long_jobs_on_reserved` long jobs (any
+    number once the long lane has aged) may run on reserved short-lane workers, so the
+    reservation does not leave workers idle.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_running_per_user: int,
+        reserved_short_workers: int = 0,
+        weight: Callable[[Hashable], float] = lambda user_id: 1.0,
+        long_lane_aging_s: Optional[float] = None,
+        long_jobs_on_reserved: int = 1
+    ):
+        if workers < 1 or max_running_per_user < 1:
+            raise SchedulerError("The scheduler needs at least one worker and one job per tenant.")
+        if not 0 <= reserved_short_workers < workers:
+            raise SchedulerError("Reserved short-lane workers must leave at least one worker for long jobs.")
+        self.workers = workers
+        self.max_running_per_user = max_running_per_user
+        self.reserved_short_workers = reserved_short_workers
+        self.weight = weight
+        self.long_lane_aging_s = long_lane_aging_s
+        self.long_jobs_on_reserved = min(max(long_jobs_on_reserved, 0), reserved_short_workers)
+        self.queues: Dict[str, Dict[Hashable, Deque[Job]]] = {lane: {} for lane in LANES}
+        self.virtual_time: Dict[str, float] = {lane: 0.0 for lane in LANES}
+        self.last_finish_tag: Dict[str, Dict[Hashable, float]] = {lane: {} for lane in LANES}
+        self.running: Dict[Hashable, int] = defaultdict(int)
+        self.running_by_lane: Dict[str, int] = {lane: 0 for lane in LANES}
+        self.waits = WaitStats()
+
+    def submit(self, job: Job) -> None:
+        if job.lane not in LANES:
+            raise SchedulerError(f"Unknown lane: {job.lane}")
+        weight = self.weight(job.user_id)
+        if weight <= 0:
+            raise SchedulerError(f"Tenant weights must be positive (got {weight}).")
+        finish_tags = self.last_finish_tag[job.lane]
+        job.start_tag = max(self.virtual_time[job.lane], finish_tags.get(job.user_id, 0.0))
+        finish_tags[job.user_id] = job.start_tag + max(job.cost, 0.0) / weight
+        self.queues[job.lane].setdefault(job.user_id, deque()).append(job)
+
+    def _oldest_submission(self, lane: str) -> Optional[float]:
+        heads = [queue[0].submitted_at for queue in self.queues[lane].values()]
+        return min(heads) if heads else None
+
+    def _long_lane_aged(self, now: float) -> bool:
+        if self.long_lane_aging_s is None:
+            return False
+        oldest = self._oldest_submission(LANE_LONG)
+        return oldest is not None and now - oldest >= self.long_lane_aging_s
+
+    def _eligible(self, lane: str) -> List[Job]:
+        return [queue[0] for user_id, queue in self.queues[lane].items() if self.running.get(user_id, 0) < self.max_running_per_user]
+
+    def _long_lane_cap(self, aged: bool) -> int:
+        cap = self.workers - self.reserved_short_workers
+        if self._eligible(LANE_SHORT):
+            return cap
+        return self.workers if aged else cap + self.long_jobs_on_reserved
+
+    def next(self, now: float) -> Optional[Job]:
+        """Takes the job that should run on a free worker now, if any is allowed to."""
+        if sum(self.running_by_lane.values()) >= self.workers:
+            return None
+        aged = self._long_lane_aged(now)
+        for lane in ([LANE_LONG, LANE_SHORT] if aged else [LANE_SHORT, LANE_LONG]):
+            eligible = self._eligible(lane)
+            if not eligible:
+                continue
+            if lane == LANE_LONG and self.running_by_lane[LANE_LONG] >= self._long_lane_cap(aged):
+                continue
+            queues = self.queues[lane]
+            job = min(eligible, key=lambda candidate: (candidate.start_tag, candidate.submitted_at, candidate.id))
+            queue = queues[job.user_id]
+            queue.popleft()
+            if not queue:
+                del queues[job.user_id]
+            self.virtual_time[lane] = max(self.virtual_time[lane], job.start_tag)
+            self.running[job.user_id] += 1
+            self.running_by_lane[lane] += 1
+            job.started_at = now
+            self.waits.record(job)
+            return job
+        return None
+
+    def finished(self, job: Job) -> None:
+        self.running[job.user_id] -= 1
+        if not self.running[job.user_id]:
+            del self.running[job.user_id]
+        self.running_by_lane[job.lane] -= 1
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        """Queue depth, running jobs and queue wait percentiles, per tenant and per lane."""
+        queued_by_tenant: Dict[Hashable, List[Job]] = defaultdict(list)
+        for lane in LANES:
+            for queue in self.queues[lane].values():
+                for job in queue:
+                    queued_by_tenant[job.user_id].append(job)
+        tenants = set(self.running) | set(self.waits.dispatched) | set(queued_by_tenant)
+        per_tenant = {}
+        for user_id in tenants:
+            queued = queued_by_tenant.get(user_id, [])
+            per_tenant[str(user_id)] = {
+                "weight": self.weight(user_id),
+                "running": self.running.get(user_id, 0),
+                "queued": len(queued),
+                "oldest_queued_s": round(now - min(job.submitted_at for job in queued), 3) if queued else None,
+                "dispatched": self.waits.dispatched.get(user_id, 0),
+                "wait": WaitStats.summarize(self.waits.samples.get(user_id, ())),
+            }
+        return {
+            "workers": self.workers,
+            "running": dict(self.running_by_lane),
+            "queued": {lane: sum(len(queue) for queue in self.queues[lane].values()) for lane in LANES},
+            "wait_by_lane": {lane: WaitStats.summarize(self.waits.by_lane[lane]) for lane in LANES},
+            "tenants": per_tenant,
+        }
+
+class FifoQueue(FairQueue):
+    """First come, first served on every worker: the behaviour before the scheduler, for comparison."""
+
+    def __init__(self, workers: int):
+        super().__init__(workers, max_running_per_user=workers)
+
+    def submit(self, job: Job) -> None:
+        job.start_tag = job.submitted_at
+        self.queues[LANE_LONG].setdefault(None, deque()).append(job)
+
+    def next(self, now: float) -> Optional[Job]:
+        queue = self.queues[LANE_LONG].get(None)
+        if not queue or sum(self.running_by_lane.values()) >= self.workers:
+            return None
+        job = queue.popleft()
+        if not queue:
+            del self.queues[LANE_LONG][None]
+        self.running[job.user_id] += 1
+        self.running_by_lane[job.lane] += 1
+        job.started_at = now
+        self.waits.record(job)
+        return job
+
+@dataclass
+class SimulatedJob:
+    user_id: Hashable
+    lane: str
+    arrival_s: float
+    duration_s: float
+    cost: Optional[float] = None # Defaults to the duration
+
+def simulate(jobs: List[SimulatedJob], queue: FairQueue) -> Dict[str, Any]:
+    """
+    Replays a workload against a scheduling policy in virtual time: jobs arrive, wait
+    for the policy to hand them a worker and then take exactly their duration. Returns
+    the policy's snapshot at the end (queue waits per tenant and lane) and the makespan.
+    """
+    events: List = []
+    sequence = itertools.count()
+    for simulated in jobs:
+        heapq.heappush(events, (simulated.arrival_s, next(sequence), "arrive", simulated))
+    now = 0.0
+    while events:
+        now, _, kind, item = heapq.heappop(events)
+        if kind == "arrive":
+            cost = item.duration_s if item.cost is None else item.cost
+            queue.submit(Job(item.user_id, item.lane, cost, now, payload=item))
+        else:
+            queue.finished(item)
+        # Handle every event at this instant before dispatching.
+        if events and events[0][0] == now:
+            continue
+        while (job := queue.next(now)) is not None:
+            heapq.heappush(events, (now + job.payload.duration_s, next(sequence), "finish", job))
+    return {**queue.snapshot(now), "makespan_s": round(now, 3)}
+
+class Scheduler:
+    """Runs submitted callables on a fixed pool of worker threads, in FairQueue order."""
+
+    def __init__(self, queue: FairQueue):
+        self.queue = queue
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def _start(self) -> None:
+        if self._threads:
+            return
+        for index in range(self.queue.workers):
+            thread = threading.Thread(target=self._work, name=f"scheduler-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(
+        self,
+        user_id: Hashable,
+        lane: str,
+        cost: float,
+        fn: Callable[..., Any],
+        /,
+        *args,
+        on_dispatch: Optional[Callable[[float], None]] = None,
+        **kwargs
+    ) -> Future:
+        """
+        Queues fn(*args, **kwargs) for the tenant and returns a Future for its result.
+        on_dispatch(wait_s) is called on the worker thread just before fn starts.
+        """
+        future: Future = Future()
+        job = Job(user_id, lane, cost, time.monotonic(), payload=(future, fn, args, kwargs, on_dispatch))
+        with self._condition:
+            self.queue.submit(job)
+            self._start()
+            self._condition.notify()
+        return future
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while (job := self.queue.next(time.monotonic())) is None:
+                    self._condition.wait()
+            future, fn, args, kwargs, on_dispatch = job.payload
+            try:
+                if future.set_running_or_notify_cancel():
+                    if on_dispatch:
+                        on_dispatch(job.wait_s)
+                    future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                job.payload = None
+                with self._condition:
+                    self.queue.finished(job)
+                    self._condition.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._condition:
+            return self.queue.snapshot(time.monotonic())
+
+_scheduler: Optional[Scheduler] = None
+_scheduler_lock = threading.Lock()
+
+def _configured_weight(user_id: Hashable) -> float:
+    return settings.SCHEDULER_USER_WEIGHTS.get(str(user_id), 1.0)
+
+def get_scheduler() -> Scheduler:
+    """The process-wide scheduler, created from settings on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(FairQueue(
+                workers=settings.SCHEDULER_WORKERS,
+                max_running_per_user=settings.SCHEDULER_MAX_RUNNING_PER_USER,
+                reserved_short_workers=settings.SCHEDULER_RESERVED_SHORT_WORKERS,
+                weight=_configured_weight,
+                long_lane_aging_s=settings.SCHEDULER_LONG_LANE_AGING_S,
+                long_jobs_on_reserved=settings.SCHEDULER_LONG_JOBS_ON_RESERVED,
+            ))
+        return _scheduler
+
+async def run(user_id: Hashable, lane: str, cost: float, fn: Callable[..., Any], /, *args, **kwargs) -> Any:
+    """Runs fn on the scheduler's workers and waits for it without blocking the event loop."""
+    return await asyncio.wrap_future(get_scheduler().submit(user_id, lane, cost, fn, *args, **kwargs))
@@ -0,0 +1,103 @@
+import json
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any
+from uuid import UUID
+
+# The search index lives in its own SQLite file next to database.db so that heavy
+# indexing writes never contend with the main application database.
+SEARCH_DB_PATH = Path("search.db")
+
+# Words are indexed in short passages; each hit points at its passage's start time.
+PASSAGE_WORDS = 12
+SNIPPET_TOKENS = 16
+MAX_RESULTS = 50
+
+class SearchIndexError(Exception):
+    """Custom exception for transcript search failures."""
+    pass
+
+@contextmanager
+def _connect():
+    connection = sqlite3.connect(SEARCH_DB_PATH, timeout=30)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        # The owner is stored as an indexed token (user_key) so the per-user filter is
+        # part of the full-text lookup rather than a scan over every matching passage.
+        connection.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS transcript_passages USING fts5("
+            "text, user_key, episode_id UNINDEXED, start_s UNINDEXED, "
+            "tokenize='porter unicode61')"
+        )
+        # Each episode's passages occupy one contiguous rowid range, so re-indexing can
+        # delete them by rowid instead of scanning the unindexed episode_id column.
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS indexed_episodes ("
+            "episode_id TEXT PRIMARY KEY, first_rowid INTEGER, last_rowid INTEGER, indexed_at TEXT)"
+        )
+        yield connection
+        connection.commit()
+    except sqlite3.Error as e:
+        connection.rollback()
+        raise SearchIndexError(f"Search index error: {e}")
+    finally:
+        connection.close()
+
+def _passages(words: List[Dict[str, Any]]):
+    for i in range(0, len(words), PASSAGE_WORDS):
+        group = words[i:i + PASSAGE_WORDS]
+        yield " ".join(w['word'] for w in group), round(group[0]['start'], 3)
+
+def index_episode(episode_id: UUID, user_id: UUID, words: List[Dict[str, Any]]) -> int:
+    """
+    (Re)indexes one episode's word timestamps. Existing passages for the episode are
+    replaced in the same transaction, so re-processing an episode is idempotent.
+    """
+    rows = [(text, user_id.hex, str(episode_id), start) for text, start in _passages(words)]
+    with _connect() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        previous = connection.execute(
+            "SELECT first_rowid, last_rowid FROM indexed_episodes WHERE episode_id = ?", (str(episode_id),)
+        ).fetchone()
+        if previous:
+            connection.execute("DELETE FROM transcript_passages WHERE rowid BETWEEN ? AND ?", previous)
+        first_rowid = connection.execute("SELECT COALESCE(MAX(rowid), 0) + 1 FROM transcript_passages").fetchone()[0]
+        connection.executemany(
+            "INSERT INTO transcript_passages (rowid, text, user_key, episode_id, start_s) VALUES (?, ?, ?, ?, ?)",
+            [(first_rowid + i, *row) for i, row in enumerate(rows)]
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO indexed_episodes VALUES (?, ?, ?, datetime('now'))",
+            (str(episode_id), first_rowid, first_rowid + len(rows) - 1)
+        )
+    return len(rows)
+
+def index_transcript_file(episode_id: UUID, user_id: UUID, json_path: Path) -> int:
+    """Indexes the word-level JSON written by transcript_export."""
+    with open(json_path, encoding="utf-8") as f:
+        words = json.load(f)["words"]
+    return index_episode(episode_id, user_id, words)
+
+def _match_expression(user_id: UUID, query: str) -> str:
+    """
+    Turns free text into an FTS5 query scoped to one user, where every term must
+    appear in the passage (the last one as a prefix, for search-as-you-type).
+    """
+    terms = [term.replace('"', '""') for term in query.split()]
+    if not terms:
+        raise SearchIndexError("Search query is empty.")
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return f'user_key : "{user_id.hex}" AND text : ({" ".join(quoted)})'
+
+def search(user_id: UUID, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """Returns the best-ranked passages for the user's episodes, with start times."""
+    limit = max(1, min(limit, MAX_RESULTS))
+    with _connect() as connection:
+        rows = connection.execute(
+            "SELECT episode_id, start_s, snippet(transcript_passages, 0, '[', ']', '…', ?) "
+            "FROM transcript_passages WHERE transcript_passages MATCH ? ORDER BY rank LIMIT ?",
+            (SNIPPET_TOKENS, _match_expression(user_id, query), limit),
+        ).fetchall()
+    return [{"episode_id": episode_id, "start_s": start_s, "snippet": snippet} for episode_id, start_s, snippet in rows]
@@ -0,0 +1,303 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Callable, Sequence
+
+import numpy as np
+
+from ..models.podcast import TemplateSegment, SegmentTiming, BackgroundMusicRule
+from . import music_bed
+from .audio_buffer import AudioBuffer, MIX_BLOCK_FRAMES
+
+# Clips live on tracks: "main" holds the spoken sequence (intros, content, commercials,
+# outros), "fx" the sound effects and transitions laid over it, and "music" the beds.
+MAIN_TRACK = "main"
+FX_TRACK = "fx"
+MUSIC_TRACK = "music"
+SEQUENTIAL_TYPES = {"intro", "content", "commercial", "outro"}
+
+class TimelineError(Exception):
+    """Custom exception for timeline placement and rendering failures."""
+    pass
+
+@dataclass
+class Clip:
+    """A piece of audio (or a music bed) placed at a frame position on a track."""
+    track: str
+    kind: str
+    start: int
+    length: int
+    audio: Optional[AudioBuffer] = None
+    rule: Optional[BackgroundMusicRule] = None
+    segment_id: Optional[str] = None
+
+    @property
+    def end(self) -> int:
+        return self.start + self.length
+
+class IntervalIndex:
+    """
+    Static interval tree over clips: a balanced binary tree on clip start, each node
+    holding the latest end in its subtree. A query for the clips overlapping a range
+    takes O(log n + k) for k results.
+    """
+
+    def __init__(self, clips: Sequence[Clip]):
+        self._order = sorted(range(len(clips)), key=lambda i: clips[i].start)
+        self._clips = [clips[i] for i in self._order]
+        self._starts = [c.start for c in self._clips]
+        self._max_end = [0] * len(self._clips)
+        self._build(0, len(self._clips))
+
+    def _build(self, lo: int, hi: int) -> int:
+        if lo >= hi:
+            return -1
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(self._clips[mid].end, self._build(lo, mid), self._build(mid + 1, hi))
+        return self._max_end[mid]
+
+    def overlapping(self, lo: int, hi: int) -> List[Clip]:
+        """Clips with any frame in [lo, hi), in the order they were added."""
+        found: List[int] = []
+        stack = [(0, len(self._clips))]
+        while stack:
+            left, right = stack.pop()
+            if left >= right:
+                continue
+            mid = (left + right) // 2
+            if self._max_end[mid] <= lo:
+                continue  # Everything in this subtree ends before the range.
+            stack.append((left, mid))
+            if self._starts[mid] < hi:
+                if self._clips[mid].end > lo:
+                    found.append(mid)
+                stack.append((mid + 1, right))
+        return [self._clips[i] for i in sorted(found, key=lambda i: self._order[i])]
+
+class Timeline:
+    def __init__(self, frame_rate: int, channels: int, sample_width: int):
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.clips: List[Clip] = []
+
+    def frames(self, seconds: float) -> int:
+        return int(seconds * self.frame_rate)
+
+    def add(self, clip: Clip) -> Clip:
+        if clip.audio is not None and clip.audio.format != (self.frame_rate, self.channels, self.sample_width):
+            raise TimelineError("Clip audio must be conformed to the timeline's format.")
+        self.clips.append(clip)
+        return clip
+
+    @property
+    def length(self) -> int:
+        return max((c.end for c in self.clips if c.track != MUSIC_TRACK), default=0)
+
+    def regions(self, kind: str) -> List[Tuple[int, int]]:
+        """Spans covered by clips of one kind on the main track, touching clips merged."""
+        spans: List[Tuple[int, int]] = []
+        for clip in sorted((c for c in self.clips if c.track == MAIN_TRACK and c.kind == kind), key=lambda c: c.start):
+            if spans and clip.start <= spans[-1][1]:
+                spans[-1] = (spans[-1][0], max(spans[-1][1], clip.end))
+            else:
+                spans.append((clip.start, clip.end))
+        return spans
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [
+            {"track": c.track, "kind": c.kind, "segment_id": c.segment_id,
+             "start_s": round(c.start / self.frame_rate, 3), "end_s": round(c.end / self.frame_rate, 3)}
+            for c in sorted(self.clips, key=lambda c: (c.start, c.track))
+        ]
+
+class _ContentMap:
+    """Maps positions in the main content onto the timeline, across mid-roll splits."""
+
+    def __init__(self):
+        self.pieces: List[Tuple[int, int, int]] = []  # (content_start, timeline_start, length)
+
+    def add(self, content_start: int, timeline_start: int, length: int) -> None:
+        self.pieces.append((content_start, timeline_start, length))
+
+    def to_timeline(self, content_frame: int) -> Optional[int]:
+        for content_start, timeline_start, length in self.pieces:
+            if content_start <= content_frame <= content_start + length:
+                return timeline_start + content_frame - content_start
+        return None
+
+def place_segments(
+    timeline: Timeline,
+    segments: List[Tuple[TemplateSegment, AudioBuffer]],
+    timing: SegmentTiming,
+    log: List[str]
+) -> None:
+    """
+    Lays the template's segments out on the timeline. Intros, content, commercials and
+    outros follow each other in template order; content and outros start early or late
+    by the SegmentTiming offsets where they follow a different kind of segment.
+    Commercials with an anchor are inserted into the content at that point as
+    mid-rolls. Sound effects start, and transitions are centred, at the boundary where
+    they appear in the template, or at their anchor in the content.
+    """
+    mid_rolls = sorted(
+        ((timeline.frames(rule.anchor_s), rule, audio) for rule, audio in segments
+         if rule.segment_type == "commercial" and rule.anchor_s is not None),
+        key=lambda item: item[0]
+    )
+    content_map = _ContentMap()
+    anchored_overlays = []
+    cursor = 0
+    content_elapsed = 0
+    previous_kind = None
+
+    for rule, audio in segments:
+        kind = rule.segment_type
+        segment_id = str(rule.id)
+        if kind in ("sound_effect", "transition"):
+            if rule.anchor_s is not None:
+                anchored_overlays.append((rule, audio))
+                continue
+            start = cursor if kind == "sound_effect" else cursor - audio.frame_count // 2
+            timeline.add(Clip(FX_TRACK, kind, max(0, start), audio.frame_count, audio, segment_id=segment_id))
+            continue
+        if kind == "commercial" and rule.anchor_s is not None:
+            continue  # Placed with the content below.
+
+        start = cursor
+        if previous_kind is not None and previous_kind != kind:
+            if kind == "content":
+                start += timeline.frames(timing.content_start_offset_s)
+            elif kind == "outro":
+                start += timeline.frames(timing.outro_start_offset_s)
+        start = max(0, start)
+
+        if kind != "content":
+            timeline.add(Clip(MAIN_TRACK, kind, start, audio.frame_count, audio, segment_id=segment_id))
+            cursor = start + audio.frame_count
+        else:
+            # Split the content wherever a mid-roll falls inside it.
+            position = 0
+            while position < audio.frame_count:
+                next_break = audio.frame_count
+                if mid_rolls and mid_rolls[0][0] - content_elapsed < audio.frame_count:
+                    next_break = max(position, mid_rolls[0][0] - content_elapsed)
+                piece = audio.frames(position, next_break)
+                if len(piece.samples):
+                    timeline.add(Clip(MAIN_TRACK, kind, start, piece.frame_count, piece, segment_id=segment_id))
+                    content_map.add(content_elapsed + position, start, piece.frame_count)
+                    start += piece.frame_count
+                if next_break < audio.frame_count:
+                    _, ad_rule, ad_audio = mid_rolls.pop(0)
+                    timeline.add(Clip(MAIN_TRACK, "commercial", start, ad_audio.frame_count, ad_audio, segment_id=str(ad_rule.id)))
+                    log.append(f"Inserted mid-roll at {ad_rule.anchor_s:.1f}s into the content")
+                    start += ad_audio.frame_count
+                position = next_break
+            content_elapsed += audio.frame_count
+            cursor = start
+        previous_kind = kind
+
+    for _, ad_rule, ad_audio in mid_rolls:
+        log.append(f"WARNING: Mid-roll anchor {ad_rule.anchor_s:.1f}s is past the end of the content. Skipping.")
+    for rule, audio in anchored_overlays:
+        position = content_map.to_timeline(timeline.frames(rule.anchor_s))
+        if position is None:
+            log.append(f"WARNING: {rule.segment_type} anchor {rule.anchor_s:.1f}s is outside the content. Skipping.")
+            continue
+        start = position if rule.segment_type == "sound_effect" else position - audio.frame_count // 2
+        timeline.add(Clip(FX_TRACK, rule.segment_type, max(0, start), audio.frame_count, audio, segment_id=str(rule.id)))
+
+def place_music(
+    timeline: Timeline,
+    rules: List[BackgroundMusicRule],
+    resolve_track: Callable[[str], Path],
+    log: List[str]
+) -> Dict[str, np.ndarray]:
+    """
+    Adds a music clip for every region each rule targets and returns the decoded
+    tracks by filename. Regions are the runs of intro, content or outro clips, so
+    content split by mid-rolls gets a bed (with its fades) per part.
+    """
+    tracks: Dict[str, np.ndarray] = {}
+    for rule in rules:
+        music_path = resolve_track(rule.music_filename)
+        if not music_path.exists():
+            log.append(f"WARNING: Music file not found: {rule.music_filename}. Skipping.")
+            continue
+        if rule.music_filename not in tracks:
+            tracks[rule.music_filename] = music_bed.load_track(music_path, timeline.frame_rate, timeline.channels)
+        for segment_name in rule.apply_to_segments:
+            for region_start, region_end in timeline.regions(segment_name):
+                start = max(0, region_start + timeline.frames(rule.start_offset_s))
+                end = min(timeline.length, region_end - timeline.frames(rule.end_offset_s))
+                if end <= start:
+                    continue
+                timeline.add(Clip(MUSIC_TRACK, "music", start, end - start, rule=rule))
+                log.append(f"Applied music '{rule.music_filename}' to {segment_name} ({(end - start) / timeline.frame_rate:.1f}s)")
+    return tracks
+
+def _voice_envelope(audio: AudioBuffer) -> np.ndarray:
+    """music_bed.voice_envelope_db of the whole buffer, measured a block at a time."""
+    frame = max(1, int(audio.frame_rate * music_bed.ENVELOPE_FRAME_S))
+    block = frame * max(1, MIX_BLOCK_FRAMES // frame)
+    parts = [
+        music_bed.voice_envelope_db(audio.frames(start, start + block).to_float(), audio.frame_rate)
+        for start in range(0, audio.frame_count, block)
+    ]
+    return np.concatenate(parts) if parts else np.zeros(0)
+
+def render(timeline: Timeline, tracks: Optional[Dict[str, np.ndarray]] = None, out_path: Optional[Path] = None) -> AudioBuffer:
+    """
+    Renders the timeline block by block, asking the interval index which clips are
+    active in each block. Voice and effects are summed first and clipped once at full
+    scale; music beds are then ducked under that mix and added in float. With out_path
+    the mix is rendered into a mapped WAV file there instead of into memory.
+    """
+    tracks = tracks or {}
+    index = IntervalIndex(timeline.clips)
+    if out_path is not None:
+        output = AudioBuffer.create_wav(out_path, timeline.length, timeline.frame_rate, timeline.channels, timeline.sample_width)
+    else:
+        output = AudioBuffer.silent(timeline.length, timeline.frame_rate, timeline.channels, timeline.sample_width)
+    limits = np.iinfo(output.samples.dtype)
+    accumulator = np.empty((MIX_BLOCK_FRAMES, timeline.channels), dtype=np.int64)
+
+    for lo in range(0, timeline.length, MIX_BLOCK_FRAMES):
+        hi = min(timeline.length, lo + MIX_BLOCK_FRAMES)
+        active = [c for c in index.overlapping(lo, hi) if c.audio is not None]
+        if not active:
+            continue
+        block = accumulator[:hi - lo]
+        block[:] = 0
+        for clip in active:
+            first, last = max(lo, clip.start), min(hi, clip.end)
+            block[first - lo:last - lo] += clip.audio.samples[first - clip.start:last - clip.start]
+        np.clip(block, limits.min, limits.max, out=block)
+        output.samples[lo:hi] = block
+
+    beds = [c for c in timeline.clips if c.track == MUSIC_TRACK]
+    if not beds:
+        return output
+    # Measured on the voice-only mix, before any music has been added.
+    envelope = _voice_envelope(output)
+    ducking: Dict[float, np.ndarray] = {}
+    ramps = {}
+    for bed in beds:
+        if bed.rule.duck_db not in ducking:
+            ducking[bed.rule.duck_db] = music_bed.ducking_gain(envelope, bed.rule.duck_db)
+        ramps[id(bed)] = music_bed.fade_ramps(bed.rule, bed.length, timeline.frame_rate)
+    music = np.empty((MIX_BLOCK_FRAMES, timeline.channels), dtype=np.float32)
+    for lo in range(0, timeline.length, MIX_BLOCK_FRAMES):
+        hi = min(timeline.length, lo + MIX_BLOCK_FRAMES)
+        active = [c for c in index.overlapping(lo, hi) if c.track == MUSIC_TRACK]
+        if not active:
+            continue
+        target = output.frames(lo, hi)
+        mix = target.to_float()
+        for bed in active:
+            first, last = max(lo, bed.start), min(hi, bed.end)
+            mix[first - lo:last - lo] += music_bed.bed_block(
+                tracks[bed.rule.music_filename], bed.start, bed.end, bed.rule, timeline.frame_rate,
+                ducking[bed.rule.duck_db], ramps[id(bed)], first, last, out=music
+            )
+        target.write_float(mix)
+    return output
@@ -0,0 +1,205 @@
+import json
+import math
+import re
+from bisect import bisect_right
+from collections import Counter, deque
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+
+# Captions are broken after this many words, or at a pause longer than CUE_PAUSE_S.
+MAX_WORDS_PER_CUE = 15
+CUE_PAUSE_S = 0.7
+
+# Chapter detection: a new chapter starts at a long pause, or where the vocabulary of
+# the last few cues stops resembling the chapter so far. Chapters are never shorter
+# than MIN_CHAPTER_S.
+CHAPTER_PAUSE_S = 2.5
+MIN_CHAPTER_S = 120.0
+TOPIC_WINDOW_CUES = 8
+TOPIC_SHIFT_SIMILARITY = 0.15
+CHAPTER_TITLE_WORDS = 3
+
+STOPWORDS = {
+    "the", "a", "an", "and", "or", "but", "so", "to", "of", "in", "on", "at", "for", "with",
+    "is", "are", "was", "were", "be", "been", "it", "its", "this", "that", "these", "those",
+    "i", "you", "he", "she", "we", "they", "me", "him", "her", "us", "them", "my", "your",
+    "our", "their", "do", "did", "does", "have", "has", "had", "not", "just", "like", "um",
+    "uh", "yeah", "know", "really", "what", "there", "then", "about", "if", "can", "get",
+    "going", "think", "all", "one", "would", "could", "out", "up", "as", "from", "by",
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+class TranscriptExportError(Exception):
+    """Custom exception for transcript export failures."""
+    pass
+
+def _format_timestamp(seconds: float, separator: str = ",") -> str:
+    """Helper function to format seconds into HH:MM:SS,ms format (or HH:MM:SS.ms for VTT)."""
+    total_ms = int(round(seconds * 1000))
+    hours, rest = divmod(total_ms, 3600 * 1000)
+    minutes, rest = divmod(rest, 60 * 1000)
+    secs, millis = divmod(rest, 1000)
+    return f"{hours:02}:{minutes:02}:{secs:02}{separator}{millis:03}"
+
+class TimeMap:
+    """
+    Maps timestamps in the source recording onto the cleaned audio, using the
+    cleanup edit list from audio_processor.plan_cleanup.
+    """
+
+    def __init__(self, edit_list: Optional[List[Tuple[Optional[int], int]]]):
+        self.source_starts: List[int] = []
+        self.source_ends: List[int] = []
+        self.output_starts: List[int] = []
+        self.identity = edit_list is None
+        output_ms = 0
+        for start_ms, end_ms in edit_list or []:
+            if start_ms is None:
+                output_ms += end_ms
+                continue
+            self.source_starts.append(start_ms)
+            self.source_ends.append(end_ms)
+            self.output_starts.append(output_ms)
+            output_ms += end_ms - start_ms
+
+    def remap_word(self, start_s: float, end_s: float) -> Optional[Tuple[float, float]]:
+        """
+        Returns the word's span on the cleaned timeline, or None if the word was cut.
+        A word is kept when its midpoint falls inside a kept piece.
+        """
+        if self.identity:
+            return start_s, end_s
+        midpoint_ms = (start_s + end_s) * 500
+        i = bisect_right(self.source_starts, midpoint_ms) - 1
+        if i < 0 or midpoint_ms >= self.source_ends[i]:
+            return None
+        piece_start, piece_end, output_start = self.source_starts[i], self.source_ends[i], self.output_starts[i]
+        start_ms = min(max(start_s * 1000, piece_start), piece_end)
+        end_ms = min(max(end_s * 1000, piece_start), piece_end)
+        return (output_start + start_ms - piece_start) / 1000, (output_start + end_ms - piece_start) / 1000
+
+def _iter_cues(word_timestamps: List[Dict[str, Any]], time_map: TimeMap) -> Iterator[Dict[str, Any]]:
+    """
+    Single pass over the words, yielding caption cues on the cleaned timeline. Each
+    cue carries its words (with remapped timings) and the pause that preceded it.
+    """
+    words: List[Dict[str, Any]] = []
+    pause_before = 0.0
+    previous_end: Optional[float] = None
+    for word_data in word_timestamps:
+        span = time_map.remap_word(word_data['start'], word_data['end'])
+        if span is None:
+            continue
+        word = {'word': word_data['word'].strip(), 'start': round(span[0], 3), 'end': round(span[1], 3)}
+        pause = word['start'] - previous_end if previous_end is not None else word['start']
+        if words and (len(words) >= MAX_WORDS_PER_CUE or pause > CUE_PAUSE_S):
+            yield {'start': words[0]['start'], 'end': words[-1]['end'], 'words': words, 'pause_before': pause_before}
+            words = []
+        if not words:
+            pause_before = pause
+        words.append(word)
+        previous_end = word['end']
+    if words:
+        yield {'start': words[0]['start'], 'end': words[-1]['end'], 'words': words, 'pause_before': pause_before}
+
+def _content_words(cue: Dict[str, Any]) -> Counter:
+    counts = Counter()
+    for word in cue['words']:
+        for token in WORD_PATTERN.findall(word['word'].lower()):
+            if token not in STOPWORDS and len(token) > 2:
+                counts[token] += 1
+    return counts
+
+def _cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[token] for token, count in a.items() if token in b)
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm
+
+class _ChapterDetector:
+    """Accumulates cues and splits them into chapters on long pauses or topic shifts."""
+
+    def __init__(self):
+        self.chapters: List[Dict[str, Any]] = []
+        self.chapter_start: Optional[float] = None
+        self.chapter_words = Counter()
+        self.recent: deque = deque()
+
+    def _close(self, next_start: float, carried: Counter) -> None:
+        title_words = [token for token, _ in self.chapter_words.most_common(CHAPTER_TITLE_WORDS)]
+        self.chapters.append({
+            'start': self.chapter_start,
+            'title': " ".join(title_words).title() or f"Chapter {len(self.chapters) + 1}",
+        })
+        self.chapter_start = next_start
+        self.chapter_words = carried
+
+    def _absorb_recent(self) -> None:
+        for _, recent_words in self.recent:
+            self.chapter_words.update(recent_words)
+        self.recent.clear()
+
+    def add(self, cue: Dict[str, Any]) -> None:
+        if self.chapter_start is None:
+            self.chapter_start = cue['start']
+        if cue['pause_before'] >= CHAPTER_PAUSE_S and cue['start'] - self.chapter_start >= MIN_CHAPTER_S:
+            self._absorb_recent()
+            self._close(cue['start'], Counter())
+
+        self.recent.append((cue['start'], _content_words(cue)))
+        if len(self.recent) > TOPIC_WINDOW_CUES:
+            self.chapter_words.update(self.recent.popleft()[1])
+        window_start = self.recent[0][0]
+        if len(self.recent) == TOPIC_WINDOW_CUES and window_start - self.chapter_start >= MIN_CHAPTER_S:
+            window = Counter()
+            for _, recent_words in self.recent:
+                window.update(recent_words)
+            if _cosine(self.chapter_words, window) < TOPIC_SHIFT_SIMILARITY:
+                self.recent.clear()
+                self._close(window_start, window)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        if self.chapter_start is not None:
+            self._absorb_recent()
+            self._close(self.chapter_start, Counter())
+        return self.chapters
+
+def export_transcript(
+    word_timestamps: List[Dict[str, Any]],
+    output_stem: str,
+    output_dir: Path,
+    edit_list: Optional[List[Tuple[Optional[int], int]]] = None
+) -> Dict[str, Any]:
+    """
+    Streams over the word timestamps once and writes the timestamped .txt transcript,
+    SRT and WebVTT captions, and a JSON file with word-level timings and chapters.
+    All timings are remapped through the cleanup edit list when one is given.
+    """
+    paths = {fmt: output_dir / f"{output_stem}.{fmt}" for fmt in ("txt", "srt", "vtt", "json")}
+    chapters = _ChapterDetector()
+    try:
+        with open(paths["txt"], "w", encoding="utf-8") as txt, \
+                open(paths["srt"], "w", encoding="utf-8") as srt, \
+                open(paths["vtt"], "w", encoding="utf-8") as vtt, \
+                open(paths["json"], "w", encoding="utf-8") as js:
+            vtt.write("WEBVTT\n\n")
+            js.write('{"words": [')
+            first_word = True
+            for number, cue in enumerate(_iter_cues(word_timestamps, TimeMap(edit_list)), start=1):
+                text = " ".join(word['word'] for word in cue['words'])
+                start, end = cue['start'], cue['end']
+                txt.write(f"[{_format_timestamp(start)} --> {_format_timestamp(end)}]\n{text}\n\n")
+                srt.write(f"{number}\n{_format_timestamp(start)} --> {_format_timestamp(end)}\n{text}\n\n")
+                vtt.write(f"{_format_timestamp(start, '.')} --> {_format_timestamp(end, '.')}\n{text}\n\n")
+                for word in cue['words']:
+                    js.write(("" if first_word else ",") + json.dumps(word))
+                    first_word = False
+                chapters.add(cue)
+            chapter_list = chapters.finish()
+            js.write('], "chapters": ' + json.dumps(chapter_list) + '}')
+    except OSError as e:
+        raise TranscriptExportError(f"Failed to write transcript: {e}")
+
+    return {"paths": {fmt: str(path) for fmt, path in paths.items()}, "chapters": chapter_list}
@@ -1,68 +1,203 @@
 import os
-import io
-import openai
+import subprocess
+import tempfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Callable
 from pydub import AudioSegment
 
-from ..core.config import settings
-
-client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+from ..core.clients import get_openai_client
+from . import provider_gateway
 
 UPLOAD_DIR = Path("temp_uploads")
 
-# OpenAI Whisper API has a 25MB file size limit. To handle larger files,
-# we will chunk the audio into 10-minute segments, as a 10-minute MP3
-# will reliably be under the 25MB limit.
-CHUNK_DURATION_MS = 10 * 60 * 1000
+# Whisper only needs speech-band audio, so chunks are sent as 16 kHz mono MP3 at a
+# low bitrate. The OpenAI Whisper API has a 25MB upload limit; at this bitrate that
+# allows close to two hours per chunk, and chunks are sized to use most of it.
+SAMPLE_RATE = 16000
+CHUNK_BITRATE_KBPS = 32
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+UPLOAD_SAFETY_MARGIN = 0.92
+CHUNK_TARGET_S = MAX_UPLOAD_BYTES * 8 * UPLOAD_SAFETY_MARGIN / (CHUNK_BITRATE_KBPS * 1000)
+
+# Chunk boundaries are moved back to the quietest point within this window before the
+# target length, so a cut never lands in the middle of a word.
+SILENCE_SEARCH_S = 30.0
+SILENCE_FRAME_S = 0.02
+SILENCE_SMOOTHING_FRAMES = 15  # ~300ms: prefer a sustained pause over a single quiet frame
+
+DECODE_BLOCK_BYTES = SAMPLE_RATE * 2 * 10  # 10s of 16-bit mono per read
 
 class TranscriptionError(Exception):
     """Custom exception for transcription failures."""
     pass
 
-def get_word_timestamps(filename: str) -> List[Dict[str, Any]]:
+def _decode_stream(audio_path: Path) -> Iterator[np.ndarray]:
+    """Decodes any input to 16 kHz mono PCM with ffmpeg, yielding it in blocks."""
+    command = [
+        AudioSegment.converter, "-hide_banner", "-loglevel", "error",
+        "-i", str(audio_path),
+        "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1",
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    finished = False
+    try:
+        leftover = b""
+        while True:
+            data = process.stdout.read(DECODE_BLOCK_BYTES)
+            if not data:
+                break
+            data = leftover + data
+            usable = len(data) - len(data) % 2
+            leftover = data[usable:]
+            yield np.frombuffer(data[:usable], dtype=np.int16)
+        finished = True
+    finally:
+        process.stdout.close()
+        if not finished:
+            # Closed early or failed downstream: ffmpeg's exit status says nothing
+            # about the audio, and raising here would hide the real exception.
+            process.kill()
+            process.wait()
+            process.stderr.close()
+    stderr = process.stderr.read()
+    process.stderr.close()
+    if process.wait() != 0:
+        raise TranscriptionError(f"Could not decode audio: {stderr.decode(errors='replace').strip()}")
+
+def _quietest_point(samples: np.ndarray) -> int:
+    """Returns the sample index at the centre of the quietest stretch of `samples`."""
+    frame = int(SAMPLE_RATE * SILENCE_FRAME_S)
+    count = len(samples) // frame
+    if count == 0:
+        return len(samples)
+    frames = samples[:count * frame].astype(np.float32).reshape(count, frame)
+    energy = np.square(frames).mean(axis=1)
+    width = min(SILENCE_SMOOTHING_FRAMES, count)
+    smoothed = np.convolve(energy, np.ones(width) / width, mode="same")
+    return int(np.argmin(smoothed)) * frame + frame // 2
+
+class _ChunkEncoder:
+    """Streams PCM into an ffmpeg MP3 encoder writing to a temporary file."""
+
+    def __init__(self, index: int, start_sample: int):
+        self.index = index
+        self.start_sample = start_sample
+        self.samples = 0
+        fd, self.path = tempfile.mkstemp(suffix=f"_chunk_{index}.mp3")
+        os.close(fd)
+        command = [
+            AudioSegment.converter, "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "pipe:0",
+            "-c:a", "libmp3lame", "-b:a", f"{CHUNK_BITRATE_KBPS}k", "-f", "mp3", self.path,
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, samples: np.ndarray) -> None:
+        if len(samples):
+            self.process.stdin.write(samples.tobytes())
+            self.samples += len(samples)
+
+    def close(self) -> None:
+        self.process.stdin.close()
+        stderr = self.process.stderr.read()
+        if self.process.wait() != 0:
+            raise TranscriptionError(f"Could not encode chunk {self.index}: {stderr.decode(errors='replace').strip()}")
+
+def _plan_and_encode_chunks(audio_path: Path, target_s: float = CHUNK_TARGET_S) -> Iterator[_ChunkEncoder]:
+    """
+    Decodes the file as a stream and cuts it into encoded chunks of about target_s,
+    each ending at a detected pause. Only the silence search window is ever buffered.
+    """
+    target = int(target_s * SAMPLE_RATE)
+    window = min(int(SILENCE_SEARCH_S * SAMPLE_RATE), target // 2)
+    encoder = _ChunkEncoder(0, 0)
+    pending = np.zeros(0, dtype=np.int16)
+    for block in _decode_stream(audio_path):
+        pending = np.concatenate([pending, block])
+        while encoder.samples + len(pending) >= target:
+            search_from = max(0, target - window - encoder.samples)
+            search_to = target - encoder.samples
+            cut = search_from + _quietest_point(pending[search_from:search_to])
+            encoder.write(pending[:cut])
+            encoder.close()
+            yield encoder
+            pending = pending[cut:]
+            encoder = _ChunkEncoder(encoder.index + 1, encoder.start_sample + encoder.samples)
+        # Everything before the next search window can go straight to the encoder.
+        safe = max(0, target - window - encoder.samples)
+        encoder.write(pending[:safe])
+        pending = pending[safe:]
+    encoder.write(pending)
+    encoder.close()
+    if encoder.samples or encoder.index == 0:
+        yield encoder
+    else:
+        os.remove(encoder.path)
+
+def _request_transcription(chunk: _ChunkEncoder):
+    # The file is reopened on every attempt so a retried upload starts from the top.
+    with open(chunk.path, "rb") as f:
+        return get_openai_client().audio.transcriptions.create(
+            model="whisper-1",
+            file=(f"chunk_{chunk.index}.mp3", f),
+            response_format="verbose_json",
+            timestamp_granularities=["word"]
+        )
+
+def _transcribe_chunk(chunk: _ChunkEncoder) -> List[Dict[str, Any]]:
+    """Sends one encoded chunk to Whisper and returns its words on the file's timeline."""
+    time_offset_s = chunk.start_sample / SAMPLE_RATE
+    try:
+        response = provider_gateway.call("openai", "whisper-1", lambda: _request_transcription(chunk))
+    finally:
+        os.remove(chunk.path)
+    return [
+        {'word': word_obj.word, 'start': word_obj.start + time_offset_s, 'end': word_obj.end + time_offset_s}
+        for word_obj in response.words or []
+    ]
+
+def _progress_callback(chunk: _ChunkEncoder, progress: Callable[..., None]):
     """
-    Transcribes an audio file to get word-level timestamps, handling large files by chunking.
+    Reports a finished chunk by its end position in the file; the total chunk count is
+    only known once decoding ends.
+    """
+    end_s = round((chunk.start_sample + chunk.samples) / SAMPLE_RATE, 2)
+
+    def done(future) -> None:
+        if not future.exception():
+            progress("transcription_progress", chunk=chunk.index + 1, end_s=end_s)
+    return done
+
+def get_word_timestamps(
+    filename: str,
+    chunk_target_s: Optional[float] = None,
+    progress: Optional[Callable[..., None]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Transcribes an audio file to get word-level timestamps, handling large files by
+    splitting them at pauses into chunks that each fit Whisper's upload limit. Chunk
+    N+1 is decoded and encoded while chunk N is being transcribed. If given,
+    progress("transcription_progress", ...) is called as each chunk completes.
     """
     audio_path = UPLOAD_DIR / filename
     if not audio_path.exists():
         raise TranscriptionError(f"Audio file not found: {filename}")
 
     try:
-        audio = AudioSegment.from_file(audio_path)
-        
-        chunks = [audio[i:i + CHUNK_DURATION_MS] for i in range(0, len(audio), CHUNK_DURATION_MS)]
-        
-        all_words = []
-        time_offset_s = 0.0
-
-        for i, chunk in enumerate(chunks):
-            buffer = io.BytesIO()
-            chunk.export(buffer, format="mp3")
-            buffer.seek(0)
-            buffer.name = f"chunk_{i}.mp3"
-
-            response = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=buffer,
-                response_format="verbose_json",
-                timestamp_granularities=["word"]
-            )
-
-            # --- FIX: Handle the 'TranscriptionWord' object correctly ---
-            # Instead of modifying the response object directly, we create a new
-            # dictionary for each word and access attributes with a dot (e.g., word_obj.start).
-            for word_obj in response.words:
-                new_word_dict = {
-                    'word': word_obj.word,
-                    'start': word_obj.start + time_offset_s,
-                    'end': word_obj.end + time_offset_s
-                }
-                all_words.append(new_word_dict)
-            
-            time_offset_s += chunk.duration_seconds
-
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = []
+            for chunk in _plan_and_encode_chunks(audio_path, chunk_target_s or CHUNK_TARGET_S):
+                future = executor.submit(_transcribe_chunk, chunk)
+                if progress:
+                    future.add_done_callback(_progress_callback(chunk, progress))
+                futures.append(future)
+            all_words = []
+            for future in futures:
+                all_words.extend(future.result())
         return all_words
-
+    except TranscriptionError:
+        raise
     except Exception as e:
         raise TranscriptionError(f"Failed to get word timestamps: {e}")
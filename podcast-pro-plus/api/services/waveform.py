@@ -0,0 +1,191 @@
+import struct
+import subprocess
+import numpy as np
+from pathlib import Path
+from typing import List, Tuple, Optional, Iterable, IO
+from pydub import AudioSegment
+
+from ..core import directories
+from .loudness import pcm_view
+from .audio_buffer import AudioBuffer, AudioBufferError, AudioLike
+
+WAVEFORMS_DIR = Path("waveforms")
+directories.register(WAVEFORMS_DIR)
+
+# Level 0 holds one min/max pair per BASE_SAMPLES_PER_PEAK frames; every further
+# level halves the resolution, down to roughly MIN_PEAKS_PER_LEVEL pairs.
+BASE_SAMPLES_PER_PEAK = 256
+MIN_PEAKS_PER_LEVEL = 1024
+DECODE_BLOCK_FRAMES = BASE_SAMPLES_PER_PEAK * 4096
+# Uploads that cannot be memory-mapped are decoded by ffmpeg to this format and read
+# a block at a time. Peaks fold the channels together, so stereo loses nothing.
+DECODE_SAMPLE_RATE = 44100
+DECODE_CHANNELS = 2
+
+# File layout (little endian):
+#   header:  magic "PPPK", version u8, 3 pad bytes, sample_rate u32, level_count u32
+#   table:   level_count x (samples_per_peak u32, peak_count u32, data_offset u32)
+#   data:    per level, peak_count x (min i8, max i8)
+MAGIC = b"PPPK"
+VERSION = 1
+HEADER = struct.Struct("<4sB3xII")
+LEVEL_ENTRY = struct.Struct("<III")
+
+class WaveformError(Exception):
+    """Custom exception for waveform generation and lookup failures."""
+    pass
+
+def peaks_path_for(audio_filename: str) -> Path:
+    return WAVEFORMS_DIR / f"{audio_filename}.peaks"
+
+def _peaks_from_blocks(pcm_blocks: Iterable[np.ndarray], channels: int, sample_width: int, gain_db: float = 0.0) -> np.ndarray:
+    """
+    One vectorized min/max pass over (frames, channels) PCM blocks, producing an (n, 2)
+    int8 array. Every block but the last must be a whole number of peak windows.
+    Channels are folded together so a stereo file draws as a single waveform. A gain
+    still to be applied downstream (e.g. loudness normalization) is folded into the peaks.
+    """
+    shift = 8 * sample_width - 8  # Keep only the top 8 bits of each sample.
+    blocks = []
+    for block in pcm_blocks:
+        if len(block) == 0:
+            continue
+        usable = (len(block) // BASE_SAMPLES_PER_PEAK) * BASE_SAMPLES_PER_PEAK
+        if usable < len(block):
+            # Pad the final partial window by repeating its last frame.
+            pad = np.repeat(block[-1:], BASE_SAMPLES_PER_PEAK - (len(block) - usable), axis=0)
+            block = np.concatenate([block, pad])
+        windows = block.reshape(-1, BASE_SAMPLES_PER_PEAK * channels)
+        blocks.append(np.stack([windows.min(axis=1), windows.max(axis=1)], axis=1) >> shift)
+    if not blocks:
+        return np.zeros((0, 2), dtype=np.int8)
+    peaks = np.concatenate(blocks)
+    if gain_db:
+        peaks = np.round(peaks * 10 ** (gain_db / 20))
+    return np.clip(peaks, -128, 127).astype(np.int8)
+
+def _base_peaks(audio: AudioLike, gain_db: float = 0.0) -> np.ndarray:
+    if audio.sample_width not in (2, 4):
+        audio = audio.set_sample_width(2)
+    pcm = pcm_view(audio)
+    blocks = (pcm[start:start + DECODE_BLOCK_FRAMES] for start in range(0, len(pcm), DECODE_BLOCK_FRAMES))
+    return _peaks_from_blocks(blocks, audio.channels, audio.sample_width, gain_db)
+
+def _build_levels(base: np.ndarray) -> List[np.ndarray]:
+    levels = [base]
+    while len(levels[-1]) > MIN_PEAKS_PER_LEVEL:
+        previous = levels[-1]
+        if len(previous) % 2:
+            previous = np.concatenate([previous, previous[-1:]])
+        pairs = previous.reshape(-1, 2, 2)
+        levels.append(np.stack([pairs[:, :, 0].min(axis=1), pairs[:, :, 1].max(axis=1)], axis=1))
+    return levels
+
+def write_peaks(audio: AudioLike, output_path: Path, gain_db: float = 0.0) -> Path:
+    """Computes every zoom level for the audio and writes them to one .peaks file."""
+    return _write_levels(_build_levels(_base_peaks(audio, gain_db)), audio.frame_rate, output_path)
+
+def _write_levels(levels: List[np.ndarray], frame_rate: int, output_path: Path) -> Path:
+    offset = HEADER.size + LEVEL_ENTRY.size * len(levels)
+    table = []
+    for i, level in enumerate(levels):
+        table.append(LEVEL_ENTRY.pack(BASE_SAMPLES_PER_PEAK << i, len(level), offset))
+        offset += level.nbytes
+    with open(output_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, frame_rate, len(levels)))
+        f.writelines(table)
+        for level in levels:
+            f.write(level.tobytes())
+    return output_path
+
+def _read_blocks(stream: IO[bytes], channels: int) -> Iterable[np.ndarray]:
+    """Reads 16-bit PCM from a pipe in whole DECODE_BLOCK_FRAMES blocks (the last may be short)."""
+    block_bytes = DECODE_BLOCK_FRAMES * channels * 2
+    while True:
+        data = stream.read(block_bytes) # Buffered: only returns short at the end
+        if not data:
+            return
+        usable = len(data) - len(data) % (channels * 2)
+        yield np.frombuffer(data[:usable], dtype=np.int16).reshape(-1, channels)
+
+def generate_for_file(audio_path: Path) -> Path:
+    """
+    Writes an audio file's peaks next to the other waveforms. PCM WAV is mapped; anything
+    else is decoded by ffmpeg and read a block at a time, so a long upload is never held
+    in memory whole.
+    """
+    output_path = peaks_path_for(audio_path.name)
+    if audio_path.suffix.lower() == ".wav":
+        try:
+            return write_peaks(AudioBuffer.open_wav(audio_path), output_path)
+        except AudioBufferError:
+            pass  # e.g. float or 24-bit WAV: let ffmpeg convert it.
+    command = [
+        AudioSegment.converter, "-hide_banner", "-loglevel", "error", "-i", str(audio_path), "-vn",
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", str(DECODE_CHANNELS), "-ar", str(DECODE_SAMPLE_RATE), "pipe:1",
+    ]
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise WaveformError(f"Could not decode {audio_path.name}: {e}")
+    try:
+        peaks = _peaks_from_blocks(_read_blocks(process.stdout, DECODE_CHANNELS), DECODE_CHANNELS, 2)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        returncode = process.wait()
+    if returncode != 0:
+        raise WaveformError(f"Could not decode {audio_path.name}: {stderr.decode(errors='replace').strip()}")
+    return _write_levels(_build_levels(peaks), DECODE_SAMPLE_RATE, output_path)
+
+def read_level(
+    peaks_path: Path,
+    max_peaks: Optional[int] = None,
+    level: Optional[int] = None,
+    start_s: float = 0.0,
+    end_s: Optional[float] = None
+) -> Tuple[dict, bytes]:
+    """
+    Reads one zoom level (optionally a time window of it) without loading the rest of
+    the file. Without an explicit level, picks the finest level whose window fits in
+    max_peaks pairs.
+    """
+    if not peaks_path.exists():
+        raise WaveformError("Waveform not found.")
+    with open(peaks_path, "rb") as f:
+        magic, version, sample_rate, level_count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise WaveformError("Unrecognized waveform file.")
+        table = [LEVEL_ENTRY.unpack(f.read(LEVEL_ENTRY.size)) for _ in range(level_count)]
+
+        def window(entry):
+            samples_per_peak, count, _ = entry
+            first = min(count, int(start_s * sample_rate / samples_per_peak))
+            last = count if end_s is None else min(count, int(np.ceil(end_s * sample_rate / samples_per_peak)))
+            return first, max(first, last)
+
+        if level is None:
+            level = level_count - 1
+            if max_peaks:
+                for i, entry in enumerate(table):
+                    first, last = window(entry)
+                    if last - first <= max_peaks:
+                        level = i
+                        break
+        if not 0 <= level < level_count:
+            raise WaveformError(f"Level must be between 0 and {level_count - 1}.")
+
+        samples_per_peak, _, data_offset = table[level]
+        first, last = window(table[level])
+        f.seek(data_offset + first * 2)
+        data = f.read((last - first) * 2)
+
+    info = {
+        "level": level,
+        "levels": level_count,
+        "sample_rate": sample_rate,
+        "samples_per_peak": samples_per_peak,
+        "start_s": first * samples_per_peak / sample_rate,
+        "peak_count": last - first,
+    }
+    return info, data
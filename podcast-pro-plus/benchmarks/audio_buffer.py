@@ -0,0 +1,91 @@
+"""
+Compares the pipeline's hot audio operations done with pydub AudioSegments against
+the same operations on AudioBuffer, reporting wall time and peak traced memory.
+
+Run from the podcast-pro-plus directory:
+
+    python -m benchmarks.audio_buffer --minutes 30
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from pydub import AudioSegment
+
+from api.services.audio_buffer import AudioBuffer
+from api.services.audio_processor import render_edit_list
+
+FRAME_RATE = 44100
+CHANNELS = 2
+
+def _source(minutes: float) -> AudioSegment:
+    rng = np.random.default_rng(0)
+    pcm = (rng.standard_normal((int(minutes * 60 * FRAME_RATE), CHANNELS)) * 3000).astype(np.int16)
+    return AudioSegment(pcm.tobytes(), frame_rate=FRAME_RATE, sample_width=2, channels=CHANNELS)
+
+def _edit_list(length_ms: int):
+    """A cleanup-like edit list: keep ~4s, cut ~0.4s, with an inserted pause every 30s."""
+    pieces, position = [], 0
+    while position < length_ms:
+        pieces.append((position, min(length_ms, position + 4000)))
+        position += 4400
+        if position % 30000 < 4400:
+            pieces.append((None, 500))
+    return pieces
+
+def _pydub_render(audio: AudioSegment, edit_list) -> AudioSegment:
+    result = AudioSegment.empty()
+    for start_ms, end_ms in edit_list:
+        if start_ms is None:
+            result += AudioSegment.silent(duration=end_ms, frame_rate=audio.frame_rate)
+        else:
+            result += audio[start_ms:end_ms]
+    return result
+
+def _pydub_stitch(intro: AudioSegment, content: AudioSegment, outro: AudioSegment) -> AudioSegment:
+    total = len(intro) + len(content) + len(outro)
+    final = AudioSegment.silent(duration=total, frame_rate=content.frame_rate).set_channels(CHANNELS)
+    final = final.overlay(intro, position=0)
+    final = final.overlay(content, position=len(intro))
+    final = final.overlay(outro, position=len(intro) + len(content))
+    return final.apply_gain(-3).fade_in(2000).fade_out(2000)
+
+def _buffer_stitch(intro: AudioBuffer, content: AudioBuffer, outro: AudioBuffer) -> AudioBuffer:
+    total = intro.frame_count + content.frame_count + outro.frame_count
+    final = AudioBuffer.silent(total, content.frame_rate, CHANNELS)
+    final.overlay(intro, 0)
+    final.overlay(content, len(intro))
+    final.overlay(outro, len(intro) + len(content))
+    return final.apply_gain(-3).fade_in(2000).fade_out(2000)
+
+def _measure(label: str, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<12} {elapsed:8.2f}s  peak {peak / 2**20:9.1f} MB")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10.0, help="Length of the synthetic content.")
+    args = parser.parse_args()
+
+    source = _source(args.minutes)
+    source_buffer = AudioBuffer.from_segment(source)
+    edit_list = _edit_list(len(source))
+    intro, outro = source[:15000], source[-20000:]
+    print(f"{args.minutes:g} minutes of {CHANNELS}ch {FRAME_RATE} Hz PCM ({len(source.raw_data) / 2**20:.0f} MB), "
+          f"{len(edit_list)} edit pieces")
+
+    print("Edit-list render:")
+    _measure("pydub", lambda: _pydub_render(source, edit_list))
+    _measure("AudioBuffer", lambda: render_edit_list(source_buffer, edit_list))
+
+    print("Stitch + gain + fades:")
+    _measure("pydub", lambda: _pydub_stitch(intro, source, outro))
+    _measure("AudioBuffer", lambda: _buffer_stitch(source_buffer[:15000], source_buffer, source_buffer[-20000:]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Checks that the API and the worker pipeline import within their startup budgets and
+without pulling in provider SDKs or SciPy, which are loaded on first use instead.
+Exits non-zero when a check fails.
+
+Run from the podcast-pro-plus directory:
+
+    python -m benchmarks.import_time
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Cold-import budgets in seconds (median of several runs, each in a fresh interpreter).
+BUDGETS_S = {
+    "api.main": 2.0,
+    "api.services.audio_processor": 1.5,
+}
+
+# Modules that must not be imported at boot.
+DEFERRED_MODULES = ["openai", "elevenlabs", "authlib", "scipy"]
+
+def _profile(module: str) -> Tuple[float, Dict[str, float]]:
+    """Imports the module in a fresh interpreter; returns its total and per-module cumulative times."""
+    completed = subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{completed.stderr}")
+    cumulative: Dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        if cumulative_us.strip().isdigit():
+            cumulative[name.strip()] = int(cumulative_us) / 1e6
+    return cumulative[module], cumulative
+
+def check(module: str, budget_s: float, runs: int) -> List[str]:
+    totals, modules = [], {}
+    for _ in range(runs):
+        total, modules = _profile(module)
+        totals.append(total)
+    median = statistics.median(totals)
+    print(f"{module}: {median:.2f}s median over {runs} runs (budget {budget_s:.2f}s)")
+    for name, seconds in sorted(modules.items(), key=lambda item: -item[1])[1:6]:
+        print(f"    {seconds:6.2f}s  {name}")
+
+    failures = []
+    if median > budget_s:
+        failures.append(f"{module} took {median:.2f}s to import (budget {budget_s:.2f}s)")
+    for name in DEFERRED_MODULES:
+        if name in modules:
+            failures.append(f"{module} imports {name} at startup")
+    return failures
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    failures = []
+    for module, budget_s in BUDGETS_S.items():
+        failures.extend(check(module, budget_s, args.runs))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
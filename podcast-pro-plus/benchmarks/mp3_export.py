@@ -0,0 +1,71 @@
+"""
+Times the final MP3 encode of a long episode: one encoder over the whole mix against
+segmented encoding on an increasing number of cores, reporting wall time, speed
+relative to real time and speedup over the single encoder.
+
+Needs ffmpeg with libmp3lame (on the PATH, or given with --ffmpeg). Run from the
+podcast-pro-plus directory:
+
+    python -m benchmarks.mp3_export --minutes 120 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+import numpy as np
+from pydub import AudioSegment
+
+from api.models.podcast import ExportProfile
+from api.services import exporter, mp3_frames
+from api.services.audio_buffer import AudioBuffer
+
+FRAME_RATE = 44100
+CHANNELS = 2
+PROFILE = ExportProfile(name="mp3_128", format="mp3", bitrate_kbps=128)
+
+def _source(minutes: float) -> AudioBuffer:
+    """Speech-like noise: filtered noise bursts with pauses, so the encoder has real work."""
+    rng = np.random.default_rng(0)
+    frames = int(minutes * 60 * FRAME_RATE)
+    noise = rng.standard_normal((frames, CHANNELS)).astype(np.float32)
+    envelope = (np.sin(np.arange(frames) * (2 * np.pi * 3 / FRAME_RATE)) > -0.3).astype(np.float32)
+    pcm = np.cumsum(noise, axis=0) * 0.05
+    pcm -= np.convolve(pcm[:, 0], np.ones(64) / 64, mode="same")[:, None]
+    return AudioBuffer((pcm * envelope[:, None] * 6000).clip(-32768, 32767).astype(np.int16), FRAME_RATE)
+
+def _time(run: Callable[[], None]) -> float:
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=120.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, os.cpu_count() or 1])
+    parser.add_argument("--ffmpeg", default=None, help="Path to the ffmpeg binary.")
+    args = parser.parse_args()
+    if args.ffmpeg:
+        AudioSegment.converter = args.ffmpeg
+
+    audio = _source(args.minutes)
+    duration_s = audio.duration_seconds
+    print(f"{args.minutes:g} minutes of {CHANNELS}-channel audio at {FRAME_RATE} Hz, {os.cpu_count()} cores\n")
+    print(f"{'encoder':<22} {'seconds':>9} {'x realtime':>11} {'speedup':>8} {'size MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        output_dir = Path(directory)
+        single_s = _time(lambda: exporter.export_profiles(audio, "single", output_dir, [PROFILE]))
+        single_path = output_dir / f"single_{PROFILE.name}.mp3"
+        print(f"{'single':<22} {single_s:>9.1f} {duration_s / single_s:>11.1f} {1.0:>8.2f} "
+              f"{single_path.stat().st_size / 1e6:>8.1f}")
+        for workers in sorted(set(args.workers)):
+            path = output_dir / f"segmented_{workers}.mp3"
+            seconds = _time(lambda: exporter.encode_mp3_segmented(audio, PROFILE, path, workers))
+            pieces = len(exporter.plan_segments(audio.frame_count, FRAME_RATE, workers))
+            index = mp3_frames.scan(path)
+            print(f"{f'segmented, {pieces} pieces':<22} {seconds:>9.1f} {duration_s / seconds:>11.1f} "
+                  f"{single_s / seconds:>8.2f} {path.stat().st_size / 1e6:>8.1f}   ({index.frame_count} frames)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Simulates the job scheduler offline on a mixed workload and compares queue waits per
+tenant against first-come, first-served. No jobs are run: each takes its duration in
+virtual time, so hours of traffic replay in a moment.
+
+The workload has one tenant who submits a batch of long episodes at once, plus
+interactive tenants who submit single episodes over time, each sometimes followed by
+a short metadata job.
+
+Run from the podcast-pro-plus directory:
+
+    python -m benchmarks.scheduler --workers 3 --batch-jobs 12 --hours 4
+"""
+import argparse
+import random
+from typing import List, Dict, Any
+
+from api.services.scheduler import FairQueue, FifoQueue, SimulatedJob, simulate, LANE_SHORT, LANE_LONG
+
+def workload(args: argparse.Namespace) -> List[SimulatedJob]:
+    rng = random.Random(args.seed)
+    jobs = [
+        SimulatedJob("batch", LANE_LONG, float(i), args.batch_job_s * rng.uniform(0.8, 1.2))
+        for i in range(args.batch_jobs)
+    ]
+    for tenant in range(args.tenants):
+        t = 0.0
+        while True:
+            t += rng.expovariate(1 / args.interarrival_s)
+            if t > args.hours * 3600:
+                break
+            jobs.append(SimulatedJob(f"tenant{tenant}", LANE_LONG, t, args.episode_s * rng.uniform(0.5, 1.5)))
+            if rng.random() < args.metadata_share:
+                jobs.append(SimulatedJob(f"tenant{tenant}", LANE_SHORT, t + 5, args.metadata_s * rng.uniform(0.5, 1.5)))
+    return jobs
+
+def _row(name: str, wait: Dict[str, Any]) -> str:
+    if not wait.get("count"):
+        return f"  {name:<12} {'-':>6}"
+    return (f"  {name:<12} {wait['count']:>6} {wait['p50_s'] / 60:>9.1f} "
+            f"{wait['p95_s'] / 60:>9.1f} {wait['max_s'] / 60:>9.1f}")
+
+def report(name: str, result: Dict[str, Any]) -> None:
+    print(f"{name}  (all jobs done after {result['makespan_s'] / 3600:.1f}h)")
+    print(f"  {'wait by':<12} {'jobs':>6} {'p50 min':>9} {'p95 min':>9} {'max min':>9}")
+    for lane, wait in result["wait_by_lane"].items():
+        print(_row(f"{lane} lane", wait))
+    for tenant, stats in sorted(result["tenants"].items()):
+        print(_row(tenant, stats["wait"]))
+    print()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--max-running-per-user", type=int, default=2)
+    parser.add_argument("--reserved-short-workers", type=int, default=1)
+    parser.add_argument("--long-jobs-on-reserved", type=int, default=1)
+    parser.add_argument("--aging-s", type=float, default=1800.0)
+    parser.add_argument("--batch-jobs", type=int, default=12)
+    parser.add_argument("--batch-job-s", type=float, default=1200.0, help="Processing time of each batch episode.")
+    parser.add_argument("--tenants", type=int, default=5, help="Interactive tenants.")
+    parser.add_argument("--hours", type=float, default=4.0)
+    parser.add_argument("--interarrival-s", type=float, default=900.0, help="Mean time between an interactive tenant's episodes.")
+    parser.add_argument("--episode-s", type=float, default=300.0)
+    parser.add_argument("--metadata-share", type=float, default=0.5)
+    parser.add_argument("--metadata-s", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    jobs = workload(args)
+    print(f"{len(jobs)} jobs on {args.workers} workers\n")
+    report("First come, first served", simulate(workload(args), FifoQueue(args.workers)))
+    report("Fair scheduler", simulate(jobs, FairQueue(
+        workers=args.workers,
+        max_running_per_user=args.max_running_per_user,
+        reserved_short_workers=args.reserved_short_workers,
+        long_jobs_on_reserved=args.long_jobs_on_reserved,
+        long_lane_aging_s=args.aging_s,
+    )))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Load-testing harness for the API: fake provider servers, scripted virtual users and
+a latency/throughput report. Run it with `python -m loadtest --help`.
+"""
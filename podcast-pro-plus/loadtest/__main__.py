@@ -0,0 +1,125 @@
+"""
+Load-tests the API against fake providers and prints per-endpoint throughput and
+latency for each concurrency stage.
+
+Run from the podcast-pro-plus directory:
+
+    python -m loadtest --scenario mixed --users 1,4,16,32 --stage-seconds 30
+
+By default a fresh copy of the app is started with uvicorn in a temporary working
+directory (its own database, uploads and rate-limit state), configured to use the fake
+providers. Pass --app-url to drive an app you started yourself; it must be configured
+with the provider URLs printed at startup.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import httpx
+
+from .fake_providers import FakeProviderServer, FakeProviderConfig, ProviderBehaviour
+from .report import summarize_stage, format_report
+from .scenarios import SCENARIOS, run_stage
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+def _start_app(port: int, workers: int, workdir: Path, provider_env: Dict[str, str]) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        **provider_env,
+        "PYTHONPATH": str(PROJECT_DIR),
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "loadtest-secret"),
+        "OPENAI_API_KEY": "loadtest",
+        "ELEVENLABS_API_KEY": "loadtest",
+        "SPREAKER_API_TOKEN": "loadtest",
+    }
+    log = open(workdir / "app.log", "wb")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+def _wait_for_app(url: str, process: Optional[subprocess.Popen], timeout_s: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"The app exited during startup (code {process.returncode}); see app.log.")
+        try:
+            if httpx.get(f"{url}/", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise SystemExit(f"The app at {url} did not become ready within {timeout_s:.0f}s.")
+
+def _behaviour(args: argparse.Namespace, latency_ms: float) -> ProviderBehaviour:
+    return ProviderBehaviour(latency_ms=latency_ms, jitter_ms=latency_ms * args.jitter,
+                             throttle_rate=args.throttle_rate, error_rate=args.error_rate)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--users", default="1,4,16", help="Comma-separated concurrency stages.")
+    parser.add_argument("--stage-seconds", type=float, default=30.0)
+    parser.add_argument("--app-url", help="Drive an already running app instead of starting one.")
+    parser.add_argument("--app-port", type=int, default=8800)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the started app.")
+    parser.add_argument("--fake-port", type=int, default=8900)
+    parser.add_argument("--openai-latency-ms", type=float, default=800.0)
+    parser.add_argument("--elevenlabs-latency-ms", type=float, default=400.0)
+    parser.add_argument("--spreaker-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--jitter", type=float, default=0.3, help="Latency standard deviation as a fraction of the mean.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of provider calls that return 503.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of provider calls that return 429.")
+    parser.add_argument("--json", type=Path, help="Also write the full results to this file.")
+    args = parser.parse_args()
+
+    config = FakeProviderConfig(
+        openai=_behaviour(args, args.openai_latency_ms),
+        elevenlabs=_behaviour(args, args.elevenlabs_latency_ms),
+        spreaker=_behaviour(args, args.spreaker_latency_ms),
+    )
+    fakes = FakeProviderServer(config, port=args.fake_port).start()
+    print(f"Fake providers at {fakes.url}:")
+    for key, value in fakes.app_environment().items():
+        print(f"  {key}={value}")
+
+    process = None
+    workdir = None
+    upload_dir = None
+    app_url = args.app_url
+    try:
+        if not app_url:
+            workdir = Path(tempfile.mkdtemp(prefix="ppp-loadtest-"))
+            upload_dir = workdir / "temp_uploads"
+            upload_dir.mkdir()
+            process = _start_app(args.app_port, args.workers, workdir, fakes.app_environment())
+            app_url = f"http://127.0.0.1:{args.app_port}"
+            print(f"Started the app at {app_url} in {workdir}")
+        _wait_for_app(app_url, process)
+
+        stages: List[Dict[str, Any]] = []
+        for users in (int(n) for n in args.users.split(",")):
+            print(f"Running {args.scenario} with {users} users for {args.stage_seconds:.0f}s...")
+            samples, elapsed_s = asyncio.run(run_stage(app_url, args.scenario, users, args.stage_seconds, upload_dir))
+            stages.append(summarize_stage(samples, elapsed_s, users))
+        print(format_report(stages, fakes.stats()))
+        if args.json:
+            args.json.write_text(json.dumps({"scenario": args.scenario, "stages": stages,
+                                             "providers": fakes.stats()}, indent=2))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        fakes.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Local stand-ins for the provider APIs the app calls: OpenAI (Whisper transcription
+and chat completions), ElevenLabs (streaming TTS) and Spreaker (episode upload).
+They return well-formed responses of realistic size, with configurable latency and
+injected failures, so the app can be driven at load without touching real providers.
+
+One server hosts all three; point the app at it with
+
+    OPENAI_BASE_URL=http://HOST:PORT/v1
+    ELEVENLABS_BASE_URL=http://HOST:PORT
+    SPREAKER_API_BASE_URL=http://HOST:PORT/v2
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# One silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, no CRC. All-zero side
+# information decodes as 1152 samples of silence, so a run of these is a valid MP3.
+SILENT_MP3_FRAME = b"\xff\xfb\x90\xc0" + bytes(413)
+MP3_FRAME_S = 1152 / 44100
+# Speech rate used to size fake TTS output and fake transcripts.
+CHARS_PER_SECOND = 15.0
+WORDS_PER_SECOND = 2.5
+# Whisper chunks are encoded at this bitrate by the app; used to infer their duration.
+UPLOAD_BITRATE_BPS = 32000
+TTS_CHUNK_FRAMES = 40
+FILLER_EVERY = 25
+WORDS = "so today we are talking about how small teams ship audio that sounds great".split()
+
+@dataclass
+class ProviderBehaviour:
+    """Latency and failure injection for one fake provider."""
+    latency_ms: float = 300.0
+    jitter_ms: float = 100.0
+    # Fraction of requests answered with 429 + Retry-After, and with a 5xx.
+    throttle_rate: float = 0.0
+    error_rate: float = 0.0
+    retry_after_s: float = 1.0
+    # Delay between streamed TTS chunks.
+    chunk_delay_ms: float = 20.0
+
+    def delay_s(self) -> float:
+        return max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+
+@dataclass
+class FakeProviderConfig:
+    openai: ProviderBehaviour = field(default_factory=ProviderBehaviour)
+    elevenlabs: ProviderBehaviour = field(default_factory=ProviderBehaviour)
+    spreaker: ProviderBehaviour = field(default_factory=lambda: ProviderBehaviour(latency_ms=1500, jitter_ms=500))
+
+def _chat_content(system_prompt: str, user_content: str, json_mode: bool) -> str:
+    """Answers in the shape each of the app's prompts asks for."""
+    if not json_mode:
+        return "Here is a short spoken answer. It is two sentences long."
+    if '"commands"' in system_prompt:
+        lines = [line for line in user_content.splitlines() if line.strip()]
+        return json.dumps({"commands": [
+            {"index": i, "action": "generate_audio" if i % 2 == 0 else "add_to_shownotes", "topic": line.split(". ", 1)[-1]}
+            for i, line in enumerate(lines)
+        ]})
+    if '"summary"' in system_prompt:
+        return json.dumps({"summary": "A section about shipping audio.", "topics": ["audio", "teams"],
+                           "chapters": [{"title": "Shipping audio", "start_s": 0}]})
+    if "action" in system_prompt:
+        return json.dumps({"action": "generate_audio", "topic": user_content})
+    return json.dumps({"title": "Shipping Great Audio", "show_notes": "We talk about small teams and audio.",
+                       "tags": ["audio", "podcasting", "teams"], "chapters": [{"title": "Intro", "start_s": 0}]})
+
+def _fake_words(duration_s: float) -> list:
+    words = []
+    step = 1.0 / WORDS_PER_SECOND
+    for i in range(int(duration_s * WORDS_PER_SECOND)):
+        start = i * step
+        word = "um" if i % FILLER_EVERY == FILLER_EVERY - 1 else WORDS[i % len(WORDS)]
+        words.append({"word": word, "start": round(start, 2), "end": round(start + step * 0.8, 2)})
+    return words
+
+def create_app(config: FakeProviderConfig) -> FastAPI:
+    app = FastAPI(title="Fake providers")
+    app.state.config = config
+    app.state.stats = Counter()
+
+    async def inject(provider: str, behaviour: ProviderBehaviour) -> Optional[JSONResponse]:
+        """Sleeps for the simulated latency; returns an error response if one is injected."""
+        app.state.stats[f"{provider}.requests"] += 1
+        await asyncio.sleep(behaviour.delay_s())
+        roll = random.random()
+        if roll < behaviour.throttle_rate:
+            app.state.stats[f"{provider}.throttled"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                status_code=429, headers={"Retry-After": str(behaviour.retry_after_s)}
+            )
+        if roll < behaviour.throttle_rate + behaviour.error_rate:
+            app.state.stats[f"{provider}.errors"] += 1
+            return JSONResponse({"error": {"message": "Injected failure", "type": "server_error"}}, status_code=503)
+        return None
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        form = await request.form()
+        upload = form["file"]
+        size = len(await upload.read())
+        if (error := await inject("openai", config.openai)):
+            return error
+        duration_s = size * 8 / UPLOAD_BITRATE_BPS
+        words = _fake_words(duration_s)
+        return {"task": "transcribe", "language": "english", "duration": duration_s,
+                "text": " ".join(w["word"] for w in words), "words": words, "segments": []}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if (error := await inject("openai", config.openai)):
+            return error
+        messages = body.get("messages", [])
+        system_prompt = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user_content = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+        content = _chat_content(system_prompt, user_content, json_mode)
+        return {
+            "id": f"chatcmpl-{random.getrandbits(64):x}", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "gpt-4-turbo"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(json.dumps(messages)) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(json.dumps(messages)) + len(content)) // 4},
+        }
+
+    @app.post("/v1/text-to-speech/{voice_id}/stream")
+    @app.post("/v1/text-to-speech/{voice_id}")
+    async def text_to_speech(voice_id: str, request: Request):
+        body = await request.json()
+        if (error := await inject("elevenlabs", config.elevenlabs)):
+            return error
+        frames = max(1, int(len(body.get("text", "")) / CHARS_PER_SECOND / MP3_FRAME_S))
+        chunk_delay_s = config.elevenlabs.chunk_delay_ms / 1000
+
+        async def stream():
+            for start in range(0, frames, TTS_CHUNK_FRAMES):
+                yield SILENT_MP3_FRAME * min(TTS_CHUNK_FRAMES, frames - start)
+                await asyncio.sleep(chunk_delay_s)
+        return StreamingResponse(stream(), media_type="audio/mpeg")
+
+    @app.post("/v2/shows/{show_id}/episodes")
+    async def spreaker_upload(show_id: str, request: Request):
+        form = await request.form()
+        media = form.get("media_file")
+        if media is not None:
+            await media.read()
+        if (error := await inject("spreaker", config.spreaker)):
+            return error
+        return {"response": {"episode": {"episode_id": random.randint(10**6, 10**7), "show_id": show_id,
+                                         "title": form.get("title", "")}}}
+
+    @app.get("/_stats")
+    async def stats() -> Dict[str, Any]:
+        return dict(app.state.stats)
+
+    return app
+
+class FakeProviderServer:
+    """Runs the fake providers with uvicorn in a background thread."""
+
+    def __init__(self, config: FakeProviderConfig, host: str = "127.0.0.1", port: int = 8900):
+        self.app = create_app(config)
+        self.host = host
+        self.port = port
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def app_environment(self) -> Dict[str, str]:
+        """Settings that point the app's provider clients at this server."""
+        return {
+            "OPENAI_BASE_URL": f"{self.url}/v1",
+            "ELEVENLABS_BASE_URL": self.url,
+            "SPREAKER_API_BASE_URL": f"{self.url}/v2",
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.app.state.stats)
+
+    def start(self, timeout_s: float = 10.0) -> "FakeProviderServer":
+        self._thread.start()
+        deadline = time.monotonic() + timeout_s
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"Fake provider server did not start on port {self.port}.")
+            time.sleep(0.05)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=10)
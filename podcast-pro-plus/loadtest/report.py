@@ -0,0 +1,92 @@
+"""
+Summaries of load-test samples: throughput, error rate and p50/p95/p99 latency per
+endpoint for each stage, and how throughput and latency respond as the number of
+concurrent users grows.
+"""
+import math
+from collections import defaultdict
+from typing import Dict, List, Any, Optional
+
+from .scenarios import Sample
+
+PERCENTILES = (50, 95, 99)
+# A stage counts as saturated when adding users raised throughput by less than this
+# fraction while p95 latency grew by more than SATURATION_LATENCY_GROWTH.
+SATURATION_THROUGHPUT_GAIN = 0.10
+SATURATION_LATENCY_GROWTH = 0.50
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def _stats(samples: List[Sample], elapsed_s: float) -> Dict[str, Any]:
+    latencies = sorted(s.latency_s for s in samples)
+    errors = sum(1 for s in samples if not s.ok)
+    stats = {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "throughput_rps": len(samples) / elapsed_s if elapsed_s > 0 else 0.0,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+    for q in PERCENTILES:
+        stats[f"p{q}_ms"] = percentile(latencies, q) * 1000
+    return stats
+
+def summarize_stage(samples: List[Sample], elapsed_s: float, users: int) -> Dict[str, Any]:
+    by_endpoint: Dict[str, List[Sample]] = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample.endpoint].append(sample)
+    return {
+        "users": users,
+        "elapsed_s": elapsed_s,
+        "overall": _stats(samples, elapsed_s),
+        "endpoints": {name: _stats(items, elapsed_s) for name, items in sorted(by_endpoint.items())},
+    }
+
+def find_saturation(stages: List[Dict[str, Any]]) -> Optional[int]:
+    """The user count at which throughput stopped scaling, if any stage reached it."""
+    for previous, stage in zip(stages, stages[1:]):
+        before, after = previous["overall"], stage["overall"]
+        if before["throughput_rps"] <= 0 or before["p95_ms"] <= 0:
+            continue
+        gain = after["throughput_rps"] / before["throughput_rps"] - 1
+        growth = after["p95_ms"] / before["p95_ms"] - 1
+        if gain < SATURATION_THROUGHPUT_GAIN and growth > SATURATION_LATENCY_GROWTH:
+            return stage["users"]
+    return None
+
+def _row(name: str, stats: Dict[str, Any]) -> str:
+    return (f"{name:<40} {stats['requests']:>7} {stats['throughput_rps']:>8.2f} {stats['error_rate'] * 100:>6.1f}% "
+            f"{stats['p50_ms']:>9.0f} {stats['p95_ms']:>9.0f} {stats['p99_ms']:>9.0f} {stats['max_ms']:>9.0f}")
+
+def format_report(stages: List[Dict[str, Any]], provider_stats: Optional[Dict[str, int]] = None) -> str:
+    header = f"{'endpoint':<40} {'reqs':>7} {'req/s':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    lines = []
+    for stage in stages:
+        lines.append(f"\n=== {stage['users']} concurrent users ({stage['elapsed_s']:.0f}s) ===")
+        lines.append(header)
+        for name, stats in stage["endpoints"].items():
+            lines.append(_row(name, stats))
+        lines.append(_row("ALL", stage["overall"]))
+
+    lines.append("\n=== Saturation ===")
+    lines.append(f"{'users':>6} {'req/s':>8} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for stage in stages:
+        overall = stage["overall"]
+        lines.append(f"{stage['users']:>6} {overall['throughput_rps']:>8.2f} {overall['p95_ms']:>9.0f} "
+                     f"{overall['p99_ms']:>9.0f} {overall['error_rate'] * 100:>6.1f}%")
+    saturated_at = find_saturation(stages)
+    if saturated_at:
+        lines.append(f"Throughput stopped scaling at {saturated_at} users (latency grew instead).")
+    else:
+        lines.append("No saturation point reached; try more users.")
+
+    if provider_stats:
+        lines.append("\n=== Fake provider traffic ===")
+        for key, count in sorted(provider_stats.items()):
+            lines.append(f"{key:<30} {count:>8}")
+    return "\n".join(lines)
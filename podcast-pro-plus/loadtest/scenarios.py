@@ -0,0 +1,188 @@
+"""
+Virtual users that drive the API with a weighted mix of actions. Every request is
+recorded as a Sample under its route template (e.g. "GET /templates/{id}") so the
+report can group latencies per endpoint.
+"""
+import asyncio
+import io
+import random
+import time
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Callable, Awaitable, Tuple
+from uuid import uuid4
+
+import httpx
+
+@dataclass
+class Sample:
+    endpoint: str
+    status: int
+    latency_s: float
+    finished_at: float
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 400
+
+# Action weights per scenario. "process_episode" runs the whole production pipeline
+# and dominates server time, so it is rare outside the processing scenario.
+SCENARIOS: Dict[str, Dict[str, float]] = {
+    "browse": {"login": 1, "list_templates": 6, "get_template": 4, "list_media": 4, "me": 3},
+    "crud": {"list_templates": 3, "create_template": 2, "update_template": 2, "get_template": 3, "upload_media": 1},
+    "mixed": {"login": 1, "list_templates": 5, "get_template": 3, "create_template": 1, "update_template": 1,
+              "list_media": 3, "upload_media": 1, "process_episode": 0.2},
+    "processing": {"process_episode": 1},
+}
+
+UPLOAD_SECONDS = 5.0
+MAIN_CONTENT_SECONDS = 60.0
+THINK_TIME_S = (0.05, 0.25)
+# Virtual users arrive spread over this long rather than all at once.
+RAMP_UP_S = 2.0
+
+def tone_wav(seconds: float, frame_rate: int = 44100, frequency: float = 220.0) -> bytes:
+    """A mono 16-bit tone with a gap every few seconds, so silence detection has work to do."""
+    import numpy as np
+    t = np.arange(int(seconds * frame_rate)) / frame_rate
+    samples = 0.3 * np.sin(2 * np.pi * frequency * t) * (t % 4.0 < 3.2)
+    out = io.BytesIO()
+    with wave.open(out, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(frame_rate)
+        f.writeframes((samples * 32767).astype("<i2").tobytes())
+    return out.getvalue()
+
+def template_body(name: str) -> dict:
+    return {
+        "name": name,
+        "segments": [
+            {"segment_type": "intro", "source": {"source_type": "tts", "script": "Welcome back to the show. Here is what we have today."}},
+            {"segment_type": "content", "source": {"source_type": "static", "filename": "content"}},
+            {"segment_type": "outro", "source": {"source_type": "tts", "script": "Thanks for listening. See you next week."}},
+        ],
+    }
+
+class VirtualUser:
+    """One simulated account issuing requests until the stage ends."""
+
+    def __init__(self, client: httpx.AsyncClient, samples: List[Sample], upload_dir: Optional[Path]):
+        self.client = client
+        self.samples = samples
+        self.upload_dir = upload_dir
+        self.email = f"load-{uuid4().hex[:12]}@example.com"
+        self.password = uuid4().hex
+        self.template_ids: List[str] = []
+        self.main_content: Optional[str] = None
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0
+        now = time.perf_counter()
+        self.samples.append(Sample(endpoint, status, now - start, now))
+        return response
+
+    async def login(self) -> None:
+        response = await self.request(
+            "POST /auth/token", "POST", "/auth/token",
+            data={"username": self.email, "password": self.password}
+        )
+        if response is not None and response.status_code == 200:
+            self.client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    async def setup(self) -> None:
+        await asyncio.sleep(random.uniform(0, RAMP_UP_S))
+        await self.request("POST /auth/register", "POST", "/auth/register",
+                           json={"email": self.email, "password": self.password})
+        await self.login()
+        await self.create_template()
+
+    async def me(self) -> None:
+        await self.request("GET /auth/users/me", "GET", "/auth/users/me")
+
+    async def list_templates(self) -> None:
+        await self.request("GET /templates/", "GET", "/templates/")
+
+    async def get_template(self) -> None:
+        if self.template_ids:
+            await self.request("GET /templates/{id}", "GET", f"/templates/{random.choice(self.template_ids)}")
+
+    async def create_template(self) -> None:
+        response = await self.request("POST /templates/", "POST", "/templates/", json=template_body(f"Load {uuid4().hex[:6]}"))
+        if response is not None and response.status_code == 201:
+            self.template_ids.append(response.json()["id"])
+
+    async def update_template(self) -> None:
+        if self.template_ids:
+            template_id = random.choice(self.template_ids)
+            await self.request("PUT /templates/{id}", "PUT", f"/templates/{template_id}",
+                               json=template_body(f"Load {uuid4().hex[:6]}"))
+
+    async def list_media(self) -> None:
+        await self.request("GET /media/", "GET", "/media/")
+
+    async def upload_media(self) -> None:
+        files = {"files": (f"bed_{uuid4().hex[:6]}.wav", tone_wav(UPLOAD_SECONDS), "audio/wav")}
+        await self.request("POST /media/upload/{category}", "POST", "/media/upload/music", files=files)
+
+    async def process_episode(self) -> None:
+        if not self.template_ids:
+            return
+        if self.main_content is None:
+            if self.upload_dir is None:
+                return  # The episode pipeline reads its input from the app's working directory.
+            self.main_content = f"load_{uuid4().hex[:12]}.wav"
+            (self.upload_dir / self.main_content).write_bytes(tone_wav(MAIN_CONTENT_SECONDS))
+        await self.request(
+            "POST /episodes/process-and-assemble", "POST", "/episodes/process-and-assemble",
+            json={
+                "template_id": self.template_ids[0],
+                "main_content_filename": self.main_content,
+                "output_filename": f"load_{uuid4().hex[:8]}",
+                "cleanup_options": {"removePauses": True, "removeFillers": True,
+                                    "checkForFlubber": False, "checkForIntern": True},
+                "export_profiles": [{"name": "standard", "format": "mp3", "bitrate_kbps": 128}],
+            },
+            timeout=None
+        )
+
+    async def run(self, weights: Dict[str, float], deadline: float) -> None:
+        actions: List[Callable[[], Awaitable[None]]] = [getattr(self, name) for name in weights]
+        while time.perf_counter() < deadline:
+            await random.choices(actions, weights=list(weights.values()))[0]()
+            await asyncio.sleep(random.uniform(*THINK_TIME_S))
+
+async def run_stage(
+    base_url: str,
+    scenario: str,
+    users: int,
+    duration_s: float,
+    upload_dir: Optional[Path] = None
+) -> Tuple[List[Sample], float]:
+    """
+    Runs `users` concurrent virtual users for `duration_s` after they have signed up
+    and logged in. Returns the samples taken and the wall time from the end of that
+    setup, so sign-up and ramp-up traffic does not count towards the stage.
+    """
+    weights = SCENARIOS[scenario]
+    samples: List[Sample] = []
+    # Each virtual user has its own connection pool, like separate browsers.
+    virtual_users = [
+        VirtualUser(httpx.AsyncClient(base_url=base_url, timeout=120.0), samples, upload_dir)
+        for _ in range(users)
+    ]
+    try:
+        await asyncio.gather(*(u.setup() for u in virtual_users))
+        deadline = time.perf_counter() + duration_s
+        await asyncio.gather(*(u.run(weights, deadline) for u in virtual_users))
+    finally:
+        for u in virtual_users:
+            await u.client.aclose()
+    start = deadline - duration_s
+    return [s for s in samples if s.finished_at >= start], time.perf_counter() - start